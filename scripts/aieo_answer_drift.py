@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""AIEO検証の回答が月ごとにどう変わったかを、ネットワークを使わずに集計する。
+
+成功した回答ごとに、対象名（KGNINJA・AIEOなど）への言及、AIEOメモリの
+概念のキーワードをどれだけ含むか、同じ質問・同じAIの前月の回答との類似度を
+特徴量として ``data/aieo_answer_features.csv`` へ追記する。類似度は文字
+3-gramのMinHash署名の一致率で推定する。署名は回答ごとに決まり、他の回答に
+依存しないため、新しい回答だけを処理すれば済む。検証ログのどこまでを
+処理したかと、前月との比較に使う署名は状態ファイルに保存する。
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scripts.aieo_metrics_store import read_csv_header, tail_digest
+    from scripts.aieo_metrics_writer import MetricsWriter, sidecar_path
+    from scripts.aieo_verification_log import iter_log_records
+except ImportError:  # python scripts/aieo_answer_drift.py として実行した場合
+    from aieo_metrics_store import read_csv_header, tail_digest
+    from aieo_metrics_writer import MetricsWriter, sidecar_path
+    from aieo_verification_log import iter_log_records
+
+VERIFICATION_LOG = Path("data/aieo_verification_log.jsonl")
+MEMORY_FILE = Path("aieo_memory.json")
+FEATURES_FILE = Path(os.getenv("AIEO_ANSWER_FEATURES", "data/aieo_answer_features.csv"))
+DRIFT_REPORT = Path(os.getenv("AIEO_ANSWER_DRIFT_REPORT", "reports/aieo_answer_drift.md"))
+# 処理済みの位置と署名。失われても特徴量を作り直すだけ。
+DRIFT_STATE_FILE = Path(
+    os.getenv("AIEO_ANSWER_DRIFT_STATE", ".aieo_cache/answer_drift_state.json")
+)
+ENTITY_TERMS = [
+    term.strip()
+    for term in os.getenv("AIEO_DRIFT_ENTITIES", "KGNINJA,AIEO").split(",")
+    if term.strip()
+]
+SHINGLE_SIZE = 3
+MINHASH_PERMUTATIONS = 64
+# MinHashのハッシュ関数 (a * h + b) mod p の法。係数との積がuint64に収まる。
+_MINHASH_PRIME = (1 << 31) - 1
+_MINHASH_SEED = 20251018
+# 計測値から毎回書き換わる概念。キーワードが変わると特徴量を作り直すため除く。
+MEASURED_CATEGORIES = {"visibility_status"}
+
+
+def _entity_column(term: str) -> str:
+    return f"mentions_{term.lower()}"
+
+
+def feature_fields(entities: Sequence[str] = ENTITY_TERMS) -> List[str]:
+    return [
+        "timestamp",
+        "month",
+        "query",
+        "provider",
+        "model",
+        "length",
+        *(_entity_column(term) for term in entities),
+        "keyword_coverage",
+        "matched_concepts",
+        "similarity_prev_month",
+    ]
+
+
+def _strings(value) -> Iterable[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+def load_concept_keywords(memory_file: Path = MEMORY_FILE) -> Dict[str, List[str]]:
+    """AIEOメモリの概念ごとに、属性に含まれる文字列を小文字のキーワードにして返す。
+
+    計測値を記録する ``MEASURED_CATEGORIES`` の概念は対象にしない。
+    """
+    if not Path(memory_file).exists():
+        return {}
+    memory = json.loads(Path(memory_file).read_text(encoding="utf-8"))
+    keywords = {}
+    for concept in memory.get("concepts", []):
+        if concept.get("category") in MEASURED_CATEGORIES:
+            continue
+        terms = {
+            text.replace("_", " ").strip().lower()
+            for text in _strings(concept.get("attributes", {}))
+        }
+        keywords[concept["concept_id"]] = sorted(term for term in terms if len(term) >= 2)
+    return keywords
+
+
+def _normalize(texts: pd.Series) -> pd.Series:
+    return texts.fillna("").astype(str).str.lower().str.split().str.join(" ")
+
+
+def minhash_signatures(texts: Sequence[str]) -> np.ndarray:
+    """各文章の文字 ``SHINGLE_SIZE``-gram の集合について、MinHash署名を返す。"""
+    rng = np.random.default_rng(_MINHASH_SEED)
+    a, b = rng.integers(1, _MINHASH_PRIME, size=(2, MINHASH_PERMUTATIONS), dtype=np.uint64)
+    signatures = np.full((len(texts), MINHASH_PERMUTATIONS), _MINHASH_PRIME, dtype=np.uint64)
+    for row, text in enumerate(texts):
+        if not text:
+            continue
+        shingles = {
+            text[start : start + SHINGLE_SIZE]
+            for start in range(max(len(text) - SHINGLE_SIZE + 1, 1))
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        ) % np.uint64(_MINHASH_PRIME)
+        # 全てのハッシュ関数をまとめて適用し、関数ごとの最小値を取る。
+        permuted = (hashes[:, None] * a + b) % np.uint64(_MINHASH_PRIME)
+        signatures[row] = permuted.min(axis=0)
+    return signatures
+
+
+def answer_features(
+    records: pd.DataFrame,
+    concept_keywords: Dict[str, List[str]],
+    entities: Sequence[str] = ENTITY_TERMS,
+) -> pd.DataFrame:
+    """成功した回答の行から、言及・キーワード被覆率の特徴量を計算する。"""
+    text = _normalize(records["response"])
+    features = pd.DataFrame(
+        {
+            "timestamp": records["timestamp"],
+            "month": records["month"],
+            "query": records["query"],
+            "provider": records["provider"],
+            "model": records["model"],
+            "length": records["response"].fillna("").astype(str).str.len(),
+        },
+        index=records.index,
+    )
+    for term in entities:
+        features[_entity_column(term)] = text.str.contains(
+            term.lower(), regex=False
+        ).astype(int)
+
+    keywords = sorted({term for terms in concept_keywords.values() for term in terms})
+    hits = pd.DataFrame(
+        {term: text.str.contains(term, regex=False) for term in keywords},
+        index=records.index,
+        dtype=bool,
+    )
+    features["keyword_coverage"] = (
+        hits.mean(axis=1).round(4) if keywords else pd.Series(0.0, index=records.index)
+    )
+    matched = pd.DataFrame(
+        {
+            concept_id: hits[terms].any(axis=1)
+            for concept_id, terms in concept_keywords.items()
+            if terms
+        },
+        index=records.index,
+        dtype=bool,
+    )
+    features["matched_concepts"] = [
+        ";".join(matched.columns[row]) for row in matched.to_numpy()
+    ]
+    return features
+
+
+def _settings(concept_keywords: Dict[str, List[str]]) -> Dict:
+    digest = hashlib.sha1(
+        json.dumps(concept_keywords, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return {
+        "entities": ENTITY_TERMS,
+        "keywords": digest,
+        "shingle_size": SHINGLE_SIZE,
+        "permutations": MINHASH_PERMUTATIONS,
+    }
+
+
+def _load_drift_state(
+    state_file: Path, log_path: Path, features_file: Path, settings: Dict
+) -> Optional[Dict]:
+    """検証ログと特徴量が前回から追記されただけなら状態を返す。"""
+    if not state_file.exists():
+        return None
+    try:
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+        features_size = features_file.stat().st_size if features_file.exists() else 0
+        if (
+            state["log"] != str(log_path)
+            or state["features"] != str(features_file)
+            or state["settings"] != settings
+            or state["offset"] > log_path.stat().st_size
+            or state["log_digest"] != tail_digest(log_path, state["offset"])
+            or state["features_size"] != features_size
+            or (
+                features_size
+                and state["features_digest"] != tail_digest(features_file, features_size)
+            )
+        ):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return state
+
+
+def update_answer_features(
+    log_path: Path = VERIFICATION_LOG,
+    features_file: Path = FEATURES_FILE,
+    state_file: Path = DRIFT_STATE_FILE,
+    memory_file: Path = MEMORY_FILE,
+) -> int:
+    """検証ログの追記分から回答の特徴量を追記し、追記した行数を返す。"""
+    log_path, features_file = Path(log_path), Path(features_file)
+    state_file = Path(state_file)
+    concept_keywords = load_concept_keywords(memory_file)
+    settings = _settings(concept_keywords)
+    state = _load_drift_state(state_file, log_path, features_file, settings)
+    if state is None:
+        # 前回の処理位置が分からない特徴量は、重複を避けるため作り直す。
+        features_file.unlink(missing_ok=True)
+        sidecar_path(features_file).unlink(missing_ok=True)
+        state = {"offset": 0, "signatures": {}}
+
+    offset, rows = state["offset"], []
+    for _, offset, record in iter_log_records(log_path, state["offset"]):
+        result = record.get("result") or {}
+        if result.get("status") == "success":
+            rows.append(
+                {
+                    "timestamp": record.get("timestamp"),
+                    "month": record.get("month"),
+                    "query": record.get("query"),
+                    "provider": record.get("provider"),
+                    "model": result.get("model"),
+                    "response": result.get("response"),
+                }
+            )
+
+    signatures = state["signatures"]
+    if rows:
+        records = pd.DataFrame(rows)
+        features = answer_features(records, concept_keywords)
+        similarity = []
+        new_signatures = minhash_signatures(_normalize(records["response"]).tolist())
+        for record, signature in zip(rows, new_signatures):
+            months = signatures.setdefault(f"{record['query']}\t{record['provider']}", {})
+            # 同じ月に複数回答があれば、最後の回答を前月の比較対象として残す。
+            earlier = [month for month in months if month < record["month"]]
+            if earlier:
+                previous = np.asarray(months[max(earlier)], dtype=np.uint64)
+                similarity.append(round(float(np.mean(previous == signature)), 4))
+            else:
+                similarity.append(None)
+            months[record["month"]] = signature.tolist()
+        features["similarity_prev_month"] = similarity
+        MetricsWriter(features_file, feature_fields()).append_frame(features)
+
+    features_size = features_file.stat().st_size if features_file.exists() else 0
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = state_file.with_suffix(".tmp")
+    temp_path.write_text(
+        json.dumps(
+            {
+                "log": str(log_path),
+                "features": str(features_file),
+                "settings": settings,
+                "offset": offset,
+                "log_digest": tail_digest(log_path, offset),
+                "features_size": features_size,
+                "features_digest": (
+                    tail_digest(features_file, features_size) if features_size else ""
+                ),
+                "signatures": signatures,
+            },
+            ensure_ascii=False,
+        ),
+        encoding="utf-8",
+    )
+    os.replace(temp_path, state_file)
+    return len(rows)
+
+
+def summarize_drift(features: pd.DataFrame) -> pd.DataFrame:
+    """月・AIごとに、回答数・言及率・キーワード被覆率・前月との類似度をまとめる。"""
+    mention_columns = [column for column in features.columns if column.startswith("mentions_")]
+    summary = features.groupby(["month", "provider"], sort=True).agg(
+        answers=("query", "size"),
+        **{f"{column}_rate": (column, "mean") for column in mention_columns},
+        keyword_coverage=("keyword_coverage", "mean"),
+        similarity_prev_month=("similarity_prev_month", "mean"),
+    )
+    return summary.round(3).reset_index()
+
+
+def render_drift_report(summary: pd.DataFrame) -> str:
+    """集計結果をMarkdownの表にする。"""
+    lines = ["# AIEO Answer Drift", ""]
+    if summary.empty:
+        return "\n".join([*lines, "No successful answers yet.", ""])
+    columns = list(summary.columns)
+    lines.append("| " + " | ".join(columns) + " |")
+    lines.append("|" + "|".join("---" for _ in columns) + "|")
+    for row in summary.itertuples(index=False):
+        cells = ["" if pd.isna(value) else str(value) for value in row]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join([*lines, ""])
+
+
+def report_answer_drift(log_path: Path = VERIFICATION_LOG) -> None:
+    """特徴量を更新し、月・AIごとの集計を ``DRIFT_REPORT`` へ書き出す。"""
+    log_path = Path(log_path)
+    if not log_path.exists():
+        print(f"{log_path} がありません。回答の推移の集計をスキップします。")
+        return
+    appended = update_answer_features(log_path)
+    print(f"✓ {FEATURES_FILE} へ{appended}件の回答の特徴量を追記しました")
+    if FEATURES_FILE.exists() and read_csv_header(FEATURES_FILE):
+        summary = summarize_drift(pd.read_csv(FEATURES_FILE))
+    else:
+        summary = pd.DataFrame()
+    DRIFT_REPORT.parent.mkdir(parents=True, exist_ok=True)
+    DRIFT_REPORT.write_text(render_drift_report(summary), encoding="utf-8")
+    print(f"✓ {DRIFT_REPORT} を生成しました")
+
+
+if __name__ == "__main__":
+    report_answer_drift()
@@ -1,25 +1,70 @@
+import json
+import math
 import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+try:
+    from scripts.aieo_metrics_store import (
+        CHUNK_ROWS,
+        iter_appended_chunks,
+        read_csv_header,
+        tail_digest,
+    )
+    from scripts.aieo_timestamps import parse_timestamps
+except ImportError:  # python scripts/aieo_composite_tracker.py として実行した場合
+    from aieo_metrics_store import (
+        CHUNK_ROWS,
+        iter_appended_chunks,
+        read_csv_header,
+        tail_digest,
+    )
+    from aieo_timestamps import parse_timestamps
+
 INPUT_FILE = "aieo_effect_log.csv"
 OUTPUT_FILE = "aieo_resonance_log.csv"
+STABILITY_FILE = "aieo_entity_stability.csv"
 CHART_FILE = "aieo_resonance_chart.png"
+# 対象ごとのローリング標準偏差に使う観測数と、EWMAのspan。
+STABILITY_WINDOW = int(os.getenv("AIEO_STABILITY_WINDOW", "5"))
+STABILITY_EWMA_SPAN = int(os.getenv("AIEO_STABILITY_EWMA_SPAN", "10"))
+# EWMAの重みがこの値を下回る古い観測は、次回の計算に持ち越さない。
+EWMA_WEIGHT_CUTOFF = 1e-12
+# 追記分だけを計算するための状態。失われても全体の再計算に戻るだけ。
+COMPOSITE_STATE_FILE = Path(
+    os.getenv("AIEO_COMPOSITE_STATE", ".aieo_cache/composite_state.json")
+)
+INCREMENTAL = os.getenv("AIEO_COMPOSITE_INCREMENTAL", "1") != "0"
+RESONANCE_COLUMNS = ["timestamp", "resonance_index", "rolling_stability", "ewma_stability"]
+STABILITY_COLUMNS = ["timestamp", "entity", "effect", "rolling_volatility", "ewma_volatility"]
+# 全体の再計算と追記で同じ表記になるよう、変動の値はこの桁数で丸める。
+VOLATILITY_DECIMALS = 6
 
 
-def build_resonance_frame(df: pd.DataFrame) -> pd.DataFrame:
-    """1本以上のEffect系列から0〜100の安定度スコアを生成する。"""
+def _split_effect_frame(df: pd.DataFrame) -> Tuple[pd.Series, pd.DataFrame, pd.Series]:
+    """Effectログを時刻と数値系列へ分け、有効な行を示すマスクを返す。"""
     if "timestamp" not in df.columns:
         raise ValueError("Effectログにtimestamp列がありません")
 
-    timestamps = pd.to_datetime(
-        df["timestamp"], format="mixed", errors="coerce", utc=True
-    ).dt.tz_convert(None)
+    timestamps = parse_timestamps(df["timestamp"]).dt.tz_convert(None)
     numeric = df.drop(columns=["timestamp"]).apply(pd.to_numeric, errors="coerce")
-
     valid_rows = timestamps.notna() & numeric.notna().any(axis=1)
+    return timestamps, numeric, valid_rows
+
+
+def _dispersion_score(numeric: pd.DataFrame) -> pd.Series:
+    # ddof=0により、系列が1本でも分散0として有限値を維持する。
+    dispersion = numeric.std(axis=1, ddof=0).replace([np.inf, -np.inf], np.nan)
+    return (100.0 - dispersion).clip(lower=0.0, upper=100.0).fillna(0.0)
+
+
+def build_resonance_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """1本以上のEffect系列から0〜100の安定度スコアを生成する。"""
+    timestamps, numeric, valid_rows = _split_effect_frame(df)
     dropped_rows = int((~valid_rows).sum())
     timestamps = timestamps.loc[valid_rows]
     numeric = numeric.loc[valid_rows]
@@ -29,9 +74,7 @@ def build_resonance_frame(df: pd.DataFrame) -> pd.DataFrame:
     if dropped_rows:
         print(f"⚠️ 無効なEffect行を{dropped_rows}件除外しました")
 
-    # ddof=0により、系列が1本でも分散0として有限値を維持する。
-    dispersion = numeric.std(axis=1, ddof=0).replace([np.inf, -np.inf], np.nan)
-    resonance_score = (100.0 - dispersion).clip(lower=0.0, upper=100.0).fillna(0.0)
+    resonance_score = _dispersion_score(numeric)
     return pd.DataFrame(
         {
             "timestamp": timestamps.to_numpy(),
@@ -40,6 +83,198 @@ def build_resonance_frame(df: pd.DataFrame) -> pd.DataFrame:
     ).sort_values("timestamp")
 
 
+def ewma_history_length(
+    span: int = STABILITY_EWMA_SPAN, window: int = STABILITY_WINDOW
+) -> int:
+    """次回へ持ち越す、対象ごとの直近観測数。"""
+    decay = 1.0 - 2.0 / (span + 1)
+    ewma_length = math.ceil(math.log(EWMA_WEIGHT_CUTOFF) / math.log(decay)) if decay else 1
+    return max(window - 1, ewma_length, 1)
+
+
+def entity_stability(
+    observations: pd.DataFrame,
+    history: Optional[Dict[str, List[float]]] = None,
+    window: int = STABILITY_WINDOW,
+    span: int = STABILITY_EWMA_SPAN,
+) -> Tuple[pd.DataFrame, Dict[str, List[float]]]:
+    """対象ごとの観測列から、ローリングとEWMAの変動（標準偏差）を計算する。
+
+    ``observations`` は時刻順の ``entity``・``effect`` 列を持つ。``history`` は
+    前回までの対象ごとの直近観測で、先頭に置いて同じ計算の続きとして扱う。
+    結果と、次回へ持ち越す直近観測を返す。
+    """
+    seeds = pd.DataFrame(
+        [
+            (entity, value)
+            for entity, values in (history or {}).items()
+            for value in values
+        ],
+        columns=["entity", "effect"],
+    )
+    seeds["seed"] = True
+    observations = observations.assign(seed=False)
+    combined = pd.concat([seeds, observations], ignore_index=True)
+    combined["effect"] = combined["effect"].astype(float)
+
+    groups = combined.groupby("entity", sort=False)["effect"]
+    combined["rolling_volatility"] = (
+        groups.rolling(window, min_periods=1)
+        .std(ddof=0)
+        .reset_index(level=0, drop=True)
+    )
+    combined["ewma_volatility"] = (
+        groups.ewm(span=span).std(bias=True).reset_index(level=0, drop=True)
+    )
+
+    keep = ewma_history_length(span, window)
+    recent = combined.groupby("entity", sort=False).tail(keep)
+    carried = {
+        str(entity): group["effect"].tolist()
+        for entity, group in recent.groupby("entity", sort=False)
+    }
+    result = combined.loc[~combined["seed"].astype(bool)].drop(columns="seed")
+    for column in ("rolling_volatility", "ewma_volatility"):
+        result[column] = result[column].round(VOLATILITY_DECIMALS)
+    return result, carried
+
+
+def _process_chunk(
+    frame: pd.DataFrame, history: Dict[str, List[float]]
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, List[float]], int]:
+    """Effectログの文字列チャンクから、Resonance行と対象別の安定度を計算する。"""
+    timestamps, numeric, valid_rows = _split_effect_frame(frame)
+    text = frame["timestamp"].loc[valid_rows]
+    numeric = numeric.loc[valid_rows]
+    # 時刻順を保ち、同時刻の行は元の並びのままにする。
+    order = timestamps.loc[valid_rows].sort_values(kind="stable").index
+    text, numeric = text.loc[order], numeric.loc[order]
+
+    observations = (
+        numeric.rename_axis(columns="entity")
+        .stack()
+        .dropna()
+        .rename("effect")
+        .reset_index(level="entity")
+    )
+    stability, history = entity_stability(observations, history)
+    stability.index = observations.index
+    stability.insert(0, "timestamp", text.loc[stability.index])
+
+    per_row = stability.groupby(level=0)[["rolling_volatility", "ewma_volatility"]].mean()
+    resonance = pd.DataFrame(
+        {
+            "timestamp": text,
+            "resonance_index": _dispersion_score(numeric),
+            "rolling_stability": (100.0 - per_row["rolling_volatility"]).clip(0.0, 100.0),
+            "ewma_stability": (100.0 - per_row["ewma_volatility"]).clip(0.0, 100.0),
+        }
+    )
+    return (
+        resonance[RESONANCE_COLUMNS],
+        stability[STABILITY_COLUMNS].reset_index(drop=True),
+        history,
+        int((~valid_rows).sum()),
+    )
+
+
+def _file_state(path: Path) -> Dict:
+    size = path.stat().st_size if path.exists() else 0
+    return {"size": size, "digest": tail_digest(path, size) if size else ""}
+
+
+def _load_composite_state(
+    state_file: Path, input_file: Path, outputs: List[Path]
+) -> Optional[Dict]:
+    """Effectログと出力が前回から追記されただけなら状態を返す。"""
+    if not state_file.exists():
+        return None
+    try:
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+        if (
+            state["source"] != str(input_file)
+            or state["header"] != read_csv_header(input_file)
+            or state["offset"] > input_file.stat().st_size
+            or state["source_digest"] != tail_digest(input_file, state["offset"])
+            or state["window"] != STABILITY_WINDOW
+            or state["span"] != STABILITY_EWMA_SPAN
+            or state["outputs"] != {str(path): _file_state(path) for path in outputs}
+        ):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return state
+
+
+def _append_csv(path: Path, frame: pd.DataFrame) -> None:
+    with path.open("a", encoding="utf-8", newline="") as file:
+        frame.to_csv(file, index=False, header=file.tell() == 0)
+
+
+def update_composite_logs(
+    input_file: Path = Path(INPUT_FILE),
+    output_file: Path = Path(OUTPUT_FILE),
+    stability_file: Path = Path(STABILITY_FILE),
+    state_file: Path = COMPOSITE_STATE_FILE,
+    incremental: bool = INCREMENTAL,
+    chunk_rows: int = CHUNK_ROWS,
+) -> bool:
+    """Resonanceログと対象別の安定度ログを更新し、追記だけで済んだかを返す。
+
+    Effectログをチャンクごとに読み、対象ごとの直近観測だけを持ち越して計算する。
+    前回の状態が使える場合は、追記されたEffect行だけを処理する。
+    """
+    input_file, output_file = Path(input_file), Path(output_file)
+    stability_file, state_file = Path(stability_file), Path(state_file)
+    if "timestamp" not in read_csv_header(input_file):
+        raise ValueError("Effectログにtimestamp列がありません")
+
+    outputs = [output_file, stability_file]
+    state = _load_composite_state(state_file, input_file, outputs) if incremental else None
+    if state is None:
+        offset, history, rows = 0, {}, 0
+        for path in outputs:
+            path.unlink(missing_ok=True)
+    else:
+        offset, history, rows = state["offset"], state["history"], state["rows"]
+
+    dropped_rows = 0
+    for frame, offset in iter_appended_chunks(input_file, offset, chunk_rows):
+        resonance, stability, history, dropped = _process_chunk(frame, history)
+        dropped_rows += dropped
+        if not resonance.empty:
+            _append_csv(output_file, resonance)
+            _append_csv(stability_file, stability)
+            rows += len(resonance)
+
+    if rows == 0:
+        raise ValueError("Effectログに有効な数値系列がありません")
+    if dropped_rows:
+        print(f"⚠️ 無効なEffect行を{dropped_rows}件除外しました")
+    if incremental:
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = state_file.with_suffix(".tmp")
+        temp_path.write_text(
+            json.dumps(
+                {
+                    "source": str(input_file),
+                    "header": read_csv_header(input_file),
+                    "offset": offset,
+                    "source_digest": tail_digest(input_file, offset),
+                    "window": STABILITY_WINDOW,
+                    "span": STABILITY_EWMA_SPAN,
+                    "rows": rows,
+                    "history": history,
+                    "outputs": {str(path): _file_state(path) for path in outputs},
+                },
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(temp_path, state_file)
+    return state is not None
+
+
 def main() -> None:
     """Resonanceログとグラフを生成する。"""
     if not os.path.exists(INPUT_FILE):
@@ -47,8 +282,12 @@ def main() -> None:
             f"{INPUT_FILE} が存在しません。Effectジョブを先に実行してください。"
         )
 
-    composite_df = build_resonance_frame(pd.read_csv(INPUT_FILE))
-    composite_df.to_csv(OUTPUT_FILE, index=False)
+    if update_composite_logs():
+        print(f"✓ {OUTPUT_FILE}へ追記分の安定度を追加しました")
+    composite_df = pd.read_csv(OUTPUT_FILE)
+    composite_df["timestamp"] = parse_timestamps(composite_df["timestamp"]).dt.tz_convert(
+        None
+    )
 
     plt.figure(figsize=(10, 5))
     plt.plot(
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""AIEOメモリの概念を ``concept_id`` で引けるようにするストア。
+
+``aieo_memory.json`` の ``concepts`` は下流が読むリスト形式のまま保ち、
+ストアはそのリストをその場で更新しながら、IDから位置への索引を持つ。
+``AIEO_CONCEPT_DB`` を指定した場合は、概念ごとの更新をSQLiteへも
+書き込み、JSONにない概念もDBから復元する。
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# 未設定ならJSONだけを正本として使う。
+CONCEPT_DB = os.getenv("AIEO_CONCEPT_DB", "")
+
+
+class ConceptStore:
+    """概念リストを包み、``concept_id`` による参照と追加・更新を提供する。"""
+
+    def __init__(self, concepts: List[Dict[str, Any]]) -> None:
+        self.concepts = concepts
+        self._positions: Dict[str, int] = {}
+        for position, concept in enumerate(concepts):
+            # 重複したIDは、線形探索と同じく先頭の概念を対象にする。
+            self._positions.setdefault(concept["concept_id"], position)
+
+    def __contains__(self, concept_id: str) -> bool:
+        return concept_id in self._positions
+
+    def __len__(self) -> int:
+        return len(self.concepts)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.concepts)
+
+    def get(self, concept_id: str) -> Optional[Dict[str, Any]]:
+        """概念を返す。なければNoneを返す。"""
+        position = self._positions.get(concept_id)
+        return None if position is None else self.concepts[position]
+
+    def upsert(self, concept: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """同じIDの概念を置き換え、なければ末尾へ追加する。置き換え前の概念を返す。"""
+        concept_id = concept["concept_id"]
+        position = self._positions.get(concept_id)
+        if position is None:
+            self._positions[concept_id] = len(self.concepts)
+            self.concepts.append(concept)
+            return None
+        previous = self.concepts[position]
+        self.concepts[position] = concept
+        return previous
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """``aieo_memory.json`` と同じ形の概念リストを返す。"""
+        return self.concepts
+
+    def close(self) -> None:
+        """後始末が必要なバックエンドのための口。JSONでは何もしない。"""
+
+
+class SQLiteConceptStore(ConceptStore):
+    """概念ごとの追加・更新をSQLiteへ書き込むストア。"""
+
+    def __init__(self, concepts: List[Dict[str, Any]], path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=30)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS concepts (
+                concept_id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                payload TEXT NOT NULL
+            )
+            """
+        )
+        super().__init__(concepts)
+        # JSONにだけある概念はDBへ、DBにだけある概念はリストへ揃える。
+        stored = self._connection.execute(
+            "SELECT concept_id, payload FROM concepts ORDER BY position"
+        ).fetchall()
+        for concept_id, payload in stored:
+            if concept_id not in self:
+                ConceptStore.upsert(self, json.loads(payload))
+        for concept in list(self.concepts):
+            self._write(concept)
+        self._connection.commit()
+
+    def _write(self, concept: Dict[str, Any]) -> None:
+        self._connection.execute(
+            """
+            INSERT INTO concepts (concept_id, position, payload) VALUES (?, ?, ?)
+            ON CONFLICT(concept_id) DO UPDATE SET
+                position = excluded.position,
+                payload = excluded.payload
+            """,
+            (
+                concept["concept_id"],
+                self._positions[concept["concept_id"]],
+                json.dumps(concept, ensure_ascii=False),
+            ),
+        )
+
+    def upsert(self, concept: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        previous = super().upsert(concept)
+        self._write(concept)
+        self._connection.commit()
+        return previous
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def open_concept_store(
+    concepts: List[Dict[str, Any]], db_path: Optional[str] = None
+) -> ConceptStore:
+    """設定に応じて、JSONだけのストアかSQLite併用のストアを返す。"""
+    db_path = CONCEPT_DB if db_path is None else db_path
+    if db_path:
+        return SQLiteConceptStore(concepts, Path(db_path))
+    return ConceptStore(concepts)
@@ -1,69 +1,50 @@
+import json
 import os
 from pathlib import Path
+from typing import Dict, List, Optional
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+try:
+    from scripts.aieo_metrics_store import (
+        read_appended_rows,
+        read_csv_header,
+        tail_digest,
+    )
+    from scripts.aieo_visibility_source import (
+        load_visibility,
+        normalize_visibility_frame,
+    )
+except ImportError:  # python scripts/aieo_effect_compose.py として実行した場合
+    from aieo_metrics_store import read_appended_rows, read_csv_header, tail_digest
+    from aieo_visibility_source import load_visibility, normalize_visibility_frame
+
 MODERN_INPUT_FILE = Path("aieo_visibility_metrics.csv")
 LEGACY_INPUT_FILE = Path("visibility_log.csv")
 OUTPUT_LOG = "aieo_effect_log.csv"
 CHART_FILE = "aieo_effect_chart.png"
-MODERN_COLUMNS = {"timestamp", "name", "visibility_score"}
-LEGACY_COLUMNS = {"timestamp", "keyword", "totalResults"}
+# 追記分だけを計算するための状態。失われても全体の再計算に戻るだけ。
+EFFECT_STATE_FILE = Path(
+    os.getenv("AIEO_EFFECT_STATE", ".aieo_cache/effect_state.json")
+)
+INCREMENTAL = os.getenv("AIEO_EFFECT_INCREMENTAL", "1") != "0"
 
 
 def _normalize_source(df: pd.DataFrame) -> pd.DataFrame:
     """新旧どちらかの可視性スキーマを共通形式へ正規化する。"""
-    columns = set(df.columns)
-    if MODERN_COLUMNS.issubset(columns):
-        normalized = df[["timestamp", "name", "visibility_score"]].rename(
-            columns={"name": "keyword", "visibility_score": "value"}
-        )
-        source_name = "人物別可視性メトリクス"
-    elif LEGACY_COLUMNS.issubset(columns):
-        normalized = df[["timestamp", "keyword", "totalResults"]].rename(
-            columns={"totalResults": "value"}
-        )
-        source_name = "旧版可視性履歴"
-    else:
-        expected = sorted(MODERN_COLUMNS), sorted(LEGACY_COLUMNS)
-        raise ValueError(
-            "対応する可視性スキーマの必須列がありません: "
-            f"modern={expected[0]}, legacy={expected[1]}"
-        )
+    return _naive_timestamps(normalize_visibility_frame(df))
 
-    normalized = normalized.copy()
-    normalized["timestamp"] = pd.to_datetime(
-        normalized["timestamp"],
-        format="mixed",
-        errors="coerce",
-        utc=True,
-    ).dt.tz_convert(None)
-    normalized["keyword"] = normalized["keyword"].astype("string").str.strip()
-    normalized["value"] = pd.to_numeric(normalized["value"], errors="coerce")
-
-    valid_rows = (
-        normalized["timestamp"].notna()
-        & normalized["keyword"].notna()
-        & normalized["keyword"].str.len().gt(0)
-        & normalized["value"].notna()
-    )
-    dropped_rows = int((~valid_rows).sum())
-    normalized = normalized.loc[valid_rows]
-
-    if normalized.empty:
-        raise ValueError(f"{source_name}に有効な行がありません")
-    if dropped_rows:
-        print(f"⚠️ {source_name}から無効な{dropped_rows}行を除外しました")
-    print(f"✓ {source_name}を使用: {len(normalized)}有効行")
-    return normalized
 
+def _naive_timestamps(normalized: pd.DataFrame) -> pd.DataFrame:
+    """Effectログの時刻はUTCのタイムゾーンなしで書き出す。"""
+    normalized["timestamp"] = normalized["timestamp"].dt.tz_convert(None)
+    return normalized
 
-def build_effect_frame(df: pd.DataFrame) -> pd.DataFrame:
-    """対象ごとに直前観測との変化率を計算する。"""
-    normalized = _normalize_source(df)
 
+def _with_effects(normalized: pd.DataFrame) -> pd.DataFrame:
+    """正規化済みの行を対象・時刻順に並べ、直前観測との変化率を付ける。"""
     # 対象ごとに時系列を独立させ、観測時刻がずれても直前値を失わない。
     normalized = (
         normalized.sort_values(["keyword", "timestamp"])
@@ -77,10 +58,13 @@ def build_effect_frame(df: pd.DataFrame) -> pd.DataFrame:
         .replace([np.inf, -np.inf], np.nan)
         .fillna(0.0)
     )
+    return normalized
+
 
-    # 同一収集回の対象は同じ行へ揃える。過去のずれた観測は空欄を保持する。
+def _pivot_effects(observations: pd.DataFrame) -> pd.DataFrame:
+    """同一収集回の対象は同じ行へ揃える。過去のずれた観測は空欄を保持する。"""
     return (
-        normalized.pivot_table(
+        observations.pivot_table(
             index="timestamp",
             columns="keyword",
             values="effect",
@@ -90,6 +74,208 @@ def build_effect_frame(df: pd.DataFrame) -> pd.DataFrame:
     )
 
 
+def build_effect_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """対象ごとに直前観測との変化率を計算する。"""
+    return _pivot_effects(_with_effects(_normalize_source(df)))
+
+
+def _precision_rank(index: pd.DatetimeIndex) -> np.ndarray:
+    """CSVへ書き出すときに必要な時刻の桁数を、日付のみ=0からナノ秒=4で返す。"""
+    has_time = (index.hour != 0) | (index.minute != 0) | (index.second != 0)
+    rank = np.where(has_time, 1, 0)
+    rank = np.where(index.microsecond != 0, 2, rank)
+    rank = np.where(index.microsecond % 1000 != 0, 3, rank)
+    return np.where(index.nanosecond != 0, 4, rank)
+
+
+def _witness(index: pd.DatetimeIndex, lines: List[str]) -> Dict[str, str]:
+    """書式を決める最も桁数の多い時刻と、CSVに書き出された表記を返す。"""
+    position = int(np.argmax(_precision_rank(index)))
+    return {
+        "timestamp": index[position].isoformat(),
+        "text": lines[position].split(",", 1)[0],
+    }
+
+
+def _effect_state(
+    input_file: Path,
+    offset: int,
+    output_file: Path,
+    observations: pd.DataFrame,
+    effect_df: pd.DataFrame,
+    witness: Dict[str, str],
+) -> Dict:
+    last_rows = observations.groupby("keyword", sort=False).tail(1)
+    return {
+        "source": str(input_file),
+        "header": read_csv_header(input_file),
+        "offset": offset,
+        "source_digest": tail_digest(input_file, offset),
+        "output": str(output_file),
+        "output_size": output_file.stat().st_size,
+        "output_digest": tail_digest(output_file, output_file.stat().st_size),
+        "columns": [str(column) for column in effect_df.columns],
+        "dtype": str(effect_df.index.dtype),
+        "last_timestamp": effect_df.index.max().isoformat(),
+        "last_values": {
+            str(keyword): float(value)
+            for keyword, value in zip(last_rows["keyword"], last_rows["value"])
+        },
+        "witness": witness,
+    }
+
+
+def _save_effect_state(state_file: Path, state: Dict) -> None:
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = state_file.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(temp_path, state_file)
+
+
+def _load_effect_state(
+    state_file: Path, input_file: Path, output_file: Path
+) -> Optional[Dict]:
+    """入力と出力が前回の状態から追記されただけなら状態を返す。"""
+    if not state_file.exists() or not output_file.exists():
+        return None
+    try:
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+        if (
+            state["source"] != str(input_file)
+            or state["output"] != str(output_file)
+            or state["header"] != read_csv_header(input_file)
+            or state["offset"] > input_file.stat().st_size
+            or state["source_digest"] != tail_digest(input_file, state["offset"])
+            or state["output_size"] != output_file.stat().st_size
+            or state["output_digest"]
+            != tail_digest(output_file, state["output_size"])
+        ):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return state
+
+
+def _append_effects(
+    state: Dict, input_file: Path, output_file: Path
+) -> Optional[Dict]:
+    """追記された観測だけの変化率を出力へ追記し、新しい状態を返す。
+
+    全体を再計算した場合と同じ出力にできない入力ならNoneを返す。
+    """
+    frame, offset = read_appended_rows(input_file, state["offset"])
+    advanced = {
+        **state,
+        "offset": offset,
+        "source_digest": tail_digest(input_file, offset),
+    }
+    if frame.empty:
+        return advanced
+    try:
+        normalized = _normalize_source(frame)
+    except ValueError:
+        # 追記分に有効な行がなければ、読み込み位置だけを進める。
+        return advanced
+
+    last_timestamp = pd.Timestamp(state["last_timestamp"])
+    if (
+        str(normalized["timestamp"].dtype) != state["dtype"]
+        or normalized["timestamp"].min() <= last_timestamp
+        or not set(normalized["keyword"]).issubset(state["columns"])
+    ):
+        # 過去時刻の行や新しい対象は、既存の行や列を変えるため全体を再計算する。
+        return None
+
+    # 各対象の前回値を直前の観測として先頭に置き、同じ計算で変化率を求める。
+    seeds = pd.DataFrame(
+        {
+            "timestamp": pd.Series(
+                [last_timestamp] * len(state["last_values"]), dtype=state["dtype"]
+            ),
+            "keyword": pd.Series(list(state["last_values"]), dtype="string"),
+            "value": list(state["last_values"].values()),
+            "seed": True,
+        }
+    )
+    normalized["seed"] = False
+    observations = _with_effects(pd.concat([seeds, normalized], ignore_index=True))
+    observations = observations.loc[~observations["seed"]]
+    effect_df = _pivot_effects(observations).reindex(columns=state["columns"])
+    effect_df.columns.name = "keyword"
+
+    # 書式は時刻全体の桁数で決まるため、前回の基準時刻と並べて書き出す。
+    witness_index = pd.DatetimeIndex(
+        [pd.Timestamp(state["witness"]["timestamp"])], dtype=state["dtype"]
+    )
+    combined = effect_df.reindex(witness_index.append(effect_df.index))
+    lines = combined.to_csv(encoding="utf-8").splitlines(keepends=True)[1:]
+    if lines[0].split(",", 1)[0] != state["witness"]["text"]:
+        # 追記分が書式を変える場合、既存の行も書き直す必要がある。
+        return None
+
+    with output_file.open("a", encoding="utf-8", newline="") as file:
+        file.write("".join(lines[1:]))
+
+    last_values = dict(state["last_values"])
+    last_rows = observations.groupby("keyword", sort=False).tail(1)
+    for keyword, value in zip(last_rows["keyword"], last_rows["value"]):
+        last_values[str(keyword)] = float(value)
+    return {
+        **advanced,
+        "output_size": output_file.stat().st_size,
+        "output_digest": tail_digest(output_file, output_file.stat().st_size),
+        "last_timestamp": effect_df.index.max().isoformat(),
+        "last_values": last_values,
+        "witness": _witness(combined.index, lines),
+    }
+
+
+def update_effect_log(
+    input_file: Path,
+    output_file: Path = Path(OUTPUT_LOG),
+    state_file: Path = EFFECT_STATE_FILE,
+    incremental: bool = INCREMENTAL,
+) -> bool:
+    """Effectログを更新し、追記だけで済んだかを返す。
+
+    前回の状態が使える場合は追記された観測だけを計算して出力へ追記する。
+    結果は全体を再計算した場合と同じになる。
+    """
+    input_file, output_file = Path(input_file), Path(output_file)
+    state_file = Path(state_file)
+    state = None
+    if incremental:
+        state = _load_effect_state(state_file, input_file, output_file)
+    if state is not None:
+        updated = _append_effects(state, input_file, output_file)
+        if updated is not None:
+            _save_effect_state(state_file, updated)
+            return True
+        print("↻ 追記分だけでは計算できないため、Effectログ全体を再計算します")
+
+    offset = input_file.stat().st_size
+    _, normalized = load_visibility(input_file)
+    observations = _with_effects(_naive_timestamps(normalized))
+    effect_df = _pivot_effects(observations)
+    text = effect_df.to_csv(encoding="utf-8")
+    with output_file.open("w", encoding="utf-8", newline="") as file:
+        file.write(text)
+    if incremental:
+        witness = _witness(effect_df.index, text.splitlines(keepends=True)[1:])
+        state = _effect_state(
+            input_file, offset, output_file, observations, effect_df, witness
+        )
+        _save_effect_state(state_file, state)
+    return False
+
+
+def load_effect_log(output_file: Path = Path(OUTPUT_LOG)) -> pd.DataFrame:
+    """書き出したEffectログをグラフ用に読み込む。"""
+    effect_df = pd.read_csv(output_file, index_col="timestamp")
+    effect_df.index = pd.to_datetime(effect_df.index, format="mixed")
+    return effect_df
+
+
 def select_input_file() -> Path:
     """人物別メトリクスを優先し、未作成なら旧版履歴へ戻す。"""
     for path in (MODERN_INPUT_FILE, LEGACY_INPUT_FILE):
@@ -103,8 +289,9 @@ def select_input_file() -> Path:
 def main() -> None:
     """Effectログとグラフを生成する。"""
     input_file = select_input_file()
-    effect_df = build_effect_frame(pd.read_csv(input_file))
-    effect_df.to_csv(OUTPUT_LOG, encoding="utf-8")
+    if update_effect_log(input_file):
+        print(f"✓ {OUTPUT_LOG}へ追記分の変化率を追加しました")
+    effect_df = load_effect_log()
 
     plt.figure(figsize=(10, 6))
     for keyword in effect_df.columns:
@@ -1,47 +1,488 @@
-import pandas as pd
+#!/usr/bin/env python3
+"""可視性と共鳴度を時刻の近い行どうしで結合し、AIEO効果指数（Visibility × Resonance）を作る。
+
+可視性は人物別メトリクスか旧版履歴を、共鳴度は対象別の時系列
+（``aieo_resonance_history.csv``）か全体の安定度ログを読み、それぞれ
+0〜1の指数へそろえる。共鳴度が対象別なら対象ごとに as-of 結合する。
+
+結合結果は ``aieo_effect_composite_log.csv`` へ書き出す。Effect Analyzer の
+``aieo_effect_log.csv`` とは別のファイルにする。
+"""
+
+import json
+import math
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
 import matplotlib.pyplot as plt
-from datetime import datetime
-
-# CSVファイル読み込み
-vis_df = pd.read_csv('visibility_log.csv')
-res_df = pd.read_csv('resonance_log.csv')
-
-# 空チェック（安全スキップ）
-if vis_df.empty or res_df.empty:
-    print("空のデータが検出されました。AIEO効果の計算をスキップします。")
-    exit(0)
-
-# timestampをdatetime型に変換
-vis_df['timestamp'] = pd.to_datetime(vis_df['timestamp'])
-res_df['timestamp'] = pd.to_datetime(res_df['timestamp'])
-
-# 両方のデータをtimestampで結合
-merged = pd.merge_asof(
-    vis_df.sort_values('timestamp'),
-    res_df.sort_values('timestamp'),
-    on='timestamp',
-    direction='nearest'
+import numpy as np
+import pandas as pd
+
+try:
+    from scripts.aieo_metrics_store import (
+        load_metrics,
+        read_appended_rows,
+        read_csv_header,
+        tail_digest,
+    )
+    from scripts.aieo_resonance_history import RESONANCE_HISTORY, format_timestamps
+    from scripts.aieo_timestamps import UNITS, parse_timestamps
+    from scripts.aieo_visibility_source import (
+        VisibilitySchema,
+        detect_schema,
+        normalize_visibility_frame,
+    )
+except ImportError:  # python scripts/aieo_effect_composite.py として実行した場合
+    from aieo_metrics_store import (
+        load_metrics,
+        read_appended_rows,
+        read_csv_header,
+        tail_digest,
+    )
+    from aieo_resonance_history import RESONANCE_HISTORY, format_timestamps
+    from aieo_timestamps import UNITS, parse_timestamps
+    from aieo_visibility_source import (
+        VisibilitySchema,
+        detect_schema,
+        normalize_visibility_frame,
+    )
+
+VISIBILITY_FILES = (Path("aieo_visibility_metrics.csv"), Path("visibility_log.csv"))
+RESONANCE_FILES = (RESONANCE_HISTORY, Path("aieo_resonance_log.csv"))
+OUTPUT_LOG = Path("aieo_effect_composite_log.csv")
+CHART_FILE = "aieo_effect_composite_chart.png"
+# 空欄なら時刻差の上限を設けない（例: "6h"）。
+ASOF_TOLERANCE = os.getenv("AIEO_COMPOSITE_TOLERANCE", "")
+ASOF_DIRECTION = os.getenv("AIEO_COMPOSITE_DIRECTION", "nearest")
+SMOOTHING_WINDOW = int(os.getenv("AIEO_COMPOSITE_SMOOTHING", "3"))
+# 追記分だけを結合するための状態。失われても全体の再計算に戻るだけ。
+COMPOSITE_STATE_FILE = Path(
+    os.getenv("AIEO_EFFECT_COMPOSITE_STATE", ".aieo_cache/effect_composite_state.json")
 )
+INCREMENTAL = os.getenv("AIEO_EFFECT_COMPOSITE_INCREMENTAL", "1") != "0"
+# 旧版履歴の検索結果件数は、この件数で1になる対数目盛で指数にする。
+LEGACY_RESULTS_SCALE = 1_000_000
+OUTPUT_COLUMNS = [
+    "timestamp",
+    "entity",
+    "visibility_index",
+    "resonance_index",
+    "resonance_timestamp",
+    "aieo_effect",
+    "aieo_effect_smooth",
+]
+
+
+def adapt_visibility(frame: pd.DataFrame, schema: VisibilitySchema) -> pd.DataFrame:
+    """正規化済みの可視性行を、timestamp・entity・visibility_index（0〜1）にする。"""
+    values = frame["value"].astype(float)
+    if schema.name == "legacy":
+        index = np.log1p(values.clip(lower=0)) / math.log1p(LEGACY_RESULTS_SCALE)
+    else:
+        index = values / 100.0
+    return pd.DataFrame(
+        {
+            "timestamp": frame["timestamp"],
+            "entity": frame["keyword"].astype(str),
+            "visibility_index": index.clip(0.0, 1.0),
+        }
+    )
+
+
+def resonance_columns(header: Sequence[str]) -> Tuple[List[str], Optional[str]]:
+    """共鳴度ファイルから読む列と、対象名の列（全体の値ならNone）を返す。"""
+    columns = set(header)
+    if {"timestamp", "name", "resonance"}.issubset(columns):
+        return ["timestamp", "name", "resonance"], "name"
+    if {"timestamp", "resonance_index"}.issubset(columns):
+        return ["timestamp", "resonance_index"], None
+    raise ValueError(
+        "対応する共鳴度スキーマの必須列がありません: "
+        "history=['name', 'resonance', 'timestamp'], log=['resonance_index', 'timestamp']"
+    )
+
+
+def adapt_resonance(frame: pd.DataFrame) -> pd.DataFrame:
+    """共鳴度の行を、timestamp・entity・resonance_index（0〜1）にする。
+
+    全体の安定度ログのように対象名を持たない場合、entity列は作らない。
+    """
+    _, key_column = resonance_columns(frame.columns)
+    value_column = "resonance" if key_column else "resonance_index"
+    timestamps = frame["timestamp"]
+    if not isinstance(timestamps.dtype, pd.DatetimeTZDtype):
+        timestamps = parse_timestamps(timestamps)
+    adapted = pd.DataFrame(
+        {
+            "timestamp": timestamps,
+            "resonance_index": (
+                pd.to_numeric(frame[value_column], errors="coerce") / 100.0
+            ).clip(0.0, 1.0),
+        }
+    )
+    if key_column:
+        adapted.insert(1, "entity", frame[key_column].astype(str).str.strip())
+    return adapted.dropna().reset_index(drop=True)
+
+
+def asof_join(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    on: str = "timestamp",
+    by: Optional[str] = None,
+    tolerance=None,
+    direction: str = ASOF_DIRECTION,
+) -> pd.DataFrame:
+    """左の各行へ、時刻が最も近い右の行を結合する。左の行の並びを保つ。
+
+    ``by`` を指定すると同じキーの行どうしで結合する。``tolerance`` は
+    ``"6h"`` などの文字列か ``pd.Timedelta`` で、それより離れた行は結合しない。
+    右の時刻は ``<on>_right`` 列として残す。
+    """
+    if isinstance(tolerance, str):
+        tolerance = pd.Timedelta(tolerance) if tolerance else None
+    left = left.reset_index(drop=True)
+    if isinstance(left[on].dtype, pd.DatetimeTZDtype) and isinstance(
+        right[on].dtype, pd.DatetimeTZDtype
+    ):
+        # merge_asof は同じ精度の時刻しか結合できないため、細かい方へそろえる。
+        finest = max(
+            left[on].dtype, right[on].dtype, key=lambda dtype: UNITS.index(dtype.unit)
+        )
+        left = left.assign(**{on: left[on].astype(finest)})
+        right = right.assign(**{on: right[on].astype(finest)})
+    right = right.assign(**{f"{on}_right": right[on]})
+    merged = pd.merge_asof(
+        left.assign(_row=np.arange(len(left))).sort_values(on, kind="stable"),
+        right.sort_values(on, kind="stable"),
+        on=on,
+        by=by,
+        tolerance=tolerance,
+        direction=direction,
+    )
+    return merged.sort_values("_row").drop(columns="_row").reset_index(drop=True)
+
+
+def build_composite_frame(
+    visibility: pd.DataFrame,
+    resonance: pd.DataFrame,
+    tolerance=ASOF_TOLERANCE,
+    direction: str = ASOF_DIRECTION,
+    smoothing_seeds: Optional[Dict[str, List[float]]] = None,
+) -> pd.DataFrame:
+    """指数化した可視性と共鳴度を結合し、AIEO効果と対象ごとの移動平均を計算する。
+
+    ``smoothing_seeds`` は前回までの対象ごとの直近のAIEO効果で、
+    移動平均の続きを計算するために使う。
+    """
+    by = "entity" if "entity" in resonance.columns else None
+    visibility = visibility.assign(entity=visibility["entity"].astype(str))
+    visibility = visibility.sort_values(["timestamp", "entity"], kind="stable")
+    if by:
+        resonance = resonance.assign(entity=resonance["entity"].astype(str))
+    merged = asof_join(
+        visibility, resonance, by=by, tolerance=tolerance, direction=direction
+    ).rename(columns={"timestamp_right": "resonance_timestamp"})
+    merged["aieo_effect"] = merged["visibility_index"] * merged["resonance_index"]
+
+    seeds = pd.DataFrame(
+        [
+            (entity, value)
+            for entity, values in (smoothing_seeds or {}).items()
+            for value in values
+        ],
+        columns=["entity", "aieo_effect"],
+    ).assign(seed=True)
+    combined = pd.concat([seeds, merged.assign(seed=False)], ignore_index=True)
+    combined["aieo_effect"] = combined["aieo_effect"].astype(float)
+    combined["aieo_effect_smooth"] = (
+        combined.groupby("entity", sort=False)["aieo_effect"]
+        .rolling(SMOOTHING_WINDOW, min_periods=1)
+        .mean()
+        .reset_index(level=0, drop=True)
+    )
+    result = combined.loc[~combined["seed"].astype(bool)].reset_index(drop=True)
+    return result[OUTPUT_COLUMNS]
+
+
+def _render(frame: pd.DataFrame, with_header: bool) -> str:
+    # 移動平均は計算を始めた位置で末尾の桁が揺れるため、丸めて書き出す。
+    rendered = frame.round({"aieo_effect": 6, "aieo_effect_smooth": 6})
+    for column in ("timestamp", "resonance_timestamp"):
+        present = rendered[column].notna()
+        text = pd.Series("", index=rendered.index, dtype=object)
+        if present.any():
+            text.loc[present] = format_timestamps(rendered.loc[present, column])
+        rendered[column] = text
+    return rendered.to_csv(index=False, header=with_header)
+
+
+def _select(paths: Sequence[Path]) -> Optional[Path]:
+    for path in paths:
+        if path.exists() and path.stat().st_size > 0:
+            return path
+    return None
+
+
+def _load_visibility(
+    path: Path, schema: VisibilitySchema, after: Optional[pd.Timestamp]
+) -> pd.DataFrame:
+    """可視性をストアから読み込み、指数化する。afterより後の行だけに絞れる。"""
+    filters = [] if after is None else [("timestamp", ">", after)]
+    frame = load_metrics(path, columns=list(schema.columns), filters=filters)
+    if after is not None and frame.empty:
+        return pd.DataFrame(
+            {
+                "timestamp": frame["timestamp"],
+                "entity": pd.Series(dtype=str),
+                "visibility_index": pd.Series(dtype=float),
+            }
+        )
+    return adapt_visibility(normalize_visibility_frame(frame, schema), schema)
+
+
+def _load_resonance(path: Path, since: Optional[pd.Timestamp]) -> pd.DataFrame:
+    columns, _ = resonance_columns(read_csv_header(path))
+    filters = [] if since is None else [("timestamp", ">=", since)]
+    return adapt_resonance(load_metrics(path, columns=columns, filters=filters))
+
+
+def _source_state(path: Path) -> Dict:
+    size = path.stat().st_size
+    return {
+        "path": str(path),
+        "header": read_csv_header(path),
+        "size": size,
+        "digest": tail_digest(path, size),
+    }
+
+
+def _appended_since(path: Path, source: Dict) -> bool:
+    """ファイルが記録時点から追記されただけかを返す。"""
+    return (
+        source["path"] == str(path)
+        and source["header"] == read_csv_header(path)
+        and source["size"] <= path.stat().st_size
+        and source["digest"] == tail_digest(path, source["size"])
+    )
+
+
+def _appended_until(path: Path, offset: int, watermark: pd.Timestamp) -> bool:
+    """記録時点より後に、確定位置以前の時刻を持つ行が追記されたかを返す。"""
+    appended, _ = read_appended_rows(path, offset)
+    timestamps = parse_timestamps(appended["timestamp"])
+    return bool(timestamps.le(watermark).any())
+
+
+def resonance_horizons(resonance: pd.DataFrame) -> pd.Series:
+    """対象ごとの共鳴度の最新時刻を返す。全体の値なら空文字をキーにする。"""
+    if "entity" not in resonance.columns:
+        return pd.Series({"": resonance["timestamp"].max()})
+    return resonance.groupby("entity", sort=False)["timestamp"].max()
+
+
+def _horizon_of(frame: pd.DataFrame, horizons: pd.Series) -> pd.Series:
+    """各行の対象について、共鳴度の最新時刻を返す。共鳴度のない対象はNaT。"""
+    if "" in horizons.index:
+        return pd.Series(horizons[""], index=frame.index)
+    return frame["entity"].map(horizons)
+
+
+def _appended_resonance(path: Path, offset: int) -> pd.DataFrame:
+    """記録時点より後に追記された共鳴度の行を返す。"""
+    columns, _ = resonance_columns(read_csv_header(path))
+    appended, _ = read_appended_rows(path, offset)
+    return adapt_resonance(appended.reindex(columns=columns))
+
+
+def _load_composite_state(
+    state_file: Path, visibility_file: Path, resonance_file: Path, output_file: Path
+) -> Optional[Dict]:
+    if not state_file.exists() or not output_file.exists():
+        return None
+    try:
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+        if (
+            not _appended_since(visibility_file, state["visibility"])
+            or not _appended_since(resonance_file, state["resonance"])
+            or state["settings"] != _settings()
+            or state["output"] != str(output_file)
+            or state["final_size"] > output_file.stat().st_size
+            or state["final_digest"] != tail_digest(output_file, state["final_size"])
+        ):
+            return None
+        state["watermark"] = pd.Timestamp(state["watermark"])
+        state["horizons"] = pd.to_datetime(pd.Series(state["horizons"]), utc=True)
+        state["carried"] = pd.DataFrame(state["carried"])
+        state["carried"]["timestamp"] = pd.to_datetime(
+            state["carried"]["timestamp"], utc=True
+        ).astype("datetime64[us, UTC]")
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return state
+
+
+def _settings() -> Dict:
+    return {
+        "tolerance": ASOF_TOLERANCE,
+        "direction": ASOF_DIRECTION,
+        "smoothing": SMOOTHING_WINDOW,
+    }
+
+
+def update_composite_log(
+    visibility_file: Optional[Path] = None,
+    resonance_file: Optional[Path] = None,
+    output_file: Path = OUTPUT_LOG,
+    state_file: Path = COMPOSITE_STATE_FILE,
+    incremental: bool = INCREMENTAL,
+) -> bool:
+    """AIEO効果のログを更新し、追記分だけの結合で済んだかを返す。
+
+    可視性行は、同じ対象の共鳴度の最新時刻以前なら、後から届く共鳴度の行で
+    結合先が変わらないため確定とする。時刻順の出力の先頭から、未確定の行を
+    含まない時刻までを確定位置とし、次回以降は読み直さずにそれより後の
+    可視性行だけを結合する。確定位置より後の行は毎回結合し直して書き換える。
+    """
+    visibility_file = Path(
+        visibility_file or _select(VISIBILITY_FILES) or VISIBILITY_FILES[0]
+    )
+    resonance_file = Path(
+        resonance_file or _select(RESONANCE_FILES) or RESONANCE_FILES[0]
+    )
+    output_file, state_file = Path(output_file), Path(state_file)
+    schema = detect_schema(read_csv_header(visibility_file))
+
+    state = None
+    if incremental:
+        state = _load_composite_state(
+            state_file, visibility_file, resonance_file, output_file
+        )
+    appended = None
+    if state is not None:
+        appended = _appended_resonance(resonance_file, state["resonance"]["size"])
+        late = appended["timestamp"].le(_horizon_of(appended, state["horizons"]))
+        # 確定した行の結合先が変わり得る行が後から追記された場合は、全体を結合し直す。
+        if late.any() or _appended_until(
+            visibility_file, state["visibility"]["size"], state["watermark"]
+        ):
+            state = None
+    # 読み込み中の追記分は次回に回すため、読む前の位置を記録する。
+    sources = {
+        "visibility": _source_state(visibility_file),
+        "resonance": _source_state(resonance_file),
+    }
+    if state is None:
+        watermark, carried, seeds, final_size = None, None, {}, 0
+    else:
+        watermark, carried = state["watermark"], state["carried"]
+        seeds, final_size = state["seeds"], state["final_size"]
+
+    visibility = _load_visibility(visibility_file, schema, watermark)
+    resonance = _load_resonance(resonance_file, watermark)
+    if state is not None:
+        # 確定位置より前でも、その対象の最新時刻より後に追記された共鳴度は
+        # 未確定の行の結合先になり得るため、持ち越した行とあわせて加える。
+        earlier = appended.loc[appended["timestamp"] < watermark]
+        resonance = pd.concat(
+            [frame for frame in (carried, earlier, resonance) if not frame.empty],
+            ignore_index=True,
+        )
+    if state is None and (visibility.empty or resonance.empty):
+        raise ValueError("可視性または共鳴度に有効な行がありません")
+
+    if visibility.empty or resonance.empty:
+        composite = pd.DataFrame(columns=OUTPUT_COLUMNS)
+        final = pd.Series(False, index=composite.index)
+    else:
+        composite = build_composite_frame(visibility, resonance, smoothing_seeds=seeds)
+        horizons = resonance_horizons(resonance)
+        final = composite["timestamp"].le(_horizon_of(composite, horizons))
+        if not final.all():
+            # 出力は時刻順なので、最初の未確定行の時刻より前だけを確定する。
+            final = composite["timestamp"].lt(composite.loc[~final, "timestamp"].min())
+    final_rows, pending_rows = composite.loc[final], composite.loc[~final]
+
+    # 前回の未確定行を切り捨て、確定行・未確定行の順に書き足す。
+    with output_file.open("r+b" if state is not None else "wb") as file:
+        file.truncate(final_size)
+        file.seek(final_size)
+        if not final_rows.empty or final_size == 0:
+            file.write(_render(final_rows, with_header=final_size == 0).encode("utf-8"))
+        final_size = file.tell()
+        file.write(_render(pending_rows, with_header=False).encode("utf-8"))
+
+    if not final_rows.empty:
+        watermark = final_rows["timestamp"].max()
+        for entity, values in final_rows.groupby("entity", sort=False)["aieo_effect"]:
+            history = seeds.get(entity, []) + [
+                None if pd.isna(value) else float(value) for value in values
+            ]
+            seeds[entity] = history[len(history) - SMOOTHING_WINDOW + 1 :]
+    if incremental and watermark is not None:
+        # 次回は確定位置以降の共鳴度だけを読むため、それより前の最新行を持ち越す。
+        earlier = resonance.loc[resonance["timestamp"] < watermark]
+        keys = ["entity"] if "entity" in earlier.columns else []
+        earlier = earlier.sort_values("timestamp", kind="stable")
+        carried = earlier.groupby(keys, sort=False).tail(1) if keys else earlier.tail(1)
+        carried = carried.assign(timestamp=format_timestamps(carried["timestamp"]))
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = state_file.with_suffix(".tmp")
+        temp_path.write_text(
+            json.dumps(
+                {
+                    **sources,
+                    "settings": _settings(),
+                    "output": str(output_file),
+                    "final_size": final_size,
+                    "final_digest": tail_digest(output_file, final_size),
+                    "watermark": watermark.isoformat(),
+                    # 対象ごとの共鳴度の最新時刻。これ以前の共鳴度が後から届いたら作り直す。
+                    "horizons": {
+                        str(entity): timestamp.isoformat()
+                        for entity, timestamp in resonance_horizons(resonance).items()
+                    },
+                    "carried": carried.to_dict("list"),
+                    "seeds": seeds,
+                },
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(temp_path, state_file)
+    return state is not None
 
-# AIEO効果を計算（Visibility × Resonance）
-merged['aieo_effect'] = merged['visibility_index'] * merged['resonance_index']
 
-# ローリング平均でスムージング
-merged['aieo_effect_smooth'] = merged['aieo_effect'].rolling(window=3, min_periods=1).mean()
+def main() -> None:
+    """AIEO効果のログとグラフを生成する。"""
+    if _select(VISIBILITY_FILES) is None or _select(RESONANCE_FILES) is None:
+        print("空のデータが検出されました。AIEO効果の計算をスキップします。")
+        return
+    if update_composite_log():
+        print(f"✓ {OUTPUT_LOG}へ追記分の結合結果を追加しました")
 
-# グラフ生成
-plt.figure(figsize=(10, 5))
-plt.plot(merged['timestamp'], merged['aieo_effect_smooth'], color='purple', marker='o', label='AIEO Effect (Smooth)')
-plt.title("AIEO Effect Index (Visibility × Resonance)")
-plt.xlabel("Timestamp (UTC)")
-plt.ylabel("AIEO Effect Index (0–1)")
-plt.grid(True)
-plt.legend()
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig("aieo_effect_chart.png")
+    merged = pd.read_csv(OUTPUT_LOG)
+    merged["timestamp"] = pd.to_datetime(merged["timestamp"], format="ISO8601", utc=True)
+    plt.figure(figsize=(10, 5))
+    for entity, group in merged.groupby("entity", sort=False):
+        plt.plot(
+            group["timestamp"],
+            group["aieo_effect_smooth"],
+            marker="o",
+            label=f"{entity} (Smooth)",
+        )
+    plt.title("AIEO Effect Index (Visibility × Resonance)")
+    plt.xlabel("Timestamp (UTC)")
+    plt.ylabel("AIEO Effect Index (0–1)")
+    plt.grid(True)
+    plt.legend()
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig(CHART_FILE)
+    plt.close()
+    print(f"✅ {CHART_FILE} と {OUTPUT_LOG} を生成しました。")
 
-# ログ保存
-merged[['timestamp', 'aieo_effect_smooth']].to_csv("aieo_effect_log.csv", index=False)
 
-print("✅ aieo_effect_chart.png と aieo_effect_log.csv を生成しました。")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Nitterインスタンスごとの成功率と応答時間を、実行をまたいで記録する。
+
+記録は成功率（試行の少ないインスタンスを極端に扱わないよう平滑化した値）の
+高い順、同率なら応答時間の短い順にインスタンスを並べるために使う。
+連続して失敗したインスタンスは一定時間「停止中」とみなし、稼働中の
+インスタンスがすべて失敗した場合だけ試す。
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 連続してこの回数失敗したインスタンスを停止中とみなす。
+DEAD_AFTER_FAILURES = int(os.getenv("AIEO_NITTER_DEAD_AFTER", "3"))
+# 停止中のインスタンスを、最後の失敗からこの時間が経つまで後回しにする。
+DEAD_RETRY_HOURS = float(os.getenv("AIEO_NITTER_DEAD_RETRY_HOURS", "24"))
+# 応答時間の指数移動平均で、最新の計測に掛ける重み。
+LATENCY_SMOOTHING = 0.3
+
+
+class InstanceHealth:
+    """インスタンスの成功・失敗と応答時間をJSONファイルへ保存する。"""
+
+    def __init__(
+        self,
+        path: Optional[Path],
+        now: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self.path = Path(path) if path is not None else None
+        self._now = now
+        self._lock = threading.Lock()
+        self.instances: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data.get("instances", {}) if isinstance(data, dict) else {}
+
+    def save(self) -> None:
+        """記録を保存する。取得の完了ごとに別スレッドから呼ばれても壊れない。"""
+        if self.path is None:
+            return
+        with self._lock:
+            payload = json.dumps(
+                {"instances": self.instances}, indent=2, ensure_ascii=False
+            )
+            # 同じ一時ファイルへ同時に書かないよう、置き換えまでロックを保持する。
+            temp_path = self.path.with_name(self.path.name + ".tmp")
+            temp_path.write_text(payload + "\n", encoding="utf-8")
+            os.replace(temp_path, self.path)
+
+    def _record(self, instance: str) -> Dict:
+        return self.instances.setdefault(
+            instance,
+            {
+                "successes": 0,
+                "failures": 0,
+                "consecutive_failures": 0,
+                "latency_seconds": None,
+                "last_success": None,
+                "last_failure": None,
+            },
+        )
+
+    def record_success(self, instance: str, latency_seconds: float) -> None:
+        with self._lock:
+            record = self._record(instance)
+            record["successes"] += 1
+            record["consecutive_failures"] = 0
+            previous = record["latency_seconds"]
+            latency = (
+                latency_seconds
+                if previous is None
+                else previous + LATENCY_SMOOTHING * (latency_seconds - previous)
+            )
+            record["latency_seconds"] = round(latency, 3)
+            record["last_success"] = self._now().isoformat()
+
+    def record_failure(self, instance: str) -> None:
+        with self._lock:
+            record = self._record(instance)
+            record["failures"] += 1
+            record["consecutive_failures"] += 1
+            record["last_failure"] = self._now().isoformat()
+
+    def success_rate(self, instance: str) -> float:
+        """試行のないインスタンスを0.5とする、平滑化した成功率。"""
+        record = self.instances.get(instance, {})
+        successes = record.get("successes", 0)
+        return (successes + 1) / (successes + record.get("failures", 0) + 2)
+
+    def is_dead(self, instance: str) -> bool:
+        record = self.instances.get(instance)
+        if not record or record["consecutive_failures"] < DEAD_AFTER_FAILURES:
+            return False
+        last_failure = datetime.fromisoformat(record["last_failure"])
+        return self._now() - last_failure < timedelta(hours=DEAD_RETRY_HOURS)
+
+    def rank(self, instances: Sequence[str]) -> Tuple[List[str], List[str]]:
+        """稼働中・停止中のインスタンスを、それぞれ試す順に並べて返す。"""
+
+        def key(instance: str) -> Tuple[float, float]:
+            latency = self.instances.get(instance, {}).get("latency_seconds")
+            return (-self.success_rate(instance), latency if latency is not None else 0.0)
+
+        ordered = sorted(instances, key=key)
+        alive = [instance for instance in ordered if not self.is_dead(instance)]
+        dead = [instance for instance in ordered if self.is_dead(instance)]
+        return alive, dead
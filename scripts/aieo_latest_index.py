@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""メトリクスCSVについて、対象ごとの最新行だけを保持する小さな索引。
+
+索引はCSVの横の ``<CSV名>.latest.json`` に置き、畳み込んだ位置までの
+CSVのサイズと末尾のハッシュを記録する。追記のたびに書き込み側が新しい
+行だけを畳み込み、読み込み側は対象数に比例する時間で最新値を得る。
+チェックアウトし直してmtimeが変わっても、記録した位置までの内容が同じなら
+索引は使え、その後ろに追記された行（``git pull`` など）だけを読み足す。
+内容が書き換えられていれば、CSV全体から作り直す。
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Sequence
+
+import pandas as pd
+
+try:
+    from scripts.aieo_metrics_store import iter_appended_chunks, load_metrics, tail_digest
+except ImportError:  # scripts/ を直接実行した場合
+    from aieo_metrics_store import iter_appended_chunks, load_metrics, tail_digest
+
+INDEX_SUFFIX = ".latest.json"
+TIMESTAMP_COLUMN = "timestamp"
+
+
+def index_path(path: Path) -> Path:
+    """CSVに対応する索引のパスを返す。"""
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _parse_timestamp(value) -> Optional[pd.Timestamp]:
+    parsed = pd.to_datetime(value, format="mixed", errors="coerce", utc=True)
+    return None if pd.isna(parsed) else parsed
+
+
+class LatestIndex:
+    """キー列ごとに、timestampが最も新しい行の値を保持する。"""
+
+    def __init__(self, csv_path: Path, key_column: str, value_column: str) -> None:
+        self.csv_path = Path(csv_path)
+        self.key_column = key_column
+        self.value_column = value_column
+        self.path = index_path(self.csv_path)
+
+    def _load(self) -> Optional[Dict]:
+        if not self.path.exists():
+            return None
+        try:
+            index = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(index, dict) or index.get("columns") != [
+            self.key_column,
+            self.value_column,
+        ]:
+            return None
+        return index
+
+    def _save(self, entries: Dict[str, Dict], size: int) -> None:
+        index = {
+            "columns": [self.key_column, self.value_column],
+            "size": size,
+            "digest": tail_digest(self.csv_path, size),
+            "entries": entries,
+        }
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        temp_path.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp_path, self.path)
+
+    def _covers(self, index: Optional[Dict], size: int) -> bool:
+        """索引が畳み込んだ位置まで、CSVの内容が変わっていないかを返す。"""
+        if index is None or not isinstance(index.get("entries"), dict):
+            return False
+        try:
+            return 0 < index["size"] <= size and index["digest"] == tail_digest(
+                self.csv_path, index["size"]
+            )
+        except (OSError, KeyError, TypeError):
+            return False
+
+    def _fold(self, entries: Dict[str, Dict], rows: Sequence[Mapping]) -> None:
+        """行を順に畳み込む。同時刻なら後の行を優先する。"""
+        for row in rows:
+            key = str(row.get(self.key_column, "")).strip()
+            timestamp = _parse_timestamp(row.get(TIMESTAMP_COLUMN))
+            value = pd.to_numeric(row.get(self.value_column), errors="coerce")
+            if not key or timestamp is None or pd.isna(value):
+                continue
+            current = entries.get(key)
+            if current is None or timestamp >= pd.Timestamp(current["timestamp"]):
+                entries[key] = {
+                    "timestamp": timestamp.isoformat(),
+                    "value": float(value),
+                }
+
+    def rebuild(self) -> Dict[str, Dict]:
+        """CSV全体から索引を作り直す。"""
+        stat = self.csv_path.stat()
+        frame = load_metrics(
+            self.csv_path,
+            columns=[TIMESTAMP_COLUMN, self.key_column, self.value_column],
+        )
+        frame[self.key_column] = frame[self.key_column].astype("string").str.strip()
+        frame[self.value_column] = pd.to_numeric(
+            frame[self.value_column], errors="coerce"
+        )
+        frame = frame.dropna()
+        frame = frame[frame[self.key_column].str.len().gt(0)]
+        latest = (
+            frame.sort_values(TIMESTAMP_COLUMN, kind="stable")
+            .groupby(self.key_column, sort=False)
+            .tail(1)
+        )
+        entries = {
+            str(key): {"timestamp": timestamp.isoformat(), "value": float(value)}
+            for key, timestamp, value in zip(
+                latest[self.key_column],
+                latest[TIMESTAMP_COLUMN],
+                latest[self.value_column],
+            )
+        }
+        self._save(entries, stat.st_size)
+        return entries
+
+    def entries(self) -> Dict[str, Dict]:
+        """キーごとの最新のtimestampと値を返す。
+
+        索引の後ろに追記された行だけを読み足し、内容が書き換えられていれば作り直す。
+        """
+        index = self._load()
+        size = self.csv_path.stat().st_size
+        if not self._covers(index, size):
+            return self.rebuild()
+        if index["size"] == size:
+            return index["entries"]
+        entries = index["entries"]
+        offset = index["size"]
+        for chunk, offset in iter_appended_chunks(self.csv_path, offset):
+            self._fold(entries, chunk.to_dict("records"))
+        self._save(entries, offset)
+        return entries
+
+    def values(self) -> Dict[str, float]:
+        """キーごとの最新値を返す。"""
+        return {key: entry["value"] for key, entry in self.entries().items()}
+
+    def record_append(
+        self, rows: Sequence[Mapping], before: os.stat_result, after: os.stat_result
+    ) -> None:
+        """追記した行を索引へ畳み込む。追記前の状態と一致しない索引は触らない。"""
+        index = self._load()
+        if not self._covers(index, before.st_size) or index["size"] != before.st_size:
+            # 追記前の行を畳み込んでいない索引は、次に読み込む側が読み足す。
+            return
+        entries = index["entries"]
+        self._fold(entries, rows)
+        self._save(entries, after.st_size)
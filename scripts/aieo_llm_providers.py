@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""AIEO検証で質問するAIプロバイダーの登録簿。
+
+各プロバイダーは最初の質問でSDKをimportしてクライアントを作り、以後の
+質問では同じクライアント（とその接続プール）を使い回す。新しいAIは
+``LLMProvider`` を継承して ``ProviderRegistry.register`` で追加する。
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# 応答の最大トークン数。
+MAX_TOKENS = int(os.getenv("AIEO_VERIFICATION_MAX_TOKENS", "500"))
+
+
+class LLMProvider(ABC):
+    """質問文を1つのAIへ送り、検証ログの形式で結果を返すプロバイダー。
+
+    サブクラスは ``name``・``label``・``model``・``api_key_env``・``params`` を
+    定め、``_create_client`` と ``_complete`` を実装する。実装が欠けた
+    サブクラスは、検証の途中ではなく生成時に ``TypeError`` になる。
+    """
+
+    name = ""
+    label = ""
+    # 結果の 'model' に記録する名前。
+    model = ""
+    api_key_env = ""
+    # 応答を左右するリクエストのパラメータ。応答の再利用のキーにも使う。
+    params: Dict[str, Any] = {}
+
+    def __init__(self, api_key: Optional[str] = None, timeout: Optional[float] = None) -> None:
+        self.api_key = os.getenv(self.api_key_env, "") if api_key is None else api_key
+        self.timeout = timeout
+        self._client: Any = None
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _create_client(self) -> Any:
+        """SDKをimportしてクライアントを作る。"""
+
+    @abstractmethod
+    def _complete(self, client: Any, prompt: str) -> str:
+        """クライアントで質問し、応答の本文を返す。"""
+
+    @property
+    def client(self) -> Any:
+        """クライアントを初回だけ作り、以後は同じものを返す。"""
+        if self._client is None:
+            # 並列の問い合わせが同時に初回を迎えても、作るのは1つだけにする。
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def query(self, prompt: str) -> dict:
+        """質問して結果を返す。APIキーがなければ問い合わせずにskippedを返す。"""
+        if not self.api_key:
+            return {"status": "skipped", "reason": "API key not set", "model": self.name}
+        try:
+            response_text = self._complete(self.client, prompt)
+        except Exception as e:
+            print(f"{self.label} error: {e}")
+            return {"status": "error", "error": str(e), "model": self.name}
+        return {"status": "success", "response": response_text, "model": self.model}
+
+    def close(self) -> None:
+        """クライアントが接続プールを持つ場合は閉じる。"""
+        with self._lock:
+            client, self._client = self._client, None
+        close = getattr(client, "close", None)
+        if callable(close):
+            close()
+
+
+class ClaudeProvider(LLMProvider):
+    name = "claude"
+    label = "Claude"
+    model = "claude-3-5-sonnet"
+    api_key_env = "ANTHROPIC_API_KEY"
+    params = {"model": "claude-3-5-sonnet-20241022", "max_tokens": MAX_TOKENS}
+
+    def _create_client(self) -> Any:
+        from anthropic import Anthropic
+
+        return Anthropic(api_key=self.api_key, timeout=self.timeout)
+
+    def _complete(self, client: Any, prompt: str) -> str:
+        message = client.messages.create(
+            messages=[{"role": "user", "content": prompt}], **self.params
+        )
+        return message.content[0].text
+
+
+class ChatGPTProvider(LLMProvider):
+    name = "chatgpt"
+    label = "ChatGPT"
+    model = "gpt-4o"
+    api_key_env = "OPENAI_API_KEY"
+    params = {"model": "gpt-4o", "max_tokens": MAX_TOKENS, "temperature": 0.7}
+
+    def _create_client(self) -> Any:
+        from openai import OpenAI
+
+        return OpenAI(api_key=self.api_key, timeout=self.timeout)
+
+    def _complete(self, client: Any, prompt: str) -> str:
+        response = client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}], **self.params
+        )
+        return response.choices[0].message.content
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    label = "Gemini"
+    model = "gemini-2.5-flash"
+    api_key_env = "GEMINI_API_KEY"
+    params = {"model": "gemini-2.5-flash"}
+
+    def _create_client(self) -> Any:
+        import google.generativeai as genai
+
+        # configure はプロセス全体の設定なので、クライアントと同じく1回だけ呼ぶ。
+        genai.configure(api_key=self.api_key)
+        return genai.GenerativeModel(self.params["model"])
+
+    def _complete(self, client: Any, prompt: str) -> str:
+        options = {"timeout": self.timeout} if self.timeout else None
+        return client.generate_content(prompt, request_options=options).text
+
+
+DEFAULT_PROVIDERS = (ClaudeProvider, ChatGPTProvider, GeminiProvider)
+
+
+class ProviderRegistry:
+    """名前からプロバイダーを引く登録簿。登録順に問い合わせ・記録する。"""
+
+    def __init__(self, providers: Iterable[LLMProvider] = ()) -> None:
+        self._providers: Dict[str, LLMProvider] = {}
+        for provider in providers:
+            self.register(provider)
+
+    @classmethod
+    def default(cls, timeout: Optional[float] = None) -> "ProviderRegistry":
+        """Claude・ChatGPT・Geminiを登録した登録簿を作る。"""
+        return cls(provider_class(timeout=timeout) for provider_class in DEFAULT_PROVIDERS)
+
+    def register(self, provider: LLMProvider) -> None:
+        """プロバイダーを追加する。同じ名前なら置き換える。"""
+        self._providers[provider.name] = provider
+
+    def get(self, name: str) -> LLMProvider:
+        return self._providers[name]
+
+    def names(self) -> List[str]:
+        return list(self._providers)
+
+    def query_functions(self) -> Dict[str, Callable[[str], dict]]:
+        """プロバイダー名から質問関数への対応を返す。"""
+        return {name: provider.query for name, provider in self._providers.items()}
+
+    def close(self) -> None:
+        for provider in self._providers.values():
+            provider.close()
@@ -1,104 +1,87 @@
+import hashlib
 import json
+import math
 import os
+import re
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict
-
-import pandas as pd
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from scripts.aieo_concept_store import open_concept_store
+    from scripts.aieo_latest_index import LatestIndex
+    from scripts.aieo_memory_transaction import (
+        commit_memory,
+        memory_revision,
+        retry_on_conflict,
+    )
+    from scripts.aieo_metrics_store import read_csv_header
+    from scripts.aieo_visibility_source import LEGACY_SCHEMA, MODERN_SCHEMA
+except ImportError:  # python scripts/aieo_memory_engine.py として実行した場合
+    from aieo_concept_store import open_concept_store
+    from aieo_latest_index import LatestIndex
+    from aieo_memory_transaction import commit_memory, memory_revision, retry_on_conflict
+    from aieo_metrics_store import read_csv_header
+    from aieo_visibility_source import LEGACY_SCHEMA, MODERN_SCHEMA
 
 MEMORY_FILE = "aieo_memory.json"
+# 実行のたびに変わる対話数・更新時刻・直近の対話は、描画する文書へ含めずここへ書く。
+STATUS_FILE = os.getenv("AIEO_MEMORY_STATUS", "aieo_memory_status.json")
+# 概念ごとの描画結果を内容のハッシュで保持し、実行をまたいで再利用する。
+FRAGMENT_CACHE_FILE = Path(
+    os.getenv("AIEO_MEMORY_FRAGMENT_CACHE", ".aieo_cache/memory_fragments.json")
+)
+# 状態ファイルとサマリーに載せる直近の対話の件数。
+RECENT_INTERACTIONS = 5
+# 保存時に interaction_history へ残す直近件数。古い分は日別・種類別に集約する。
+HOT_INTERACTIONS = int(os.getenv("AIEO_MEMORY_HOT_INTERACTIONS", "50"))
+ARCHIVE_FILE = os.getenv("AIEO_MEMORY_ARCHIVE", "aieo_memory_archive.jsonl")
+# 1つの集約に残す異なるinsightの上限。
+MAX_ROLLUP_INSIGHTS = 20
+# 0なら全概念を出力する。正の値なら推定トークン数をこの範囲に収める。
+PROMPT_TOKEN_BUDGET = int(os.getenv("AIEO_PROMPT_TOKEN_BUDGET", "0"))
+# 予算付きの出力で、属性のリストから残す要素数。
+PROMPT_MAX_LIST_ITEMS = 8
+# last_updated の経過日数に対する重みの半減期。
+RECENCY_HALF_LIFE_DAYS = 30
+CATEGORY_PRIORITY = {
+    "visibility_status": 3,
+    "creation_pattern": 2,
+    "behavioral_pattern": 2,
+    "dynamic_vocabulary": 1,
+}
+# かな・漢字・全角記号は1文字を1トークン、それ以外は4文字を1トークンと数える。
+_WIDE_CHARACTERS = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
 MODERN_VISIBILITY_FILE = Path("aieo_visibility_metrics.csv")
 LEGACY_VISIBILITY_FILE = Path("visibility_log.csv")
 
 
-def _normalize_timestamp(series: pd.Series) -> pd.Series:
-    """混在する日時形式をUTCのdatetimeへ正規化する。"""
-    return pd.to_datetime(series, format="mixed", errors="coerce", utc=True)
-
-
 def load_visibility_snapshot(
     modern_path: Path = MODERN_VISIBILITY_FILE,
     legacy_path: Path = LEGACY_VISIBILITY_FILE,
 ) -> Dict[str, Any]:
     """人物別メトリクスを優先し、必要な場合だけ旧版履歴へ戻す。"""
-    if modern_path.exists() and modern_path.stat().st_size > 0:
-        df = pd.read_csv(modern_path)
-        required = {"timestamp", "name", "visibility_score"}
-        missing = sorted(required - set(df.columns))
-        if missing:
-            raise ValueError(f"人物別可視性メトリクスに必須列がありません: {missing}")
-
-        normalized = df[["timestamp", "name", "visibility_score"]].copy()
-        normalized["timestamp"] = _normalize_timestamp(normalized["timestamp"])
-        normalized["name"] = normalized["name"].astype("string").str.strip()
-        normalized["visibility_score"] = pd.to_numeric(
-            normalized["visibility_score"], errors="coerce"
-        )
-        normalized = normalized.dropna(
-            subset=["timestamp", "name", "visibility_score"]
-        )
-        normalized = normalized[normalized["name"].str.len().gt(0)]
-        if normalized.empty:
-            raise ValueError("人物別可視性メトリクスに有効な行がありません")
-
-        latest = (
-            normalized.sort_values("timestamp")
-            .groupby("name", as_index=False, sort=False)
-            .tail(1)
-        )
-        values = {
-            str(row["name"]): float(row["visibility_score"])
-            for _, row in latest.iterrows()
-        }
-        primary_name = "KGNINJA" if "KGNINJA" in values else next(iter(values))
-        return {
-            "source": str(modern_path),
-            "metric_type": "visibility_score",
-            "values": values,
-            "primary_name": primary_name,
-            "primary_value": values[primary_name],
-        }
-
-    if legacy_path.exists() and legacy_path.stat().st_size > 0:
-        df = pd.read_csv(legacy_path)
-        required = {"timestamp", "keyword", "totalResults"}
-        missing = sorted(required - set(df.columns))
+    sources = (
+        (modern_path, MODERN_SCHEMA, "visibility_score", ("KGNINJA",)),
+        (legacy_path, LEGACY_SCHEMA, "result_count", ("KGNINJA AI", "KGNINJA")),
+    )
+    for path, schema, metric_type, preferred_names in sources:
+        if not path.exists() or path.stat().st_size == 0:
+            continue
+        missing = sorted(set(schema.columns) - set(read_csv_header(path)))
         if missing:
-            raise ValueError(f"旧版可視性履歴に必須列がありません: {missing}")
+            raise ValueError(f"{schema.label}に必須列がありません: {missing}")
 
-        normalized = df[["timestamp", "keyword", "totalResults"]].copy()
-        normalized["timestamp"] = _normalize_timestamp(normalized["timestamp"])
-        normalized["keyword"] = normalized["keyword"].astype("string").str.strip()
-        normalized["totalResults"] = pd.to_numeric(
-            normalized["totalResults"], errors="coerce"
-        )
-        normalized = normalized.dropna(
-            subset=["timestamp", "keyword", "totalResults"]
-        )
-        normalized = normalized[normalized["keyword"].str.len().gt(0)]
-        if normalized.empty:
-            raise ValueError("旧版可視性履歴に有効な行がありません")
-
-        latest = (
-            normalized.sort_values("timestamp")
-            .groupby("keyword", as_index=False, sort=False)
-            .tail(1)
-        )
-        values = {
-            str(row["keyword"]): float(row["totalResults"])
-            for _, row in latest.iterrows()
-        }
+        values = LatestIndex(path, schema.key_column, schema.value_column).values()
+        if not values:
+            raise ValueError(f"{schema.label}に有効な行がありません")
         primary_name = next(
-            (
-                name
-                for name in ("KGNINJA AI", "KGNINJA")
-                if name in values
-            ),
+            (name for name in preferred_names if name in values),
             next(iter(values)),
         )
         return {
-            "source": str(legacy_path),
-            "metric_type": "result_count",
+            "source": str(path),
+            "metric_type": metric_type,
             "values": values,
             "primary_name": primary_name,
             "primary_value": values[primary_name],
@@ -107,11 +90,158 @@ def load_visibility_snapshot(
     raise FileNotFoundError("可視性データが見つかりません")
 
 
+def rollup_interactions(interactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """インタラクションを日付とevent_typeごとの件数・期間・insightへ集約する。"""
+    rollups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for interaction in interactions:
+        timestamp = interaction["timestamp"]
+        key = (timestamp[:10], interaction["event_type"])
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = {
+                "day": key[0],
+                "event_type": key[1],
+                "count": 0,
+                "first_timestamp": timestamp,
+                "last_timestamp": timestamp,
+                "insights": [],
+            }
+        _merge_rollup(
+            rollup,
+            {
+                "count": 1,
+                "first_timestamp": timestamp,
+                "last_timestamp": timestamp,
+                "insights": [interaction.get("insight", "")],
+            },
+        )
+    return list(rollups.values())
+
+
+def _merge_rollup(rollup: Dict[str, Any], other: Dict[str, Any]) -> None:
+    rollup["count"] += other["count"]
+    rollup["first_timestamp"] = min(rollup["first_timestamp"], other["first_timestamp"])
+    rollup["last_timestamp"] = max(rollup["last_timestamp"], other["last_timestamp"])
+    for insight in other["insights"]:
+        if len(rollup["insights"]) >= MAX_ROLLUP_INSIGHTS:
+            break
+        if insight not in rollup["insights"]:
+            rollup["insights"].append(insight)
+
+
+def load_interaction_rollups(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """アーカイブの集約を読み込み、同じ日付・event_typeの行をまとめて返す。"""
+    path = ARCHIVE_FILE if path is None else path
+    if not os.path.exists(path):
+        return []
+    rollups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = (record["day"], record["event_type"])
+            if key in rollups:
+                _merge_rollup(rollups[key], record)
+            else:
+                rollups[key] = {**record, "insights": list(record["insights"])}
+    return sorted(
+        rollups.values(), key=lambda rollup: (rollup["day"], rollup["event_type"])
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """ネットワークを使わず、文字種からトークン数を概算する。"""
+    wide = len(_WIDE_CHARACTERS.findall(text))
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def rank_concepts(
+    concepts: List[Dict[str, Any]], now: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """カテゴリの優先度、信頼度、更新の新しさの合計が高い順に並べる。"""
+    now = now or datetime.now()
+
+    def score(concept: Dict[str, Any]) -> float:
+        try:
+            updated = datetime.fromisoformat(concept["last_updated"])
+        except (KeyError, TypeError, ValueError):
+            recency = 0.0
+        else:
+            if updated.tzinfo is not None:
+                updated = updated.astimezone().replace(tzinfo=None)
+            age_days = max((now - updated).total_seconds() / 86400, 0.0)
+            recency = 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+        priority = CATEGORY_PRIORITY.get(concept.get("category"), 0)
+        return priority + float(concept.get("confidence", 0.0)) + recency
+
+    return sorted(concepts, key=score, reverse=True)
+
+
+class FragmentCache:
+    """概念の描画結果を、描画の種類と概念の内容のハッシュをキーに保持する。
+
+    保存時には今回の実行で使った断片だけを残すため、消えた概念や変わる前の
+    内容の断片はファイルに溜まらない。
+    """
+
+    def __init__(self, path: Optional[Path] = FRAGMENT_CACHE_FILE) -> None:
+        self.path = Path(path) if path else None
+        self.fragments: Dict[str, str] = self._load()
+        self.used: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self) -> Dict[str, str]:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            fragments = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return fragments if isinstance(fragments, dict) else {}
+
+    def render(
+        self,
+        kind: str,
+        concept: Dict[str, Any],
+        renderer: Callable[[Dict[str, Any]], str],
+    ) -> str:
+        """同じ内容の概念を描画済みなら、その結果を返す。"""
+        digest = hashlib.sha256(
+            json.dumps(concept, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        key = f"{kind}:{digest}"
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            self.misses += 1
+            fragment = self.fragments[key] = renderer(concept)
+        else:
+            self.hits += 1
+        self.used[key] = fragment
+        return fragment
+
+    def save(self) -> None:
+        """今回使った断片だけを、一時ファイル経由で保存する。"""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_text(
+            json.dumps(self.used, ensure_ascii=False, sort_keys=True), encoding="utf-8"
+        )
+        os.replace(temp_path, self.path)
+
+
 class AIEOMemoryEngine:
     """AIEOの概念と観測履歴を保持するメモリエンジン。"""
 
-    def __init__(self):
+    def __init__(self, fragments: Optional[FragmentCache] = None):
         self.memory = self._load_memory()
+        # 保存時に、読み込み後の更新がないかを確かめるための版数。
+        self.revision = memory_revision(self.memory)
+        self.concepts = open_concept_store(self.memory["concepts"])
+        self.fragments = fragments or FragmentCache(None)
 
     def _load_memory(self) -> Dict[str, Any]:
         """既存メモリを読み込み、なければ初期化する。"""
@@ -163,11 +293,7 @@ class AIEOMemoryEngine:
         confidence: float = 0.9,
     ):
         """概念を更新または追加する。"""
-        existing = None
-        for index, concept in enumerate(self.memory["concepts"]):
-            if concept["concept_id"] == concept_id:
-                existing = index
-                break
+        existing = self.concepts.get(concept_id)
 
         concept_data = {
             "concept_id": concept_id,
@@ -179,15 +305,15 @@ class AIEOMemoryEngine:
 
         if existing is not None:
             # 既存概念を重視した加重平均で信頼度を更新する。
-            old_conf = self.memory["concepts"][existing]["confidence"]
+            old_conf = existing["confidence"]
             concept_data["confidence"] = min(0.99, old_conf * 0.7 + confidence * 0.3)
-            self.memory["concepts"][existing] = concept_data
+            self.concepts.upsert(concept_data)
             print(
                 f"📝 Updated concept: {concept_id} "
                 f"(confidence: {concept_data['confidence']:.2f})"
             )
         else:
-            self.memory["concepts"].append(concept_data)
+            self.concepts.upsert(concept_data)
             print(f"✨ New concept: {concept_id} (confidence: {confidence:.2f})")
 
     def extract_insight_from_visibility(self, value: float, metric_type: str) -> str:
@@ -215,18 +341,57 @@ class AIEOMemoryEngine:
             return "Established presence - sustained visibility"
         return "Dominant presence - widespread recognition"
 
+    def compact_history(self) -> int:
+        """直近分を超えたインタラクションをアーカイブへ集約し、移した件数を返す。"""
+        history = self.memory["interaction_history"]
+        overflow = len(history) - max(HOT_INTERACTIONS, 0)
+        if overflow <= 0:
+            return 0
+
+        rollups = rollup_interactions(history[:overflow])
+        with open(ARCHIVE_FILE, "a", encoding="utf-8") as file:
+            for rollup in rollups:
+                file.write(json.dumps(rollup, ensure_ascii=False) + "\n")
+        self.memory["interaction_history"] = history[overflow:]
+        meta = self.memory["meta"]
+        meta["archived_interactions"] = meta.get("archived_interactions", 0) + overflow
+        return overflow
+
     def save_memory(self):
-        """メモリをファイルに保存する。"""
-        with open(MEMORY_FILE, "w", encoding="utf-8") as file:
-            json.dump(self.memory, file, indent=2, ensure_ascii=False)
-        print(f"✅ Memory saved to {MEMORY_FILE}")
+        """読み込み後に他の更新がなければ、メモリを一時ファイル経由で置き換える。
 
-    def generate_prompt_context(self) -> str:
-        """LLMプロンプト用のコンテキストを生成する。"""
+        他の書き込みが先に保存していた場合は ``MemoryConflictError`` を送出する。
+        """
+        self.revision = commit_memory(
+            MEMORY_FILE, self.memory, self.revision, prepare=self._prepare_commit
+        )
+        print(f"✅ Memory saved to {MEMORY_FILE} (revision {self.revision})")
+
+    def _prepare_commit(self, memory: Dict[str, Any]) -> None:
+        """競合がないと確認できた後に、履歴の集約と概念の書き出しを行う。"""
+        archived = self.compact_history()
+        if archived:
+            print(f"🗄️ Archived {archived} interactions to {ARCHIVE_FILE}")
+        memory["concepts"] = self.concepts.to_list()
+
+    def generate_prompt_context(self, token_budget: Optional[int] = None) -> str:
+        """LLMプロンプト用のコンテキストを生成する。
+
+        ``token_budget`` が正なら、順位の高い概念から推定トークン数が
+        予算に収まる分だけを、長い属性リストを切り詰めて出力する。
+        """
+        token_budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
         entity = self.memory["entity"]
         concepts = self.memory["concepts"]
+        meta = self.memory["meta"]
+
+        footer = (
+            "\n## Memory Metadata\n"
+            f"- Memory confidence: {meta['memory_confidence']:.1%}\n"
+        )
 
-        context = f"""# AIEO Memory Context
+        def header(count_label: str) -> str:
+            return f"""# AIEO Memory Context
 
 ## Entity Recognition
 - ID: {entity['id']}
@@ -234,39 +399,58 @@ class AIEOMemoryEngine:
 - Origin: {entity['origin']}
 - Inception: {entity['inception_date'][:10]}
 
-## Established Concepts ({len(concepts)} total)
+## Established Concepts ({count_label})
 """
-        for concept in concepts:
-            context += f"\n### {concept['concept_id'].replace('_', ' ').title()}\n"
-            context += f"**Category:** {concept['category']}  \n"
-            context += f"**Confidence:** {concept['confidence']:.1%}  \n"
-            context += "**Attributes:**\n"
-            for key, value in concept["attributes"].items():
-                if isinstance(value, list):
-                    context += f"  - {key}: {', '.join(map(str, value))}\n"
-                else:
-                    context += f"  - {key}: {value}\n"
 
-        meta = self.memory["meta"]
-        context += "\n## Memory Metadata\n"
-        context += f"- Total interactions: {meta['total_interactions']}\n"
-        context += f"- Memory confidence: {meta['memory_confidence']:.1%}\n"
-        context += f"- Last update: {meta['last_memory_update']}\n"
-        return context
+        if token_budget <= 0:
+            fragments = [
+                self.fragments.render("context", concept, _render_concept_context)
+                for concept in concepts
+            ]
+            return "".join([header(f"{len(concepts)} total"), *fragments, footer])
+
+        omitted_note = f"\n_({len(concepts)} lower-ranked concepts omitted)_\n"
+        used = estimate_tokens(
+            header(f"{len(concepts)} of {len(concepts)} total") + omitted_note + footer
+        )
+        fragments = []
+        for concept in rank_concepts(concepts):
+            fragment = self.fragments.render(
+                "context", _truncate_attributes(concept), _render_concept_context
+            )
+            cost = estimate_tokens(fragment)
+            if used + cost <= token_budget:
+                fragments.append(fragment)
+                used += cost
+
+        omitted = len(concepts) - len(fragments)
+        if omitted == 0:
+            return "".join([header(f"{len(concepts)} total"), *fragments, footer])
+        return "".join(
+            [
+                header(f"{len(fragments)} of {len(concepts)} total"),
+                *fragments,
+                f"\n_({omitted} lower-ranked concepts omitted)_\n",
+                footer,
+            ]
+        )
 
     def generate_summary_markdown(self) -> str:
-        """サマリーMarkdownを生成する。"""
+        """サマリーMarkdownを生成する。
+
+        対話数・更新時刻・対話の時刻は実行ごとに変わるため載せず、
+        ``generate_status`` の状態ファイルへ分ける。
+        """
         entity = self.memory["entity"]
         meta = self.memory["meta"]
 
-        markdown = f"""# 🧠 AIEO Memory State
+        parts = [
+            f"""# 🧠 AIEO Memory State
 
 **Entity:** {entity['id']}  
 **Type:** {entity['type']}  
 **Origin:** {entity['origin']}  
-**Memory Confidence:** {meta['memory_confidence']:.1%}  
-**Total Interactions:** {meta['total_interactions']}  
-**Last Update:** {meta['last_memory_update']}
+**Memory Confidence:** {meta['memory_confidence']:.1%}
 
 ---
 
@@ -275,28 +459,92 @@ class AIEOMemoryEngine:
 | Concept ID | Category | Confidence | Last Updated |
 |------------|----------|------------|--------------|
 """
-        for concept in self.memory["concepts"]:
-            markdown += (
-                f"| {concept['concept_id']} | {concept['category']} | "
-                f"{concept['confidence']:.1%} | {concept['last_updated'][:10]} |\n"
+        ]
+        parts.extend(
+            self.fragments.render("row", concept, _render_concept_row)
+            for concept in self.memory["concepts"]
+        )
+        parts.append(
+            f"\n---\n\n## 📝 Recent Interactions (Last {RECENT_INTERACTIONS})\n\n"
+        )
+        for interaction in reversed(
+            self.memory["interaction_history"][-RECENT_INTERACTIONS:]
+        ):
+            parts.append(
+                f"`{interaction['event_type']}`  \n_{interaction['insight']}_\n\n"
             )
+        return "".join(parts)
+
+    def generate_status(self) -> str:
+        """実行ごとに変わるメタデータと直近の対話をJSONで返す。"""
+        meta = self.memory["meta"]
+        status = {
+            "total_interactions": meta["total_interactions"],
+            "memory_confidence": meta["memory_confidence"],
+            "last_memory_update": meta["last_memory_update"],
+            "recent_interactions": [
+                {
+                    key: interaction[key]
+                    for key in ("timestamp", "event_type", "insight")
+                }
+                for interaction in self.memory["interaction_history"][
+                    -RECENT_INTERACTIONS:
+                ]
+            ],
+        }
+        return json.dumps(status, ensure_ascii=False, indent=2) + "\n"
+
+
+def _render_concept_context(concept: Dict[str, Any]) -> str:
+    """プロンプト用コンテキストの概念1件分を描画する。"""
+    lines = [
+        f"\n### {concept['concept_id'].replace('_', ' ').title()}\n",
+        f"**Category:** {concept['category']}  \n",
+        f"**Confidence:** {concept['confidence']:.1%}  \n",
+        "**Attributes:**\n",
+    ]
+    for key, value in concept["attributes"].items():
+        if isinstance(value, list):
+            lines.append(f"  - {key}: {', '.join(map(str, value))}\n")
+        else:
+            lines.append(f"  - {key}: {value}\n")
+    return "".join(lines)
+
+
+def _truncate_attributes(concept: Dict[str, Any]) -> Dict[str, Any]:
+    """長い属性リストを先頭の要素と残り件数の表記へ縮める。"""
+    attributes = {}
+    for key, value in concept["attributes"].items():
+        if isinstance(value, list) and len(value) > PROMPT_MAX_LIST_ITEMS:
+            rest = len(value) - PROMPT_MAX_LIST_ITEMS
+            value = value[:PROMPT_MAX_LIST_ITEMS] + [f"... (+{rest} more)"]
+        attributes[key] = value
+    return {**concept, "attributes": attributes}
+
+
+def _render_concept_row(concept: Dict[str, Any]) -> str:
+    """サマリーの概念表の1行を描画する。"""
+    return (
+        f"| {concept['concept_id']} | {concept['category']} | "
+        f"{concept['confidence']:.1%} | {concept['last_updated'][:10]} |\n"
+    )
 
-        markdown += "\n---\n\n## 📝 Recent Interactions (Last 5)\n\n"
-        for interaction in reversed(self.memory["interaction_history"][-5:]):
-            markdown += (
-                f"**{interaction['timestamp'][:19]}** - "
-                f"`{interaction['event_type']}`  \n"
-            )
-            markdown += f"_{interaction['insight']}_\n\n"
-        return markdown
+
+def write_if_changed(path: str, text: str) -> bool:
+    """既存ファイルと内容のハッシュが異なる場合だけ書き込み、書いたかを返す。"""
+    if os.path.exists(path):
+        with open(path, "rb") as file:
+            current = hashlib.sha256(file.read()).digest()
+        if current == hashlib.sha256(text.encode("utf-8")).digest():
+            return False
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        file.write(text)
+    return True
 
 
 def _ensure_static_concepts(engine: AIEOMemoryEngine) -> None:
     """初回だけ固定のプロジェクト概念と対話概念を登録する。"""
-    if not any(
-        concept["concept_id"] == "kg_project_taxonomy"
-        for concept in engine.memory["concepts"]
-    ):
+    if "kg_project_taxonomy" not in engine.concepts:
         engine.update_concept(
             concept_id="kg_project_taxonomy",
             category="creation_pattern",
@@ -314,10 +562,7 @@ def _ensure_static_concepts(engine: AIEOMemoryEngine) -> None:
             confidence=1.0,
         )
 
-    if not any(
-        concept["concept_id"] == "kg_interaction_style"
-        for concept in engine.memory["concepts"]
-    ):
+    if "kg_interaction_style" not in engine.concepts:
         engine.update_concept(
             concept_id="kg_interaction_style",
             category="behavioral_pattern",
@@ -331,72 +576,111 @@ def _ensure_static_concepts(engine: AIEOMemoryEngine) -> None:
         )
 
 
+def update_memory(
+    apply: Callable[[AIEOMemoryEngine], None],
+    fragments: Optional[FragmentCache] = None,
+) -> AIEOMemoryEngine:
+    """メモリを開いて変更をまとめて適用し、1回で保存する。
+
+    保存時に他の書き込みとの競合を検出したら、読み直して ``apply`` を
+    適用し直す。
+    """
+
+    def attempt() -> AIEOMemoryEngine:
+        engine = AIEOMemoryEngine(fragments)
+        try:
+            apply(engine)
+            engine.save_memory()
+        except BaseException:
+            engine.concepts.close()
+            raise
+        return engine
+
+    return retry_on_conflict(attempt)
+
+
 def main():
     """最新の可視性メトリクスをAIEOメモリへ反映する。"""
     print("🧠 AIEO Memory Engine - Concept Update")
     print("=" * 60)
 
-    engine = AIEOMemoryEngine()
-
     try:
         snapshot = load_visibility_snapshot()
     except FileNotFoundError:
         print("⚠️ 可視性データがないため初期化記録だけを追加します")
-        engine.add_interaction(
-            event_type="system_initialization",
-            context="AIEO Memory Engine first activation",
-            insight="Memory system initialized, awaiting visibility data",
-        )
+        snapshot = None
     else:
-        insight = engine.extract_insight_from_visibility(
-            float(snapshot["primary_value"]), str(snapshot["metric_type"])
-        )
-        engine.add_interaction(
-            event_type="visibility_pulse",
-            context=f"Visibility tracking completed from {snapshot['source']}",
-            insight=insight,
-        )
-        visibility_score = (
-            float(snapshot["primary_value"])
-            if snapshot["metric_type"] == "visibility_score"
-            else min(100.0, float(snapshot["primary_value"]) / 100.0)
-        )
-        engine.update_concept(
-            concept_id="kg_digital_presence",
-            category="visibility_status",
-            attributes={
-                "source": snapshot["source"],
-                "metric_type": snapshot["metric_type"],
-                "primary_entity": snapshot["primary_name"],
-                "primary_value": snapshot["primary_value"],
-                "growth_stage": insight,
-                "tracked_entities": list(snapshot["values"].keys()),
-                "visibility_score": visibility_score,
-            },
-            confidence=0.95,
-        )
-
         print("\n📊 Visibility Data Processed:")
         for name, value in snapshot["values"].items():
             print(f"   {name}: {float(value):,.2f}")
-        print(f"\n💡 Extracted Insight: {insight}")
 
-    _ensure_static_concepts(engine)
-    engine.save_memory()
+    def apply(engine: AIEOMemoryEngine) -> None:
+        if snapshot is None:
+            engine.add_interaction(
+                event_type="system_initialization",
+                context="AIEO Memory Engine first activation",
+                insight="Memory system initialized, awaiting visibility data",
+            )
+        else:
+            insight = engine.extract_insight_from_visibility(
+                float(snapshot["primary_value"]), str(snapshot["metric_type"])
+            )
+            engine.add_interaction(
+                event_type="visibility_pulse",
+                context=f"Visibility tracking completed from {snapshot['source']}",
+                insight=insight,
+            )
+            visibility_score = (
+                float(snapshot["primary_value"])
+                if snapshot["metric_type"] == "visibility_score"
+                else min(100.0, float(snapshot["primary_value"]) / 100.0)
+            )
+            engine.update_concept(
+                concept_id="kg_digital_presence",
+                category="visibility_status",
+                attributes={
+                    "source": snapshot["source"],
+                    "metric_type": snapshot["metric_type"],
+                    "primary_entity": snapshot["primary_name"],
+                    "primary_value": snapshot["primary_value"],
+                    "growth_stage": insight,
+                    "tracked_entities": list(snapshot["values"].keys()),
+                    "visibility_score": visibility_score,
+                },
+                confidence=0.95,
+            )
+            print(f"\n💡 Extracted Insight: {insight}")
+
+        _ensure_static_concepts(engine)
 
-    with open("AIEO_MEMORY_STATE.md", "w", encoding="utf-8") as file:
-        file.write(engine.generate_summary_markdown())
-    print("📄 Memory summary saved to AIEO_MEMORY_STATE.md")
+    fragments = FragmentCache()
+    engine = update_memory(apply, fragments)
+
+    if write_if_changed("AIEO_MEMORY_STATE.md", engine.generate_summary_markdown()):
+        print("📄 Memory summary saved to AIEO_MEMORY_STATE.md")
+    else:
+        print("📄 AIEO_MEMORY_STATE.md is unchanged")
+
+    prompt_context = engine.generate_prompt_context()
+    if write_if_changed("aieo_prompt_context.txt", prompt_context):
+        print(
+            "📝 Prompt context saved to aieo_prompt_context.txt "
+            f"(~{estimate_tokens(prompt_context)} tokens)"
+        )
+    else:
+        print("📝 aieo_prompt_context.txt is unchanged")
+    fragments.save()
+    print(f"🧩 描画済みの断片: hit={fragments.hits} miss={fragments.misses}")
 
-    with open("aieo_prompt_context.txt", "w", encoding="utf-8") as file:
-        file.write(engine.generate_prompt_context())
-    print("📝 Prompt context saved to aieo_prompt_context.txt")
+    if write_if_changed(STATUS_FILE, engine.generate_status()):
+        print(f"🕒 Run status saved to {STATUS_FILE}")
 
     print("\n" + "=" * 60)
     print("✅ AIEO Memory Update Complete")
-    print(f"   Total Concepts: {len(engine.memory['concepts'])}")
+    print(f"   Total Concepts: {len(engine.concepts)}")
     print(f"   Total Interactions: {engine.memory['meta']['total_interactions']}")
     print(f"   Memory Confidence: {engine.memory['meta']['memory_confidence']:.1%}")
+    engine.concepts.close()
 
 
 if __name__ == "__main__":
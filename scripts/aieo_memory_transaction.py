@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""``aieo_memory.json`` を複数の書き込み元から安全に更新するための層。
+
+読み込み時の版数（``meta.revision``）を覚えておき、保存時はアドバイザリ
+ロックを取ってからディスク上の版数と比べる。一致すれば版数を1つ進めて
+一時ファイル経由で置き換え、別の書き込みが先に保存していれば
+``MemoryConflictError`` を送出する。呼び出し側は読み直して変更を
+適用し直す。
+"""
+
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+try:
+    from scripts.aieo_metrics_writer import file_lock
+except ImportError:  # scripts/ を直接実行した場合
+    from aieo_metrics_writer import file_lock
+
+MEMORY_COMMIT_RETRIES = int(os.getenv("AIEO_MEMORY_COMMIT_RETRIES", "3"))
+# 競合後に読み直すまでの待機秒数の上限。
+MAX_RETRY_DELAY_SECONDS = 1.0
+
+T = TypeVar("T")
+
+
+class MemoryConflictError(RuntimeError):
+    """読み込み後に別の書き込みがメモリを更新したことを示す。"""
+
+
+def memory_revision(memory: Optional[Dict[str, Any]]) -> int:
+    """メモリの版数を返す。版数を持たない既存ファイルは0とみなす。"""
+    if not memory:
+        return 0
+    return int(memory.get("meta", {}).get("revision", 0))
+
+
+def read_memory(path: str) -> Optional[Dict[str, Any]]:
+    """メモリを読み込む。ファイルがなければNoneを返す。"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+@contextmanager
+def memory_lock(path: str) -> Iterator[None]:
+    """メモリファイルに対応するロックファイルで排他する。"""
+    lock_path = Path(f"{path}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a+b") as lock_file, file_lock(lock_file):
+        yield
+
+
+def commit_memory(
+    path: str,
+    memory: Dict[str, Any],
+    expected_revision: int,
+    prepare: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> int:
+    """版数が読み込み時のままなら、メモリを置き換えて新しい版数を返す。
+
+    ``prepare`` はロックを保持し、競合がないと確認した後に呼ばれる。
+    アーカイブへの追記など、1回だけ行いたい処理に使う。
+    """
+    with memory_lock(path):
+        current = memory_revision(read_memory(path))
+        if current != expected_revision:
+            raise MemoryConflictError(
+                f"{path} は読み込み後に更新されています: "
+                f"版数 {expected_revision} → {current}"
+            )
+        if prepare is not None:
+            prepare(memory)
+        memory.setdefault("meta", {})["revision"] = expected_revision + 1
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(memory, file, indent=2, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    return expected_revision + 1
+
+
+def retry_on_conflict(
+    attempt: Callable[[], T], retries: int = MEMORY_COMMIT_RETRIES
+) -> T:
+    """読み込みから保存までを行う ``attempt`` を、競合した場合に再実行する。"""
+    for number in range(retries):
+        try:
+            return attempt()
+        except MemoryConflictError as exc:
+            print(f"⚠️ {exc}; 読み直して再実行します ({number + 1}/{retries})")
+            time.sleep(random.uniform(0, MAX_RETRY_DELAY_SECONDS))
+    return attempt()
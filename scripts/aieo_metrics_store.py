@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""可視性メトリクスを月別パーティションのParquetへ保持するストレージ層。
+
+CSVはワークフローがコミットする正本のまま残し、読み込み側はこの層を通す。
+ストアはCSVのどこまでを取り込んだかをバイト位置で記録し、追記分だけを
+型付きで取り込む。timestampはUTCのdatetime、name/keywordはカテゴリとして保存し、
+列の射影と条件の押し下げで必要な月・列だけを読む。
+
+pyarrowがない環境では同じ型変換をCSVへ直接適用して読み込む。
+"""
+
+import csv
+import io
+import itertools
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrowがなければCSVを直接読む
+    pa = None
+
+try:
+    from scripts.aieo_metrics_writer import file_lock, tail_digest
+    from scripts.aieo_timestamps import parse_timestamps
+except ImportError:  # scripts/ を直接実行した場合
+    from aieo_metrics_writer import file_lock, tail_digest
+    from aieo_timestamps import parse_timestamps
+
+# 未設定ならCSVと同じディレクトリの .aieo_store/<CSV名> に置く。
+STORE_ROOT = os.getenv("AIEO_METRICS_STORE", "")
+TIMESTAMP_COLUMN = "timestamp"
+CATEGORY_COLUMNS = {"name", "keyword"}
+NUMERIC_COLUMNS = {
+    "github_followers",
+    "github_repos",
+    "web_mentions",
+    "domain_mentions",
+    "visibility_score",
+    "totalResults",
+}
+ROW_NUMBER_COLUMN = "row_number"
+PARTITION_COLUMN = "month"
+# timestampを解釈できない行は、件数の検証ができるよう別パーティションに残す。
+INVALID_PARTITION = "invalid"
+# 1か月の小さなファイルがこの数を超えたら1ファイルへまとめる。
+MAX_PARTS_PER_MONTH = 16
+# 逐次読み込みで一度に解析する行数。
+CHUNK_ROWS = int(os.getenv("AIEO_METRICS_CHUNK_ROWS", "100000"))
+
+Filter = Tuple[str, str, Any]
+
+
+def read_csv_header(path: Path) -> List[str]:
+    """CSVのヘッダー行だけを読み込む。"""
+    with Path(path).open("r", encoding="utf-8", newline="") as file:
+        return next(csv.reader(file), [])
+
+
+def _header_bytes(path: Path) -> bytes:
+    """追記分を単独で解析できるよう、ヘッダー行を元のバイト列のまま返す。"""
+    with Path(path).open("rb") as file:
+        return file.readline()
+
+
+def coerce_metrics_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """文字列として読んだCSVの列を、ストアと同じ型へ変換する。"""
+    typed = pd.DataFrame(index=frame.index)
+    for column in frame.columns:
+        values = frame[column]
+        if column == TIMESTAMP_COLUMN:
+            typed[column] = parse_timestamps(values)
+        elif column in CATEGORY_COLUMNS:
+            typed[column] = values.astype("category")
+        elif column in NUMERIC_COLUMNS:
+            typed[column] = pd.to_numeric(values, errors="coerce").astype("float64")
+        else:
+            typed[column] = values.astype("string")
+    return typed
+
+
+def _read_csv_text(data: bytes) -> pd.DataFrame:
+    """空欄を欠損にせず、全列を文字列としてCSVを読む。"""
+    return pd.read_csv(
+        io.BytesIO(data), dtype=str, keep_default_na=False, encoding="utf-8"
+    )
+
+
+def read_appended_rows(path: Path, offset: int) -> Tuple[pd.DataFrame, int]:
+    """offset以降に追記された行を文字列のDataFrameで読み、読み終えた位置を返す。"""
+    path = Path(path)
+    with path.open("rb") as file:
+        file.seek(offset)
+        tail = file.read()
+    if not tail.strip():
+        return pd.DataFrame(columns=read_csv_header(path), dtype=str), offset + len(tail)
+    return _read_csv_text(_header_bytes(path) + tail), offset + len(tail)
+
+
+def iter_appended_chunks(
+    path: Path, offset: int, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """offset以降の完了した行を、chunk_rows行ずつ文字列のDataFrameで返す。
+
+    各チャンクとあわせて、そのチャンクまで読み終えた位置を返す。改行で
+    終わらない末尾の行は書き込み途中とみなし、読まずに残す。
+    """
+    path = Path(path)
+    header = _header_bytes(path)
+    offset = max(offset, len(header))
+    with path.open("rb") as file:
+        file.seek(offset)
+        while True:
+            lines = list(itertools.islice(file, chunk_rows))
+            if lines and not lines[-1].endswith(b"\n"):
+                lines.pop()
+            if not lines:
+                return
+            data = b"".join(lines)
+            offset += len(data)
+            if data.strip():
+                yield _read_csv_text(header + data), offset
+
+
+def _apply_filters(frame: pd.DataFrame, filters: Sequence[Filter]) -> pd.DataFrame:
+    """pyarrowを使えない場合に、同じ条件をpandasで適用する。"""
+    mask = pd.Series(True, index=frame.index)
+    for column, op, value in filters:
+        values = frame[column]
+        if column == TIMESTAMP_COLUMN and op != "in":
+            value = pd.Timestamp(value)
+            value = value.tz_localize("UTC") if value.tzinfo is None else value
+        if op == "in":
+            mask &= values.isin(list(value))
+        elif op == "==":
+            mask &= values == value
+        elif op == ">=":
+            mask &= values >= value
+        elif op == ">":
+            mask &= values > value
+        elif op == "<=":
+            mask &= values <= value
+        elif op == "<":
+            mask &= values < value
+        else:
+            raise ValueError(f"未対応の条件演算子です: {op}")
+    return frame.loc[mask.fillna(False).astype(bool)]
+
+
+class MetricsStore:
+    """1つのCSVに対応する、月別パーティションのParquetデータセット。"""
+
+    def __init__(self, root: Path) -> None:
+        if pa is None:
+            raise RuntimeError("Parquetストアにはpyarrowが必要です")
+        self.root = Path(root)
+        self.data_dir = self.root / "data"
+        self.manifest_path = self.root / "_manifest.json"
+
+    def _load_manifest(self) -> Optional[dict]:
+        if not self.manifest_path.exists():
+            return None
+        try:
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _save_manifest(self, manifest: dict) -> None:
+        temp_path = self.manifest_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp_path, self.manifest_path)
+
+    def schema(self, header: Sequence[str]) -> "pa.Schema":
+        """CSVヘッダーから、全パーツで共通に使うArrowスキーマを作る。"""
+        fields = []
+        for column in header:
+            if column == TIMESTAMP_COLUMN:
+                fields.append(pa.field(column, pa.timestamp("us", tz="UTC")))
+            elif column in CATEGORY_COLUMNS:
+                fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+            elif column in NUMERIC_COLUMNS:
+                fields.append(pa.field(column, pa.float64()))
+            else:
+                fields.append(pa.field(column, pa.string()))
+        fields.append(pa.field(ROW_NUMBER_COLUMN, pa.int64()))
+        return pa.schema(fields)
+
+    def sync(self, csv_path: Path) -> int:
+        """CSVの追記分を取り込み、取り込んだ行数を返す。
+
+        ヘッダーが変わった、ファイルが縮んだ、または取り込み済み部分が
+        書き換えられた場合は全体を取り込み直す。
+        """
+        csv_path = Path(csv_path)
+        size = csv_path.stat().st_size
+        header = read_csv_header(csv_path)
+        manifest = self._load_manifest()
+        if (
+            manifest is None
+            or manifest.get("header") != header
+            or manifest.get("offset", 0) > size
+            or manifest.get("tail_digest")
+            != tail_digest(csv_path, manifest.get("offset", 0))
+        ):
+            return self.import_csv(csv_path)
+
+        if manifest["offset"] == size:
+            return 0
+        frame, offset = read_appended_rows(csv_path, manifest["offset"])
+        if frame.empty:
+            return 0
+
+        self._append(frame, header, manifest)
+        manifest["offset"] = offset
+        manifest["tail_digest"] = tail_digest(csv_path, offset)
+        self._save_manifest(manifest)
+        return len(frame)
+
+    def import_csv(self, csv_path: Path) -> int:
+        """既存のパーティションを捨て、CSV全体を取り込み直す。"""
+        csv_path = Path(csv_path)
+        if self.data_dir.exists():
+            shutil.rmtree(self.data_dir)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        with csv_path.open("rb") as file:
+            data = file.read()
+        header = read_csv_header(csv_path)
+        manifest = {
+            "source": str(csv_path),
+            "header": header,
+            "offset": len(data),
+            "rows": 0,
+            "next_part": 0,
+        }
+        frame = _read_csv_text(data) if data.strip() else pd.DataFrame(columns=header)
+        self._append(frame, header, manifest)
+        manifest["tail_digest"] = tail_digest(csv_path, manifest["offset"])
+        self._save_manifest(manifest)
+        print(f"✓ {csv_path} をParquetストアへ取り込み: {len(frame)}行")
+        return len(frame)
+
+    def _append(self, frame: pd.DataFrame, header: Sequence[str], manifest: dict) -> None:
+        """文字列のDataFrameを型付けし、月ごとのパーツとして書き出す。"""
+        if frame.empty:
+            return
+        typed = coerce_metrics_frame(frame[list(header)])
+        typed[ROW_NUMBER_COLUMN] = range(manifest["rows"], manifest["rows"] + len(typed))
+        months = (
+            typed[TIMESTAMP_COLUMN].dt.strftime("%Y-%m").fillna(INVALID_PARTITION)
+            if TIMESTAMP_COLUMN in typed
+            else pd.Series(INVALID_PARTITION, index=typed.index)
+        )
+        schema = self.schema(header)
+        for month, part in typed.groupby(months, sort=True):
+            month_dir = self.data_dir / f"{PARTITION_COLUMN}={month}"
+            month_dir.mkdir(parents=True, exist_ok=True)
+            table = pa.Table.from_pandas(part, schema=schema, preserve_index=False)
+            pq.write_table(table, month_dir / f"part-{manifest['next_part']:06d}.parquet")
+            manifest["next_part"] += 1
+            self._compact(month_dir, schema, manifest)
+        manifest["rows"] += len(typed)
+
+    def _compact(self, month_dir: Path, schema: "pa.Schema", manifest: dict) -> None:
+        """1か月分のパーツが増えすぎたら1ファイルへまとめる。"""
+        parts = sorted(month_dir.glob("part-*.parquet"))
+        if len(parts) <= MAX_PARTS_PER_MONTH:
+            return
+        table = pa.concat_tables(pq.read_table(part, schema=schema) for part in parts)
+        table = table.sort_by(ROW_NUMBER_COLUMN)
+        pq.write_table(table, month_dir / f"part-{manifest['next_part']:06d}.parquet")
+        manifest["next_part"] += 1
+        for part in parts:
+            part.unlink()
+
+    def load(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        filters: Sequence[Filter] = (),
+    ) -> pd.DataFrame:
+        """必要な列と条件に合う行だけを、CSVでの並び順で返す。"""
+        manifest = self._load_manifest() or {}
+        header = manifest.get("header", [])
+        selected = list(columns) if columns is not None else list(header)
+        if not self.data_dir.exists():
+            return coerce_metrics_frame(pd.DataFrame(columns=selected, dtype=str))
+
+        schema = self.schema(header).append(pa.field(PARTITION_COLUMN, pa.string()))
+        dataset = ds.dataset(
+            self.data_dir,
+            format="parquet",
+            schema=schema,
+            partitioning=ds.partitioning(
+                pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive"
+            ),
+        )
+        expression = None
+        for condition in self._expressions(filters):
+            expression = condition if expression is None else expression & condition
+        table = dataset.to_table(
+            columns=selected + [ROW_NUMBER_COLUMN], filter=expression
+        )
+        frame = table.to_pandas().sort_values(ROW_NUMBER_COLUMN, kind="stable")
+        return frame.drop(columns=[ROW_NUMBER_COLUMN]).reset_index(drop=True)
+
+    @staticmethod
+    def _expressions(filters: Sequence[Filter]) -> Iterable["ds.Expression"]:
+        """条件をArrowの式へ変換する。timestampの範囲は月パーティションにも適用する。"""
+        for column, op, value in filters:
+            field = ds.field(column)
+            if op == "in":
+                yield field.isin(list(value))
+                continue
+            if column == TIMESTAMP_COLUMN:
+                value = pd.Timestamp(value)
+                value = value.tz_localize("UTC") if value.tzinfo is None else value
+                month = value.tz_convert("UTC").strftime("%Y-%m")
+                if op in (">=", ">"):
+                    yield ds.field(PARTITION_COLUMN) >= month
+                elif op in ("<=", "<"):
+                    yield ds.field(PARTITION_COLUMN) <= month
+                value = pa.scalar(value.to_pydatetime(), type=pa.timestamp("us", tz="UTC"))
+            if op == "==":
+                yield field == value
+            elif op == ">=":
+                yield field >= value
+            elif op == ">":
+                yield field > value
+            elif op == "<=":
+                yield field <= value
+            elif op == "<":
+                yield field < value
+            else:
+                raise ValueError(f"未対応の条件演算子です: {op}")
+
+    def export_csv(self, path: Path) -> None:
+        """ストアの内容を、既存の読み込み処理が扱えるCSVとして書き出す。"""
+        frame = self.load()
+        if TIMESTAMP_COLUMN in frame:
+            frame[TIMESTAMP_COLUMN] = (
+                frame[TIMESTAMP_COLUMN].dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ").fillna("")
+            )
+        for column in NUMERIC_COLUMNS.intersection(frame.columns):
+            values = frame[column]
+            if values.dropna().mod(1).eq(0).all():
+                frame[column] = values.astype("Int64")
+        frame.to_csv(path, index=False, encoding="utf-8")
+
+
+def store_path_for(csv_path: Path, store_root: Optional[Path] = None) -> Path:
+    """CSVに対応するストアのディレクトリを返す。"""
+    csv_path = Path(csv_path)
+    root = Path(store_root or STORE_ROOT or csv_path.parent / ".aieo_store")
+    return root / csv_path.stem
+
+
+def load_metrics(
+    csv_path: Path,
+    columns: Optional[Sequence[str]] = None,
+    filters: Sequence[Filter] = (),
+    store_root: Optional[Path] = None,
+) -> pd.DataFrame:
+    """CSVに対応するストアを同期して、型付きのメトリクスを読み込む。
+
+    pyarrowがない環境では、同じ型変換と条件をCSVへ直接適用する。
+    """
+    csv_path = Path(csv_path)
+    if pa is not None:
+        store = MetricsStore(store_path_for(csv_path, store_root))
+        store.root.mkdir(parents=True, exist_ok=True)
+        # 書き込み途中の行を取り込まないようCSVに共有ロックを取り、
+        # 同じストアを同期する別プロセスとは排他にする。
+        with (store.root / ".lock").open("a+b") as store_lock, file_lock(store_lock):
+            with csv_path.open("rb") as source, file_lock(source, shared=True):
+                store.sync(csv_path)
+        return store.load(columns, filters)
+
+    usecols = list(columns) if columns is not None else None
+    filter_columns = [column for column, _, _ in filters]
+    if usecols is not None:
+        usecols = list(dict.fromkeys(usecols + filter_columns))
+    with csv_path.open("rb") as source, file_lock(source, shared=True):
+        frame = pd.read_csv(
+            source, dtype=str, keep_default_na=False, usecols=usecols, encoding="utf-8"
+        )
+    frame = _apply_filters(coerce_metrics_frame(frame), filters)
+    selected = list(columns) if columns is not None else list(frame.columns)
+    return frame[selected].reset_index(drop=True)
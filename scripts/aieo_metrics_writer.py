@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""メトリクスCSVへバッチ単位で追記する、クラッシュに強い書き込み層。
+
+バッチ全体を1つのバイト列にしてから、排他のアドバイザリロックを取って
+1回で追記し、fsyncする。CSVの横にはスキーマ・行数・ファイルサイズと
+末尾のハッシュを持つサイドカー（``<CSV名>.meta.json``）を置く。記録した
+位置までの内容が変わっていなければ、CSVを読み直さずにヘッダーを検証し、
+外部で追記された行（``git pull`` など）だけを数える。
+
+サイドカーには追記の直前に書き込み中の印を付ける。追記の途中で落ちて
+改行で終わらない断片が残った場合は、その印があるときだけ追記前の位置まで
+切り詰める。読み込み側は共有ロックを取ることで、書き込み途中の断片を読まない。
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from functools import partial
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+)
+
+if TYPE_CHECKING:  # 実行時はpandasに依存しない（メモリ更新のジョブはpandasを入れない）
+    import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windowsではロックなしで書き込む
+    fcntl = None
+
+SIDECAR_SUFFIX = ".meta.json"
+TAIL_DIGEST_BYTES = 256
+
+AppendHook = Callable[[Sequence[Mapping], os.stat_result, os.stat_result], None]
+
+
+def sidecar_path(path: Path) -> Path:
+    """CSVに対応するサイドカーのパスを返す。"""
+    path = Path(path)
+    return path.with_name(path.name + SIDECAR_SUFFIX)
+
+
+def tail_digest(path: Path, offset: int) -> str:
+    """offset直前のバイト列のハッシュ。取り込み済み部分が書き換えられたかの検出に使う。"""
+    start = max(offset - TAIL_DIGEST_BYTES, 0)
+    with Path(path).open("rb") as file:
+        file.seek(start)
+        return hashlib.sha1(file.read(offset - start)).hexdigest()
+
+
+@contextmanager
+def file_lock(file, shared: bool = False) -> Iterator[None]:
+    """開いたファイルにアドバイザリロックを掛ける。読み込み側は共有ロックを使う。"""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class MetricsWriter:
+    """固定スキーマのCSVへ、複数の書き込み元から安全に行を追記する。"""
+
+    def __init__(self, path: Path, fields: Sequence[str]) -> None:
+        self.path = Path(path)
+        self.fields = list(fields)
+        self.sidecar = sidecar_path(self.path)
+
+    def _load_sidecar(self, size: int) -> Optional[Dict]:
+        """記録した位置までCSVが変わっていなければサイドカーの内容を返す。"""
+        if not self.sidecar.exists():
+            return None
+        try:
+            meta = json.loads(self.sidecar.read_text(encoding="utf-8"))
+            if not 0 <= meta["size"] <= size or meta["digest"] != tail_digest(
+                self.path, meta["size"]
+            ):
+                return None
+            int(meta["rows"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return meta
+
+    def _save_sidecar(self, rows: int, size: int, pending: bool = False) -> None:
+        meta = {
+            "fields": self.fields,
+            "rows": rows,
+            "size": size,
+            "digest": tail_digest(self.path, size),
+        }
+        if pending:
+            meta["pending"] = True
+        temp_path = self.sidecar.with_name(self.sidecar.name + ".tmp")
+        with temp_path.open("w", encoding="utf-8") as file:
+            json.dump(meta, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.sidecar)
+
+    def _render(self, rows: Sequence[Mapping], with_header: bool) -> bytes:
+        """バッチ全体を1回で書き込めるバイト列にする。"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=self.fields, extrasaction="ignore")
+        if with_header:
+            writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field, 0) for field in self.fields})
+        return buffer.getvalue().encode("utf-8")
+
+    def _scan(self, file, offset: int = 0) -> Dict:
+        """offset以降を読み、行数（offsetが0ならヘッダーも）を返す。"""
+        file.seek(offset)
+        text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        try:
+            reader = csv.reader(text)
+            header = next(reader, []) if offset == 0 else []
+            rows = sum(1 for _ in reader)
+        finally:
+            # ラッパーの破棄で元のファイルが閉じられないよう切り離す。
+            text.detach()
+        return {"fields": header, "rows": rows}
+
+    def _validated_state(self, file, size: int) -> Dict:
+        """ロック中のファイルについて、ヘッダーと完了済みの行数・サイズを返す。"""
+        meta = self._load_sidecar(size)
+        if size > 0:
+            file.seek(size - 1)
+            if file.read(1) != b"\n":
+                if meta is not None and meta.get("pending"):
+                    # 前回の追記が途中で止まった断片を、追記前の位置まで戻す。
+                    size = meta["size"]
+                    file.truncate(size)
+                else:
+                    # 外部で編集され末尾に改行がないだけの場合は、行を残して改行を補う。
+                    file.write(b"\n")
+                    size += 1
+                file.flush()
+        if meta is None or meta["size"] == 0:
+            meta = self._scan(file)
+        elif meta["size"] != size:
+            # 記録した位置より後ろは外部で追記された行なので、その分だけ数える。
+            meta = {
+                "fields": meta["fields"],
+                "rows": int(meta["rows"]) + self._scan(file, meta["size"])["rows"],
+            }
+        header = meta.get("fields", [])
+        if size > 0 and header != self.fields:
+            raise ValueError(
+                f"{self.path} のヘッダーが不正です: {header}; 期待値: {self.fields}"
+            )
+        return {"rows": int(meta.get("rows", 0)) if size > 0 else 0, "size": size}
+
+    def _render_frame(self, frame: "pd.DataFrame", with_header: bool) -> bytes:
+        """DataFrameを、行ごとの追記と同じ区切りのバイト列にする。"""
+        return frame.reindex(columns=self.fields).to_csv(
+            index=False, header=with_header, lineterminator="\r\n"
+        ).encode("utf-8")
+
+    def _append_payload(
+        self,
+        count: int,
+        render: Callable[[bool], bytes],
+        on_append: Optional[Callable[[os.stat_result, os.stat_result], None]],
+    ) -> int:
+        """ロックを取り、描画したバッチを1回で追記して総行数を返す。"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a+b") as file:
+            with file_lock(file):
+                size = os.fstat(file.fileno()).st_size
+                state = self._validated_state(file, size)
+                if not count:
+                    return state["rows"]
+                before = os.fstat(file.fileno())
+                payload = render(state["size"] == 0)
+                self._save_sidecar(state["rows"], state["size"], pending=True)
+                file.seek(0, os.SEEK_END)
+                file.write(payload)
+                file.flush()
+                os.fsync(file.fileno())
+                total = state["rows"] + count
+                self._save_sidecar(total, state["size"] + len(payload))
+                if on_append is not None:
+                    on_append(before, os.fstat(file.fileno()))
+        return total
+
+    def append(
+        self,
+        rows: Sequence[Mapping],
+        on_append: Optional[AppendHook] = None,
+    ) -> int:
+        """行をまとめて追記し、追記後の総行数を返す。
+
+        ``on_append`` はロックを保持したまま、追記した行と追記前後の
+        ``os.stat_result`` で呼ばれる。CSVから派生する索引の更新に使う。
+        """
+        hook = None if on_append is None else partial(on_append, rows)
+        return self._append_payload(
+            len(rows), lambda with_header: self._render(rows, with_header), hook
+        )
+
+    def append_frame(self, frame: "pd.DataFrame") -> int:
+        """DataFrameの行をまとめて追記し、追記後の総行数を返す。
+
+        行ごとの辞書を作らずに書き出すため、大量の行の追記に使う。
+        """
+        return self._append_payload(
+            len(frame),
+            lambda with_header: self._render_frame(frame, with_header),
+            None,
+        )
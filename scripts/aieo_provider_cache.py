@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""外部プロバイダー応答をSQLiteへ保存する期限付きキャッシュ。
+
+Google Custom SearchとGitHub APIの成功応答だけを保存し、複数のワークフローが
+短時間に同じクエリを発行してもquotaを消費しないようにする。
+ProviderErrorになった応答は保存しないため、障害値が後続の実行へ残らない。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+CACHE_FILE = Path(
+    os.getenv("AIEO_PROVIDER_CACHE", ".aieo_cache/provider_cache.sqlite3")
+)
+# 0秒ならキャッシュを使わない。
+CACHE_MAX_AGE_SECONDS = int(os.getenv("AIEO_PROVIDER_CACHE_MAX_AGE", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("AIEO_PROVIDER_CACHE_MAX_ENTRIES", "5000"))
+
+
+class ProviderCache:
+    """プロバイダー名とクエリをキーに、成功応答を最大保持期間だけ再利用する。"""
+
+    def __init__(
+        self,
+        path: Path = CACHE_FILE,
+        max_age_seconds: int = CACHE_MAX_AGE_SECONDS,
+        max_entries: int = CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.path = Path(path)
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max(int(max_entries), 1)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 並列収集のスレッドから共有するため、接続はロックで直列化する。
+        self._connection = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                cache_key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+            "ON responses (accessed_at)"
+        )
+        self._connection.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["ProviderCache"]:
+        """環境変数の設定から生成する。保持期間0なら無効としてNoneを返す。"""
+        if CACHE_MAX_AGE_SECONDS <= 0:
+            return None
+        return cls()
+
+    @staticmethod
+    def _cache_key(provider: str, key: str) -> str:
+        """クエリ文字列をそのまま残さないよう、ハッシュ化したキーを返す。"""
+        return hashlib.sha256(f"{provider}\0{key}".encode("utf-8")).hexdigest()
+
+    def get(self, provider: str, key: str) -> Optional[Dict]:
+        """保持期間内の応答を返す。なければNoneを返す。"""
+        cache_key = self._cache_key(provider, key)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT payload, stored_at FROM responses WHERE cache_key = ?",
+                (cache_key,),
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE cache_key = ?",
+                (now, cache_key),
+            )
+            self._connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, provider: str, key: str, value: Dict) -> None:
+        """成功応答を保存し、上限を超えた分は古い参照順に削除する。"""
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False, sort_keys=True)
+        with self._lock:
+            self._connection.execute(
+                """
+                INSERT INTO responses (cache_key, provider, payload, stored_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    payload = excluded.payload,
+                    stored_at = excluded.stored_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                (self._cache_key(provider, key), provider, payload, now, now),
+            )
+            self._evict(now)
+            self._connection.commit()
+
+    def _evict(self, now: float) -> None:
+        """期限切れの行と、件数上限を超えた参照の古い行を削除する。"""
+        expired = self._connection.execute(
+            "DELETE FROM responses WHERE stored_at < ?",
+            (now - self.max_age_seconds,),
+        ).rowcount
+        overflow = self._connection.execute(
+            """
+            DELETE FROM responses WHERE cache_key IN (
+                SELECT cache_key FROM responses
+                ORDER BY accessed_at DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        ).rowcount
+        self.evictions += max(expired, 0) + max(overflow, 0)
+
+    def stats(self) -> Dict[str, int]:
+        """このインスタンスでのヒット数、ミス数、削除数を返す。"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def close(self) -> None:
+        """SQLite接続を閉じる。"""
+        with self._lock:
+            self._connection.close()
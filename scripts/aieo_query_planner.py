@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""ドメイン言及クエリの再取得間隔を (対象, ドメイン) ごとに決める。
+
+``aieo_visibility_metrics.csv`` はドメイン言及の合計しか持たないため、
+ドメイン別の観測値と変化しなかった回数は別の状態ファイルへ保存する。
+値が変わらない組ほど再取得間隔を倍に延ばし、間の実行では前回値を
+引き継ぐ。値が変わった組は次の実行から毎回の取得へ戻す。どの観測時刻の
+行でどのドメインの値を引き継いだかも、直近の実行分を同じ状態ファイルに残す。
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+STATE_FILE = Path(
+    os.getenv("AIEO_DOMAIN_PLANNER_STATE", ".aieo_cache/domain_refresh_state.json")
+)
+BASE_INTERVAL = timedelta(hours=float(os.getenv("AIEO_DOMAIN_REFRESH_BASE_HOURS", "12")))
+MAX_INTERVAL = timedelta(hours=float(os.getenv("AIEO_DOMAIN_REFRESH_MAX_HOURS", "168")))
+# 引き継いだドメインを残す実行の数。既定は6時間ごとの実行で約30日分。
+CARRIED_HISTORY_RUNS = int(os.getenv("AIEO_DOMAIN_CARRIED_HISTORY_RUNS", "120"))
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class DomainQueryPlanner:
+    """過去の観測値から、今回問い合わせるドメインと引き継ぐ値を決める。"""
+
+    def __init__(
+        self,
+        state_file: Optional[Path] = STATE_FILE,
+        base_interval: timedelta = BASE_INTERVAL,
+        max_interval: timedelta = MAX_INTERVAL,
+    ) -> None:
+        self.state_file = Path(state_file) if state_file else None
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self._lock = threading.Lock()
+        state = self._load()
+        self.pairs: Dict[str, Dict[str, Dict]] = self._section(state, "pairs")
+        # 観測時刻ごとの、前回値を引き継いだ対象とドメイン。
+        self.carried: Dict[str, Dict[str, List[str]]] = self._section(state, "carried")
+
+    @classmethod
+    def from_env(cls) -> Optional["DomainQueryPlanner"]:
+        """環境変数の設定から生成する。最大間隔0なら毎回全ドメインを取得する。"""
+        if MAX_INTERVAL <= timedelta(0):
+            return None
+        return cls()
+
+    def _load(self) -> Dict:
+        if self.state_file is None or not self.state_file.exists():
+            return {}
+        try:
+            state = json.loads(self.state_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            print(f"⚠ {self.state_file} を読み込めないため全ドメインを再取得します")
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    @staticmethod
+    def _section(state: Dict, key: str) -> Dict:
+        section = state.get(key)
+        return section if isinstance(section, dict) else {}
+
+    def save(self) -> None:
+        """状態ファイルを一時ファイル経由で置き換える。"""
+        if self.state_file is None:
+            return
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            # 観測時刻の文字列順は時刻順なので、新しい実行分だけを残す。
+            for observed_at in sorted(self.carried)[:-CARRIED_HISTORY_RUNS or None]:
+                del self.carried[observed_at]
+            payload = json.dumps(
+                {"pairs": self.pairs, "carried": self.carried},
+                ensure_ascii=False,
+                indent=1,
+            )
+        temp_path = self.state_file.with_suffix(".tmp")
+        temp_path.write_text(payload, encoding="utf-8")
+        os.replace(temp_path, self.state_file)
+
+    def refresh_interval(self, unchanged_runs: int) -> timedelta:
+        """値が変わらなかった回数に応じた再取得間隔を返す。"""
+        if unchanged_runs <= 0:
+            return timedelta(0)
+        return min(self.base_interval * (2 ** (unchanged_runs - 1)), self.max_interval)
+
+    def plan(
+        self, name: str, domains: Iterable[str], observed_at: str
+    ) -> Tuple[List[str], Dict[str, int]]:
+        """問い合わせるドメインと、前回値を引き継ぐドメインの値を返す。"""
+        now = _parse_time(observed_at)
+        due: List[str] = []
+        carried: Dict[str, int] = {}
+        with self._lock:
+            entity = self.pairs.get(name, {})
+            for domain in domains:
+                pair = entity.get(domain)
+                if pair is None:
+                    due.append(domain)
+                    continue
+                interval = self.refresh_interval(int(pair.get("unchanged_runs", 0)))
+                if now - _parse_time(pair["checked_at"]) >= interval:
+                    due.append(domain)
+                else:
+                    carried[domain] = int(pair["value"])
+        return due, carried
+
+    def record(self, name: str, domain: str, value: int, observed_at: str) -> None:
+        """取得した値を記録し、前回と同じなら安定回数を増やす。"""
+        with self._lock:
+            entity = self.pairs.setdefault(name, {})
+            previous = entity.get(domain)
+            unchanged_runs = 0
+            if previous is not None and int(previous["value"]) == value:
+                unchanged_runs = int(previous.get("unchanged_runs", 0)) + 1
+            entity[domain] = {
+                "value": value,
+                "checked_at": observed_at,
+                "unchanged_runs": unchanged_runs,
+            }
+
+    def record_carried(
+        self, name: str, domains: Iterable[str], observed_at: str
+    ) -> None:
+        """前回値を引き継いだドメインを、その行の観測時刻とあわせて記録する。"""
+        domains = sorted(domains)
+        if not domains:
+            return
+        with self._lock:
+            self.carried.setdefault(observed_at, {})[name] = domains
+
+    def carried_domains(self, name: str, observed_at: str) -> List[str]:
+        """指定した行で前回値を引き継いだドメインを返す。"""
+        with self._lock:
+            return list(self.carried.get(observed_at, {}).get(name, []))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""可視性プロバイダー向けのトークンバケットと日次quota予算。
+
+Google Custom Searchは1日のクエリ数、GitHub APIは ``X-RateLimit-*`` が示す
+残量を上限とする。実行前に必要なクエリ数を見積もり、途中でquotaが尽きる
+実行は開始しない。HTTP 429を受けた場合は送信間隔を広げる。
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Mapping, Optional
+from zoneinfo import ZoneInfo
+
+BUDGET_FILE = Path(
+    os.getenv("AIEO_QUOTA_BUDGET_FILE", ".aieo_cache/quota_budget.json")
+)
+GOOGLE_DAILY_QUOTA = int(os.getenv("AIEO_GOOGLE_DAILY_QUOTA", "100"))
+GOOGLE_QUERIES_PER_SECOND = float(os.getenv("AIEO_GOOGLE_QPS", "5"))
+GITHUB_REQUESTS_PER_SECOND = float(os.getenv("AIEO_GITHUB_QPS", "10"))
+# 残量が上限のこの割合を下回ったら、リセット時刻まで均等に送信する。
+GITHUB_LOW_REMAINING_RATIO = 0.1
+# Google Custom Searchの日次quotaは太平洋時間の0時に戻る。
+GOOGLE_QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaExhaustedError(RuntimeError):
+    """残りのquotaでは要求を満たせないことを示す。"""
+
+
+class TokenBucket:
+    """一定レートで補充されるトークンを消費して送信間隔を制御する。"""
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = float(rate_per_second)
+        self.max_rate = self.rate
+        if capacity is None:
+            capacity = max(rate_per_second, 1)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """トークンを1つ消費する。足りなければ補充まで待ち、待機秒数を返す。"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+    def set_rate(self, rate_per_second: float) -> None:
+        """補充レートを変更する。設定時の上限レートは超えない。"""
+        with self._lock:
+            self._refill()
+            self.rate = max(min(rate_per_second, self.max_rate), 1e-3)
+
+
+class ProviderRateLimiter:
+    """プロバイダーごとの送信レートと、Google日次・GitHub時間当たりの残量を管理する。"""
+
+    def __init__(
+        self,
+        google_daily_quota: int = GOOGLE_DAILY_QUOTA,
+        budget_file: Optional[Path] = BUDGET_FILE,
+        buckets: Optional[Dict[str, TokenBucket]] = None,
+        now: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+    ) -> None:
+        self.google_daily_quota = google_daily_quota
+        self.budget_file = Path(budget_file) if budget_file else None
+        self.buckets = buckets or {
+            "google": TokenBucket(GOOGLE_QUERIES_PER_SECOND),
+            "github": TokenBucket(GITHUB_REQUESTS_PER_SECOND),
+        }
+        self._now = now
+        self._lock = threading.Lock()
+        self.google_day = self._google_day()
+        self.google_used = self._load_google_usage()
+        # GitHubの残量は応答ヘッダーか /rate_limit を見るまで不明。
+        self.github_remaining: Optional[int] = None
+        self.github_reset: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "ProviderRateLimiter":
+        """環境変数の設定から生成する。"""
+        return cls()
+
+    def _google_day(self) -> str:
+        return self._now().astimezone(GOOGLE_QUOTA_TIMEZONE).date().isoformat()
+
+    def _load_google_usage(self) -> int:
+        """当日分のGoogle使用量を読み込む。日付が変わっていれば0から数える。"""
+        if self.budget_file is None or not self.budget_file.exists():
+            return 0
+        try:
+            state = json.loads(self.budget_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(state, dict) or state.get("google_day") != self.google_day:
+            return 0
+        return int(state.get("google_used", 0))
+
+    def save(self) -> None:
+        """Google使用量を保存し、同じ日の後続実行へ引き継ぐ。"""
+        if self.budget_file is None:
+            return
+        self.budget_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            state = {"google_day": self.google_day, "google_used": self.google_used}
+        temp_path = self.budget_file.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(temp_path, self.budget_file)
+
+    def remaining(self) -> Dict[str, Optional[int]]:
+        """プロバイダーごとの残量を返す。不明な場合はNone。"""
+        with self._lock:
+            if self._google_day() != self.google_day:
+                self.google_day, self.google_used = self._google_day(), 0
+            return {
+                "google": max(self.google_daily_quota - self.google_used, 0),
+                "github": self.github_remaining,
+            }
+
+    def ensure_capacity(self, planned: Mapping[str, int]) -> None:
+        """見積もったクエリ数を残量で賄えなければ、実行前に例外を送出する。"""
+        remaining = self.remaining()
+        shortages = [
+            f"{provider}: 必要{count}件 / 残り{remaining[provider]}件"
+            for provider, count in planned.items()
+            if remaining.get(provider) is not None and count > remaining[provider]
+        ]
+        if shortages:
+            raise QuotaExhaustedError(
+                "quotaが不足するため実行を開始しません: " + ", ".join(shortages)
+            )
+
+    def acquire(self, provider: str) -> None:
+        """送信枠を1つ確保する。残量がなければ送信せずに例外を送出する。"""
+        with self._lock:
+            if provider == "google":
+                if self._google_day() != self.google_day:
+                    self.google_day, self.google_used = self._google_day(), 0
+                if self.google_used >= self.google_daily_quota:
+                    raise QuotaExhaustedError(
+                        "Google Custom Searchの日次quota "
+                        f"{self.google_daily_quota}件を使い切りました"
+                    )
+                self.google_used += 1
+            elif provider == "github" and self.github_remaining is not None:
+                if self.github_remaining <= 0 and not self._github_reset_passed():
+                    raise QuotaExhaustedError("GitHub APIのrate limit残量がありません")
+                self.github_remaining = max(self.github_remaining - 1, 0)
+        bucket = self.buckets.get(provider)
+        if bucket is not None:
+            bucket.acquire()
+
+    def _github_reset_passed(self) -> bool:
+        if self.github_reset is None:
+            return False
+        return self._now().timestamp() >= self.github_reset
+
+    def observe_github_headers(self, headers: Mapping[str, str]) -> None:
+        """GitHubの ``X-RateLimit-*`` ヘッダーから残量を更新し、送信間隔を調整する。"""
+        try:
+            limit = int(headers.get("X-RateLimit-Limit", 0))
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            self.github_remaining = remaining
+            self.github_reset = reset
+
+        bucket = self.buckets["github"]
+        if remaining < limit * GITHUB_LOW_REMAINING_RATIO:
+            # 残量が少ないときだけ、リセットまでに使い切らない速さへ落とす。
+            seconds_left = max(reset - self._now().timestamp(), 1.0)
+            bucket.set_rate(max(remaining, 1) / seconds_left)
+        else:
+            bucket.set_rate(bucket.max_rate)
+
+    def throttle(self, provider: str) -> None:
+        """HTTP 429などを受けたプロバイダーの送信レートを半分にする。"""
+        bucket = self.buckets.get(provider)
+        if bucket is not None:
+            bucket.set_rate(bucket.rate / 2)
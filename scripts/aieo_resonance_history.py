@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""人物別可視性メトリクスの全行について共鳴度を計算し、時系列として保存する。
+
+共鳴度の各成分はNumPy/pandasで列ごとに一括計算する。結果は
+``aieo_resonance_history.csv`` へ追記し、メトリクスCSVをどこまで反映したかを
+状態ファイルに記録する。状態が使えない場合は、メトリクスCSV全体から
+時系列を作り直す。対象・期間の切り出しは ``load_resonance_history`` を使う。
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scripts.aieo_metrics_store import (
+        CHUNK_ROWS,
+        iter_appended_chunks,
+        load_metrics,
+        read_csv_header,
+        tail_digest,
+    )
+    from scripts.aieo_metrics_writer import MetricsWriter, file_lock, sidecar_path
+    from scripts.aieo_timestamps import parse_timestamps
+except ImportError:  # scripts/ を直接実行した場合
+    from aieo_metrics_store import (
+        CHUNK_ROWS,
+        iter_appended_chunks,
+        load_metrics,
+        read_csv_header,
+        tail_digest,
+    )
+    from aieo_metrics_writer import MetricsWriter, file_lock, sidecar_path
+    from aieo_timestamps import parse_timestamps
+
+RESONANCE_HISTORY = Path(
+    os.getenv("AIEO_RESONANCE_HISTORY", "aieo_resonance_history.csv")
+)
+# 追記分だけを計算するための状態。失われても時系列を作り直すだけ。
+HISTORY_STATE_FILE = Path(
+    os.getenv(
+        "AIEO_RESONANCE_HISTORY_STATE", ".aieo_cache/resonance_history_state.json"
+    )
+)
+SCORE_COLUMNS = ["github_followers", "web_mentions", "domain_mentions"]
+COMPONENT_COLUMNS = ["resonance", "domain_diversity", "mention_frequency", "impact"]
+HISTORY_FIELDS = ["timestamp", "name", *COMPONENT_COLUMNS]
+
+
+def typed_visibility_rows(frame: pd.DataFrame) -> pd.DataFrame:
+    """文字列のメトリクス行を型付けし、時刻・対象名・可視性スコアが有効な行を返す。"""
+    typed = pd.DataFrame(
+        {
+            "name": frame["name"].astype("string").str.strip(),
+            "timestamp": parse_timestamps(frame["timestamp"]),
+            **{
+                column: pd.to_numeric(frame[column], errors="coerce")
+                for column in SCORE_COLUMNS
+            },
+        }
+    )
+    score = pd.to_numeric(frame["visibility_score"], errors="coerce")
+    valid = (
+        typed["timestamp"].notna()
+        & typed["name"].fillna("").str.len().gt(0)
+        & score.notna()
+    )
+    return typed.loc[valid]
+
+
+def resonance_components(rows: pd.DataFrame) -> pd.DataFrame:
+    """各行の共鳴度と成分を計算する。成分の元になる値が欠けた行は除く。"""
+    scores = rows[SCORE_COLUMNS].apply(pd.to_numeric, errors="coerce")
+    rows = rows.loc[scores.notna().all(axis=1)]
+    scores = scores.loc[rows.index]
+
+    domain_diversity = np.minimum(scores["domain_mentions"] / 100, 40)
+    mention_frequency = np.minimum(scores["web_mentions"] / 1000, 40)
+    impact = np.minimum(scores["github_followers"] / 10, 20)
+    return pd.DataFrame(
+        {
+            "timestamp": rows["timestamp"],
+            "name": rows["name"],
+            "resonance": (domain_diversity + mention_frequency + impact).round(2),
+            "domain_diversity": domain_diversity.round(2),
+            "mention_frequency": mention_frequency.round(2),
+            "impact": impact.round(2),
+        }
+    )
+
+
+def format_timestamps(timestamps: pd.Series) -> pd.Series:
+    """UTC時刻を、レポートと同じ ``Z`` 付きのISO 8601表記にする。"""
+    utc = timestamps.dt.tz_convert("UTC")
+    text = np.where(
+        utc.dt.microsecond.eq(0),
+        utc.dt.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        utc.dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    )
+    return pd.Series(text, index=timestamps.index, dtype=object)
+
+
+def _load_history_state(state_file: Path, source: Path, history: Path) -> Optional[Dict]:
+    """メトリクスCSVと時系列が前回から追記されただけなら状態を返す。"""
+    if not state_file.exists():
+        return None
+    try:
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+        history_size = history.stat().st_size if history.exists() else 0
+        if (
+            state["source"] != str(source)
+            or state["history"] != str(history)
+            or state["header"] != read_csv_header(source)
+            or state["offset"] > source.stat().st_size
+            or state["source_digest"] != tail_digest(source, state["offset"])
+            or state["history_size"] != history_size
+            or (
+                history_size
+                and state["history_digest"] != tail_digest(history, history_size)
+            )
+        ):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return state
+
+
+def _save_history_state(
+    state_file: Path, source: Path, history: Path, offset: int
+) -> None:
+    history_size = history.stat().st_size if history.exists() else 0
+    state = {
+        "source": str(source),
+        "history": str(history),
+        "header": read_csv_header(source),
+        "offset": offset,
+        "source_digest": tail_digest(source, offset),
+        "history_size": history_size,
+        "history_digest": tail_digest(history, history_size) if history_size else "",
+    }
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = state_file.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(temp_path, state_file)
+
+
+def update_resonance_history(
+    source: Path,
+    history: Path = RESONANCE_HISTORY,
+    state_file: Path = HISTORY_STATE_FILE,
+    chunk_rows: int = CHUNK_ROWS,
+) -> int:
+    """メトリクスCSVの追記分から共鳴度の時系列を追記し、追記した行数を返す。
+
+    状態の確認から追記、状態の保存までを時系列のロックファイルで排他し、
+    同時に動く別のワークフローが同じ行を重ねて追記しないようにする。
+    """
+    source, history, state_file = Path(source), Path(history), Path(state_file)
+    history.parent.mkdir(parents=True, exist_ok=True)
+    # 追記ごとに時系列そのものへ掛かるロックとは別のファイルで、全体を排他する。
+    lock_path = history.with_name(history.name + ".lock")
+    with lock_path.open("a+b") as lock_file, file_lock(lock_file):
+        state = _load_history_state(state_file, source, history)
+        offset = 0
+        if state is None:
+            # 前回の反映位置が分からない時系列は、重複を避けるため作り直す。
+            history.unlink(missing_ok=True)
+            sidecar_path(history).unlink(missing_ok=True)
+        else:
+            offset = state["offset"]
+
+        writer = MetricsWriter(history, HISTORY_FIELDS)
+        appended = 0
+        with source.open("rb") as file, file_lock(file, shared=True):
+            for frame, offset in iter_appended_chunks(source, offset, chunk_rows):
+                rows = resonance_components(typed_visibility_rows(frame))
+                if rows.empty:
+                    continue
+                rows["timestamp"] = format_timestamps(rows["timestamp"])
+                writer.append_frame(rows)
+                appended += len(rows)
+        _save_history_state(state_file, source, history, offset)
+    return appended
+
+
+def load_resonance_history(
+    names: Optional[Sequence[str]] = None,
+    start=None,
+    end=None,
+    path: Path = RESONANCE_HISTORY,
+) -> pd.DataFrame:
+    """共鳴度の時系列から、対象と期間 ``[start, end)`` に合う行を時刻順に返す。"""
+    filters = []
+    if names is not None:
+        filters.append(("name", "in", list(names)))
+    if start is not None:
+        filters.append(("timestamp", ">=", start))
+    if end is not None:
+        filters.append(("timestamp", "<", end))
+    frame = load_metrics(path, columns=HISTORY_FIELDS, filters=filters)
+    for column in COMPONENT_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    return frame.sort_values("timestamp", kind="stable").reset_index(drop=True)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""可視性ログの時刻解析について、従来の方法と一括解析の所要時間を比べる。
+
+``2025-10-10 13:37:50`` 形式と ``...Z`` 付きの形式を半分ずつ混ぜ、少数の
+解釈できない値を含む合成データを使う。既定では1万行・100万行・1000万行で
+計測する。
+
+    python scripts/aieo_timestamp_benchmark.py --sizes 10000,1000000
+"""
+
+import argparse
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scripts.aieo_timestamps import parse_timestamps
+except ImportError:  # python scripts/aieo_timestamp_benchmark.py として実行した場合
+    from aieo_timestamps import parse_timestamps
+
+DEFAULT_SIZES = "10000,1000000,10000000"
+# 初回の呼び出しの準備時間に左右されないよう、最短の回を採る。
+REPEATS = 3
+# 解釈できない値を混ぜる割合。
+INVALID_RATIO = 0.001
+
+
+def make_timestamps(size: int, seed: int = 0) -> pd.Series:
+    """書式が混在する時刻の文字列を作る。"""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2020-01-01", periods=size, freq="min", tz="UTC")
+    values = np.where(
+        rng.random(size) < 0.5,
+        times.strftime("%Y-%m-%d %H:%M:%S"),
+        times.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    ).astype(object)
+    values[rng.random(size) < INVALID_RATIO] = "invalid timestamp"
+    return pd.Series(values)
+
+
+def parse_row_by_row(values: pd.Series) -> List[Optional[datetime]]:
+    """resonance_indexer が使っていた、行ごとの fromisoformat による解析。"""
+    parsed: List[Optional[datetime]] = []
+    for value in values:
+        try:
+            timestamp = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            parsed.append(None)
+            continue
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        parsed.append(timestamp)
+    return parsed
+
+
+def parse_mixed(values: pd.Series) -> pd.Series:
+    """pandasの読み込み側が使っていた ``format="mixed"`` による解析。"""
+    return pd.to_datetime(values, format="mixed", errors="coerce", utc=True)
+
+
+METHODS: Dict[str, Callable[[pd.Series], object]] = {
+    "row_by_row": parse_row_by_row,
+    "pandas_mixed": parse_mixed,
+    "vectorized": parse_timestamps,
+}
+
+
+def measure(function: Callable[[pd.Series], object], values: pd.Series) -> float:
+    seconds = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        function(values)
+        seconds.append(time.perf_counter() - started)
+    return min(seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="カンマ区切りの行数")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} " + " ".join(f"{name:>14}" for name in METHODS))
+    for size in (int(value) for value in args.sizes.split(",")):
+        values = make_timestamps(size)
+        # 計測対象の結果が従来の解析と一致することを先に確かめる。
+        expected = parse_mixed(values)
+        if not parse_timestamps(values).equals(expected):
+            raise AssertionError(f"{size}行で一括解析の結果が一致しません")
+        seconds = [measure(function, values) for function in METHODS.values()]
+        print(f"{size:>10} " + " ".join(f"{value:>13.3f}s" for value in seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""可視性ログの時刻列を、書式ごとにまとめて一括で解析する。
+
+ログには ``2025-10-10 13:37:50`` と ``...Z`` 付きのISO 8601表記が混在する。
+まず全体をpandasのISO 8601パーサーで一括解析し、解析できなかった行だけを
+数字を0に置き換えた表記の形でまとめ、形ごとに推定した固定書式で解析する。
+書式を推定できない形だけを ``format="mixed"`` で読み、それでも解釈できない
+値は異常値として返す。行数によらず同じ経路で解析し、結果は全体を
+``format="mixed"`` で読んだ場合と一致する。
+"""
+
+from typing import List, NamedTuple, Tuple
+
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# 異常値の報告に含める例の数。
+ANOMALY_SAMPLES = 3
+UNITS = ("s", "ms", "us", "ns")
+
+
+class TimestampAnomalies(NamedTuple):
+    """時刻として解釈できなかった行。"""
+
+    missing: int
+    invalid: pd.Series
+
+    def __bool__(self) -> bool:
+        return bool(self.missing or len(self.invalid))
+
+    def summary(self) -> str:
+        """件数と解釈できなかった値の例を1行で返す。"""
+        parts = []
+        if len(self.invalid):
+            samples = ", ".join(
+                repr(value) for value in self.invalid.unique()[:ANOMALY_SAMPLES]
+            )
+            parts.append(f"解釈できない値{len(self.invalid)}件 (例: {samples})")
+        if self.missing:
+            parts.append(f"空欄{self.missing}件")
+        return "、".join(parts)
+
+
+def _parse_group(text: pd.Series) -> pd.Series:
+    """同じ表記の形の値を、推定した固定書式で解析する。"""
+    timestamp_format = guess_datetime_format(text.iloc[0])
+    if timestamp_format is not None:
+        parsed = pd.to_datetime(
+            text, format=timestamp_format, errors="coerce", utc=True
+        )
+        if parsed.notna().all():
+            return parsed
+    return pd.to_datetime(text, format="mixed", errors="coerce", utc=True)
+
+
+def _combine(parsed: pd.Series, groups: List[pd.Series]) -> pd.Series:
+    """書式ごとの結果を、最も細かい精度にそろえて元の並びへ戻す。"""
+    # 全てNaTの結果は精度の判断に使わない。
+    candidates = [series for series in (parsed, *groups) if series.notna().any()]
+    finest = max(
+        (series.dtype for series in candidates or [parsed]),
+        key=lambda dtype: UNITS.index(dtype.unit),
+    )
+    combined = parsed.astype(finest)
+    for group in groups:
+        combined.loc[group.index] = group.astype(finest)
+    return combined
+
+
+def _parse_bulk(text: pd.Series, present: pd.Series) -> pd.Series:
+    """ISO 8601で一括解析し、解析できなかった行だけを表記の形ごとに読む。"""
+    parsed = pd.to_datetime(text, format="ISO8601", errors="coerce", utc=True)
+    odd = parsed.isna() & present
+    if not odd.any():
+        return parsed
+    odd_text = text[odd]
+    # 行ごとの書式判定を避け、数字を0にした形でまとめて解析する。
+    shapes = odd_text.str.replace(r"\d", "0", regex=True)
+    groups = [_parse_group(group) for _, group in odd_text.groupby(shapes)]
+    return _combine(parsed, groups)
+
+
+def parse_timestamps_with_anomalies(
+    values: pd.Series,
+) -> Tuple[pd.Series, TimestampAnomalies]:
+    """時刻の文字列をUTCで解析し、解釈できなかった行とあわせて返す。"""
+    text = values.astype("string").str.strip()
+    present = text.fillna("").str.len().gt(0)
+    parsed = _parse_bulk(text, present)
+
+    invalid = parsed.isna() & present
+    anomalies = TimestampAnomalies(
+        missing=int((~present).sum()), invalid=values[invalid]
+    )
+    return parsed, anomalies
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """時刻の文字列をUTCで解析する。解釈できない値はNaTにする。"""
+    return parse_timestamps_with_anomalies(values)[0]
@@ -2,109 +2,129 @@
 """
 AIEO Monthly Verification System
 複数AIに同じ質問を聞いて、結果を GitHub に記録する自動化スクリプト
+
+既定では全ての（質問 × AI）の組を asyncio で同時に問い合わせる。
+AIごとの同時実行数・タイムアウト・ジッター付きの再試行は環境変数で調整でき、
+AIEO_VERIFICATION_ASYNC=0 で従来どおり1件ずつ順に問い合わせる。
+
+結果は1件1行のJSONLログへ追記する。同じ月の再実行では、AI名・パラメータ・
+質問文が同じで成功済みの結果を再利用し、足りない組だけを問い合わせる。
 """
 
-import json
+import asyncio
+import inspect
 import os
+import random
 from datetime import datetime
 from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Union
 
-# API キー（GitHub Secrets から取得）
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
-GOOGLE_API_KEY = os.getenv('GEMINI_API_KEY', '')
-ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY', '')
+try:
+    from scripts.aieo_answer_drift import report_answer_drift
+    from scripts.aieo_llm_providers import ProviderRegistry
+    from scripts.aieo_verification_log import VerificationLog, response_key
+except ImportError:  # python scripts/aieo_verification.py として実行した場合
+    from aieo_answer_drift import report_answer_drift
+    from aieo_llm_providers import ProviderRegistry
+    from aieo_verification_log import VerificationLog, response_key
 
 DATA_DIR = Path('data')
 REPORTS_DIR = Path('reports')
-LOG_FILE = DATA_DIR / 'aieo_verification_log.json'
+LOG_FILE = DATA_DIR / 'aieo_verification_log.jsonl'
+LOG_INDEX_FILE = DATA_DIR / 'aieo_verification_log.index.json'
+# 実行ごとの結果を1ファイルに持っていた旧形式のログ（初回に移行する）
+LEGACY_LOG_FILE = DATA_DIR / 'aieo_verification_log.json'
 MONTHLY_REPORT = REPORTS_DIR / f'aieo_verification_{datetime.now().strftime("%Y-%m")}.md'
 
+ASYNC_MODE = os.getenv('AIEO_VERIFICATION_ASYNC', '1') != '0'
+# AIごとの同時問い合わせ数の上限
+PROVIDER_CONCURRENCY = int(os.getenv('AIEO_VERIFICATION_CONCURRENCY', '2'))
+# 1回の問い合わせのタイムアウト秒数
+QUERY_TIMEOUT = float(os.getenv('AIEO_VERIFICATION_TIMEOUT', '60'))
+# エラー・タイムアウト時の再試行回数
+QUERY_RETRIES = int(os.getenv('AIEO_VERIFICATION_RETRIES', '2'))
+RETRY_BASE_DELAY = float(os.getenv('AIEO_VERIFICATION_RETRY_DELAY', '1'))
+RETRY_MAX_DELAY = 30.0
+# 0 にすると同じ月の成功済みの結果も問い合わせ直す
+REUSE_RESPONSES = os.getenv('AIEO_VERIFICATION_REUSE', '1') != '0'
+
+QueryFunction = Callable[[str], Union[dict, Awaitable[dict]]]
+
+
 class AIVerifier:
     """複数AIに質問して結果を取得"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        query_functions: Optional[Mapping[str, QueryFunction]] = None,
+        registry: Optional[ProviderRegistry] = None,
+        log: Optional[VerificationLog] = None,
+        reuse: bool = REUSE_RESPONSES,
+        concurrency: Union[int, Mapping[str, int]] = PROVIDER_CONCURRENCY,
+        timeout: float = QUERY_TIMEOUT,
+        retries: int = QUERY_RETRIES,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+        jitter: Callable[[], float] = random.random,
+    ):
         self.results = {
             'timestamp': datetime.now().isoformat(),
             'month': datetime.now().strftime('%Y-%m'),
             'queries': {}
         }
+        # API キーは GitHub Secrets から各プロバイダーが読む。
+        # クライアントはプロバイダーごとに1つ作り、全ての質問で使い回す
+        self.registry = registry or ProviderRegistry.default(timeout=timeout)
+        # テストではスタブサーバー向けの関数や偽のクライアントに差し替える
+        self.query_functions = dict(query_functions or self.registry.query_functions())
+        self.log = log
+        self.reuse = reuse
+        # ログへ追記する、今回問い合わせた結果
+        self.new_records: List[Dict] = []
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self._sleep = sleep
+        self._jitter = jitter
     
     def query_claude(self, prompt: str) -> dict:
         """Claude に質問"""
-        if not ANTHROPIC_API_KEY:
-            return {'status': 'skipped', 'reason': 'API key not set', 'model': 'claude'}
-        
-        try:
-            from anthropic import Anthropic
-            client = Anthropic(api_key=ANTHROPIC_API_KEY)
-            
-            message = client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=500,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            response_text = message.content[0].text
-            return {
-                'status': 'success',
-                'response': response_text,
-                'model': 'claude-3-5-sonnet'
-            }
-        except Exception as e:
-            print(f"Claude error: {e}")
-            return {'status': 'error', 'error': str(e), 'model': 'claude'}
+        return self.registry.get('claude').query(prompt)
     
     def query_chatgpt(self, prompt: str) -> dict:
         """ChatGPT に質問"""
-        if not OPENAI_API_KEY:
-            return {'status': 'skipped', 'reason': 'API key not set', 'model': 'chatgpt'}
-        
-        try:
-            from openai import OpenAI
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            response_text = response.choices[0].message.content
-            return {
-                'status': 'success',
-                'response': response_text,
-                'model': 'gpt-4o'
-            }
-        except Exception as e:
-            print(f"ChatGPT error: {e}")
-            return {'status': 'error', 'error': str(e), 'model': 'chatgpt'}
+        return self.registry.get('chatgpt').query(prompt)
     
     def query_gemini(self, prompt: str) -> dict:
         """Gemini に質問"""
-        if not GOOGLE_API_KEY:
-            return {'status': 'skipped', 'reason': 'API key not set', 'model': 'gemini'}
-        
-        try:
-            import google.generativeai as genai
-            genai.configure(api_key=GOOGLE_API_KEY)
-            
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            response = model.generate_content(prompt)
-            
-            response_text = response.text
-            return {
-                'status': 'success',
-                'response': response_text,
-                'model': 'gemini-2.5-flash'
-            }
-        except Exception as e:
-            print(f"Gemini error: {e}")
-            return {'status': 'error', 'error': str(e), 'model': 'gemini'}
+        return self.registry.get('gemini').query(prompt)
+    
+    def _label(self, ai_name: str) -> str:
+        if ai_name in self.registry.names():
+            return self.registry.get(ai_name).label
+        return ai_name
+    
+    def _response_key(self, ai_name: str, prompt: str) -> str:
+        params = {}
+        if ai_name in self.registry.names():
+            params = self.registry.get(ai_name).params
+        return response_key(ai_name, params, prompt)
+    
+    def _reused(self, ai_name: str, prompt: str) -> Optional[dict]:
+        """同じ月に成功済みの結果があれば返す"""
+        if self.log is None or not self.reuse:
+            return None
+        return self.log.lookup(self.results['month'], self._response_key(ai_name, prompt))
+    
+    def _record(self, query_name: str, ai_name: str, prompt: str, result: dict) -> None:
+        self.new_records.append({
+            'timestamp': self.results['timestamp'],
+            'month': self.results['month'],
+            'query': query_name,
+            'provider': ai_name,
+            'prompt': prompt,
+            'key': self._response_key(ai_name, prompt),
+            'result': result,
+        })
     
     def run_verification(self, query_name: str, prompt: str) -> None:
         """複数AIに同じ質問を実行"""
@@ -112,17 +132,15 @@ class AIVerifier:
         
         results = {}
         
-        # Claude
-        print("  → Claude...")
-        results['claude'] = self.query_claude(prompt)
-        
-        # ChatGPT
-        print("  → ChatGPT...")
-        results['chatgpt'] = self.query_chatgpt(prompt)
-        
-        # Gemini
-        print("  → Gemini...")
-        results['gemini'] = self.query_gemini(prompt)
+        for ai_name, query in self.query_functions.items():
+            reused = self._reused(ai_name, prompt)
+            if reused is not None:
+                print(f"  → {self._label(ai_name)}: reused")
+                results[ai_name] = reused
+                continue
+            print(f"  → {self._label(ai_name)}...")
+            results[ai_name] = query(prompt)
+            self._record(query_name, ai_name, prompt, results[ai_name])
         
         # 結果を保存
         self.results['queries'][query_name] = results
@@ -130,6 +148,89 @@ class AIVerifier:
         # ステータスを表示
         self._print_status(query_name, results)
     
+    def _limit(self, ai_name: str) -> int:
+        if isinstance(self.concurrency, Mapping):
+            return self.concurrency.get(ai_name, PROVIDER_CONCURRENCY)
+        return self.concurrency
+    
+    async def _query_once(self, ai_name: str, prompt: str) -> dict:
+        query = self.query_functions[ai_name]
+        if inspect.iscoroutinefunction(query):
+            call = query(prompt)
+        else:
+            # SDK のクライアントは同期APIなので、スレッドで実行して待つ
+            call = asyncio.to_thread(query, prompt)
+        try:
+            return await asyncio.wait_for(call, self.timeout)
+        except asyncio.TimeoutError:
+            return {
+                'status': 'error',
+                'error': f'timeout after {self.timeout:g}s',
+                'model': ai_name,
+            }
+    
+    async def _query_with_retry(
+        self, ai_name: str, prompt: str, semaphore: asyncio.Semaphore
+    ) -> dict:
+        """エラー・タイムアウトの間は、ジッター付きの指数バックオフで再試行する"""
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                result = await self._query_once(ai_name, prompt)
+            if result['status'] != 'error' or attempt == self.retries:
+                return result
+            # 同時に失敗した問い合わせが一斉に再送しないよう、待機時間をばらつかせる
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+            await self._sleep(delay * self._jitter())
+    
+    async def run_verification_async(self, config: Mapping[str, dict]) -> None:
+        """全ての（質問 × AI）の組を同時に問い合わせ、結果を順に保存する"""
+        semaphores = {
+            ai_name: asyncio.Semaphore(self._limit(ai_name))
+            for ai_name in self.query_functions
+        }
+        results = {
+            query_name: {
+                ai_name: self._reused(ai_name, config[query_name]['prompt'])
+                for ai_name in self.query_functions
+            }
+            for query_name in config
+        }
+        pairs = [
+            (query_name, ai_name)
+            for query_name, query_results in results.items()
+            for ai_name, result in query_results.items()
+            if result is None
+        ]
+        reused = sum(len(query_results) for query_results in results.values()) - len(pairs)
+        print(
+            f"\n[AIEO] Querying {len(pairs)} (query × AI) pairs concurrently"
+            f" ({reused} reused)"
+        )
+        responses = await asyncio.gather(
+            *(
+                self._query_with_retry(
+                    ai_name, config[query_name]['prompt'], semaphores[ai_name]
+                )
+                for query_name, ai_name in pairs
+            )
+        )
+        
+        for (query_name, ai_name), result in zip(pairs, responses):
+            results[query_name][ai_name] = result
+            self._record(query_name, ai_name, config[query_name]['prompt'], result)
+        self.results['queries'].update(results)
+        for query_name in config:
+            print(f"\n[AIEO] Query: {query_name}")
+            self._print_status(query_name, self.results['queries'][query_name])
+    
+    def run_all(self, config: Mapping[str, dict], use_async: bool = ASYNC_MODE) -> None:
+        """質問セット全体を検証する"""
+        if use_async:
+            asyncio.run(self.run_verification_async(config))
+            return
+        for query_name, query_config in config.items():
+            self.run_verification(query_name, query_config['prompt'])
+    
     def _print_status(self, query_name: str, results: dict) -> None:
         """結果ステータスを表示"""
         for ai_name, result in results.items():
@@ -144,25 +245,10 @@ class AIVerifier:
                 print(f"    ✗ {ai_name}: error")
 
 
-def save_log(results: dict) -> None:
-    """結果をJSON ログに保存"""
-    DATA_DIR.mkdir(exist_ok=True)
-    
-    # 既存ログを読み込む
-    if LOG_FILE.exists():
-        with open(LOG_FILE, 'r', encoding='utf-8') as f:
-            log_data = json.load(f)
-    else:
-        log_data = {'history': []}
-    
-    # 新しい結果を追加
-    log_data['history'].append(results)
-    
-    # 保存
-    with open(LOG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(log_data, f, indent=2, ensure_ascii=False, default=str)
-    
-    print(f"\n[AIEO] Log saved: {LOG_FILE}")
+def save_log(log: VerificationLog, records: List[Dict]) -> None:
+    """今回問い合わせた結果だけを JSONL ログに追記"""
+    appended = log.append(records)
+    print(f"\n[AIEO] Log saved: {log.path} (+{appended} results)")
 
 
 def generate_markdown_report(results: dict) -> None:
@@ -228,17 +314,22 @@ def main():
     verification_config = create_verification_config()
     
     # 検証を実行
-    verifier = AIVerifier()
-    
-    for query_name, config in verification_config.items():
-        verifier.run_verification(query_name, config['prompt'])
+    log = VerificationLog(LOG_FILE, LOG_INDEX_FILE, legacy_path=LEGACY_LOG_FILE)
+    verifier = AIVerifier(log=log)
+    try:
+        verifier.run_all(verification_config)
+    finally:
+        verifier.registry.close()
     
     # 結果を保存
-    save_log(verifier.results)
+    save_log(log, verifier.new_records)
     
     # マークダウンレポートを生成
     generate_markdown_report(verifier.results)
     
+    # 回答の月ごとの推移を集計
+    report_answer_drift(LOG_FILE)
+    
     print("\n" + "=" * 60)
     print("✓ Verification Complete")
     print("=" * 60)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""AIEO検証の結果を1件1行で追記するJSONLログと、その索引。
+
+各行は（質問 × AI）1件の結果で、AI名・リクエストのパラメータ・質問文から
+作ったハッシュをキーに持つ。索引は月ごとにキーから成功した結果の行位置を
+引けるようにし、同じ月の再実行では成功済みの組を問い合わせずに済ませる。
+索引はログのサイズと末尾のハッシュで検証し、ずれていれば追記分だけ
+（ログが書き換えられていれば全体を）読み直して作り直す。
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+try:
+    from scripts.aieo_metrics_store import tail_digest
+    from scripts.aieo_metrics_writer import file_lock
+except ImportError:  # python scripts/aieo_verification.py として実行した場合
+    from aieo_metrics_store import tail_digest
+    from aieo_metrics_writer import file_lock
+
+
+def response_key(provider: str, params: Mapping, prompt: str) -> str:
+    """AI名・パラメータ・質問文が同じ問い合わせに共通のキーを返す。"""
+    payload = json.dumps(
+        [provider, dict(params), prompt], ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def iter_log_records(path: Path, offset: int = 0) -> Iterator[Tuple[int, int, Dict]]:
+    """offset以降の行を、行の開始位置・終了位置とともに返す。"""
+    with Path(path).open("rb") as file:
+        file.seek(offset)
+        for line in file:
+            # 書き込み途中の最終行は次回に回す。
+            if not line.endswith(b"\n"):
+                break
+            yield offset, offset + len(line), json.loads(line)
+            offset += len(line)
+
+
+class VerificationLog:
+    """検証結果の追記専用ログ。月ごとに成功した結果を再利用できる。"""
+
+    def __init__(
+        self, path: Path, index_path: Path, legacy_path: Optional[Path] = None
+    ) -> None:
+        self.path = Path(path)
+        self.index_path = Path(index_path)
+        self._index = self._load_index()
+        if legacy_path is not None and Path(legacy_path).exists() and not self.path.exists():
+            self._migrate(Path(legacy_path))
+        self._refresh()
+
+    def _empty_index(self) -> Dict:
+        return {"size": 0, "digest": "", "responses": {}}
+
+    def _load_index(self) -> Dict:
+        if not self.index_path.exists():
+            return self._empty_index()
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if (
+                index["size"] > self.path.stat().st_size
+                or index["digest"] != tail_digest(self.path, index["size"])
+                or not isinstance(index["responses"], dict)
+            ):
+                return self._empty_index()
+        except (OSError, ValueError, KeyError, TypeError):
+            return self._empty_index()
+        return index
+
+    def _index_record(self, offset: int, record: Mapping) -> None:
+        if record.get("key") and record["result"].get("status") == "success":
+            month = self._index["responses"].setdefault(record["month"], {})
+            month[record["key"]] = offset
+
+    def _refresh(self) -> None:
+        """索引に未反映の追記行を取り込む。"""
+        if not self.path.exists():
+            return
+        for offset, end, record in iter_log_records(self.path, self._index["size"]):
+            self._index_record(offset, record)
+            self._index["size"] = end
+
+    def _save_index(self) -> None:
+        self._index["digest"] = tail_digest(self.path, self._index["size"])
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_suffix(".tmp")
+        temp_path.write_text(
+            json.dumps(self._index, ensure_ascii=False), encoding="utf-8"
+        )
+        os.replace(temp_path, self.index_path)
+
+    def lookup(self, month: str, key: str) -> Optional[Dict]:
+        """その月に成功した同じ問い合わせの結果を返す。なければNoneを返す。"""
+        offset = self._index["responses"].get(month, {}).get(key)
+        if offset is None:
+            return None
+        with self.path.open("rb") as file:
+            file.seek(offset)
+            record = json.loads(file.readline())
+        return record["result"] if record.get("key") == key else None
+
+    def append(self, records: Iterable[Mapping]) -> int:
+        """結果を追記して索引を更新し、追記した件数を返す。"""
+        lines = [
+            (record, json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            for record in records
+        ]
+        if not lines:
+            return 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("ab") as file, file_lock(file):
+            # 他の実行が先に追記した行も索引へ取り込んでから書き足す。
+            self._refresh()
+            file.seek(0, os.SEEK_END)
+            for record, line in lines:
+                self._index_record(file.tell(), record)
+                file.write(line.encode("utf-8"))
+            file.flush()
+            self._index["size"] = file.tell()
+            self._save_index()
+        return len(lines)
+
+    def _migrate(self, legacy_path: Path) -> None:
+        """実行ごとの結果を1ファイルに持つ旧形式のログを、1件1行へ移す。"""
+        legacy = json.loads(legacy_path.read_text(encoding="utf-8"))
+        history = legacy.get("history", [])
+        records: List[Dict] = [
+            {
+                "timestamp": run.get("timestamp"),
+                "month": run.get("month"),
+                "query": query_name,
+                "provider": ai_name,
+                # 旧形式は質問文とパラメータを残していないため、再利用しない。
+                "key": None,
+                "result": result,
+            }
+            for run in history
+            for query_name, results in run.get("queries", {}).items()
+            for ai_name, result in results.items()
+        ]
+        self.append(records)
+        print(f"[AIEO] Migrated {len(records)} results from {legacy_path} to {self.path}")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""新旧の可視性CSVを共通形式へ正規化する、読み込み側で共有する入口。
+
+スキーマはヘッダー行だけで判定し、必要な列だけをメトリクスストア経由で
+読み込む。timestampは ``aieo_timestamps`` で書式ごとに一括解析する。
+結果は（パス, mtime, サイズ, 列）ごとにプロセス内で保持し、同じ実行で
+同じファイルを何度も解析しない。
+"""
+
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+
+try:
+    from scripts.aieo_metrics_store import load_metrics, read_csv_header
+    from scripts.aieo_timestamps import TimestampAnomalies, parse_timestamps_with_anomalies
+except ImportError:  # scripts/ を直接実行した場合
+    from aieo_metrics_store import load_metrics, read_csv_header
+    from aieo_timestamps import TimestampAnomalies, parse_timestamps_with_anomalies
+
+
+class VisibilitySchema(NamedTuple):
+    """可視性CSVの種類と、対象名・値として使う列。"""
+
+    name: str
+    label: str
+    key_column: str
+    value_column: str
+
+    @property
+    def columns(self) -> Tuple[str, str, str]:
+        return ("timestamp", self.key_column, self.value_column)
+
+
+MODERN_SCHEMA = VisibilitySchema(
+    "modern", "人物別可視性メトリクス", "name", "visibility_score"
+)
+LEGACY_SCHEMA = VisibilitySchema("legacy", "旧版可視性履歴", "keyword", "totalResults")
+SCHEMAS = (MODERN_SCHEMA, LEGACY_SCHEMA)
+
+_CacheKey = Tuple[str, int, int, Tuple[str, ...]]
+# パスごとに最新の1件だけを保持する。
+_cache: Dict[str, Tuple[_CacheKey, VisibilitySchema, pd.DataFrame]] = {}
+
+
+def detect_schema(columns: Sequence[str]) -> VisibilitySchema:
+    """列名から可視性スキーマを判定する。人物別メトリクスを優先する。"""
+    available = set(columns)
+    for schema in SCHEMAS:
+        if available.issuperset(schema.columns):
+            return schema
+    expected = [sorted(schema.columns) for schema in SCHEMAS]
+    raise ValueError(
+        "対応する可視性スキーマの必須列がありません: "
+        f"modern={expected[0]}, legacy={expected[1]}"
+    )
+
+
+def normalize_visibility_frame(
+    frame: pd.DataFrame,
+    schema: Optional[VisibilitySchema] = None,
+    extra_columns: Sequence[str] = (),
+) -> pd.DataFrame:
+    """可視性の行を timestamp（UTC）・keyword・value の形式へ揃え、無効行を除く。
+
+    ``extra_columns`` はそのままの名前で残す。
+    """
+    schema = schema or detect_schema(frame.columns)
+    normalized = frame[[*schema.columns, *extra_columns]].rename(
+        columns={schema.key_column: "keyword", schema.value_column: "value"}
+    )
+    timestamps = normalized["timestamp"]
+    anomalies: Optional[TimestampAnomalies] = None
+    if not isinstance(timestamps.dtype, pd.DatetimeTZDtype):
+        # ストアで解析済みの場合は元の表記が残っていないため、件数だけを報告する。
+        timestamps, anomalies = parse_timestamps_with_anomalies(timestamps)
+    normalized["timestamp"] = timestamps
+    normalized["keyword"] = normalized["keyword"].astype("string").str.strip()
+    normalized["value"] = pd.to_numeric(normalized["value"], errors="coerce")
+
+    reasons = {
+        "timestamp": normalized["timestamp"].isna(),
+        "対象名": normalized["keyword"].fillna("").str.len().eq(0),
+        "値": normalized["value"].isna(),
+    }
+    valid_rows = ~(reasons["timestamp"] | reasons["対象名"] | reasons["値"])
+    dropped_rows = int((~valid_rows).sum())
+    normalized = normalized.loc[valid_rows]
+
+    if dropped_rows:
+        counts = "、".join(
+            f"{reason}{int(mask.sum())}行" for reason, mask in reasons.items() if mask.any()
+        )
+        print(f"⚠️ {schema.label}から無効な{dropped_rows}行を除外しました ({counts})")
+        if anomalies:
+            print(f"⚠️ {schema.label}のtimestamp: {anomalies.summary()}")
+    if normalized.empty:
+        raise ValueError(f"{schema.label}に有効な行がありません")
+    print(f"✓ {schema.label}を使用: {len(normalized)}有効行")
+    return normalized
+
+
+def load_visibility(
+    path: Path, extra_columns: Sequence[str] = ()
+) -> Tuple[VisibilitySchema, pd.DataFrame]:
+    """CSVのスキーマを判定し、正規化した行を返す。
+
+    同じファイルが変わっていなければ、前回の結果の複製を返す。
+    """
+    path = Path(path)
+    stat = path.stat()
+    resolved = str(path.resolve())
+    key = (resolved, stat.st_mtime_ns, stat.st_size, tuple(extra_columns))
+    cached = _cache.get(resolved)
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2].copy()
+
+    schema = detect_schema(read_csv_header(path))
+    frame = load_metrics(path, columns=[*schema.columns, *extra_columns])
+    normalized = normalize_visibility_frame(frame, schema, extra_columns)
+    _cache[resolved] = (key, schema, normalized)
+    return schema, normalized.copy()
+
+
+def clear_cache() -> None:
+    """保持している正規化結果を捨てる。"""
+    _cache.clear()
@@ -9,24 +9,46 @@
 保存しない。失敗時は処理全体を停止し、直前の正常データを保持する。
 """
 
-import csv
 import json
 import math
 import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from scripts.aieo_latest_index import LatestIndex
+    from scripts.aieo_metrics_writer import MetricsWriter
+    from scripts.aieo_provider_cache import ProviderCache
+    from scripts.aieo_query_planner import DomainQueryPlanner
+    from scripts.aieo_rate_limiter import ProviderRateLimiter, QuotaExhaustedError
+except ImportError:  # python scripts/aieo_visibility_tracker.py として実行した場合
+    from aieo_latest_index import LatestIndex
+    from aieo_metrics_writer import MetricsWriter
+    from aieo_provider_cache import ProviderCache
+    from aieo_query_planner import DomainQueryPlanner
+    from aieo_rate_limiter import ProviderRateLimiter, QuotaExhaustedError
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 GOOGLE_CX = os.getenv("GOOGLE_CX", "")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
+# GitHub Actionsが設定するAPIのベースURL。GHESやテスト用スタブにも向けられる。
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+# 1回のGraphQLクエリで問い合わせるユーザー数。ノード上限に十分な余裕を残す。
+GITHUB_GRAPHQL_BATCH_SIZE = 100
 
 VISIBILITY_LOG = Path(
     os.getenv("AIEO_VISIBILITY_METRICS_LOG", "aieo_visibility_metrics.csv")
 )
 CONFIG_FILE = Path("config/users_to_track.json")
+# 1ならこれまで通り逐次収集し、2以上で人物・クエリを並列に発行する。
+MAX_WORKERS = max(int(os.getenv("AIEO_VISIBILITY_MAX_WORKERS", "8")), 1)
+MENTION_DOMAINS = ("github.com", "medium.com", "dev.to", "stackoverflow.com")
 METRIC_FIELDS = [
     "timestamp",
     "name",
@@ -77,12 +99,26 @@ def _safe_provider_message(response: requests.Response) -> str:
 class VisibilityTracker:
     """GitHub公開情報と検索結果から可視性メトリクスを収集する。"""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        cache: Optional[ProviderCache] = None,
+        limiter: Optional[ProviderRateLimiter] = None,
+        planner: Optional[DomainQueryPlanner] = None,
+    ) -> None:
+        self.cache = cache
+        self.limiter = limiter
+        self.planner = planner
         self.google_api_key = GOOGLE_API_KEY
         self.google_cx = GOOGLE_CX
         self.github_token = GITHUB_TOKEN
+        self.github_api_url = GITHUB_API_URL
         self.session = requests.Session()
         self.session.headers.update({"User-Agent": "AIEO-Visibility-Tracker/1.1"})
+        # 並列収集中だけ設定される。Noneの間は各クエリを呼び出し元で逐次実行する。
+        self._query_pool: Optional[ThreadPoolExecutor] = None
+        self._abort = threading.Event()
+        # track_peopleがGraphQLで先読みしたGitHub統計。キーは小文字のユーザー名。
+        self._github_stats: Dict[str, Dict] = {}
 
     def search_google(self, query: str, num_results: int = 10) -> Dict:
         """Google Custom Searchから検索結果数を取得する。"""
@@ -91,6 +127,30 @@ class VisibilityTracker:
                 "Google Custom SearchのGOOGLE_API_KEYまたはGOOGLE_CXが設定されていません"
             )
 
+        num_results = min(max(int(num_results), 1), 10)
+        cache_key = f"{self.google_cx}|{num_results}|{query}"
+        if self.cache is not None:
+            cached = self.cache.get("google", cache_key)
+            if cached is not None:
+                return cached
+
+        result = self._request_google(query, num_results)
+        if self.cache is not None:
+            self.cache.put("google", cache_key, result)
+        return result
+
+    def _acquire(self, provider: str) -> None:
+        """送信前にレートとquotaの枠を確保する。枠がなければProviderErrorにする。"""
+        if self.limiter is None:
+            return
+        try:
+            self.limiter.acquire(provider)
+        except QuotaExhaustedError as exc:
+            raise ProviderError(str(exc)) from None
+
+    def _request_google(self, query: str, num_results: int) -> Dict:
+        """キャッシュを介さずGoogle Custom Search APIを呼び出す。"""
+        self._acquire("google")
         try:
             response = self.session.get(
                 "https://www.googleapis.com/customsearch/v1",
@@ -98,7 +158,7 @@ class VisibilityTracker:
                     "q": query,
                     "key": self.google_api_key,
                     "cx": self.google_cx,
-                    "num": min(max(int(num_results), 1), 10),
+                    "num": num_results,
                 },
                 timeout=15,
             )
@@ -109,6 +169,8 @@ class VisibilityTracker:
             ) from None
 
         if response.status_code != 200:
+            if response.status_code == 429 and self.limiter is not None:
+                self.limiter.throttle("google")
             reason = _safe_provider_message(response)
             raise ProviderError(
                 f"Google Custom SearchがHTTP {response.status_code}を返しました: {reason}"
@@ -138,23 +200,40 @@ class VisibilityTracker:
 
     def fetch_github_user(self, username: str) -> Dict:
         """GitHubユーザーの公開統計を取得する。"""
+        if self.cache is not None:
+            cached = self.cache.get("github", username.lower())
+            if cached is not None:
+                return cached
+
+        result = self._request_github_user(username)
+        if self.cache is not None:
+            self.cache.put("github", username.lower(), result)
+        return result
+
+    def _github_headers(self) -> Dict[str, str]:
+        """GitHub API共通のリクエストヘッダーを返す。"""
         headers = {
             "Accept": "application/vnd.github+json",
             "X-GitHub-Api-Version": "2022-11-28",
         }
         if self.github_token:
             headers["Authorization"] = f"Bearer {self.github_token}"
+        return headers
 
+    def _request_github_user(self, username: str) -> Dict:
+        """キャッシュを介さずGitHub REST APIを呼び出す。"""
+        self._acquire("github")
         try:
             response = self.session.get(
-                f"https://api.github.com/users/{username}",
-                headers=headers,
+                f"{self.github_api_url}/users/{username}",
+                headers=self._github_headers(),
                 timeout=15,
             )
         except requests.RequestException as exc:
             raise ProviderError(
                 f"GitHub APIへの接続に失敗しました ({type(exc).__name__})"
             ) from None
+        self._observe_github_response(response)
 
         if response.status_code != 200:
             raise ProviderError(f"GitHub APIがHTTP {response.status_code}を返しました")
@@ -175,6 +254,155 @@ class VisibilityTracker:
             "public_gists": public_gists,
         }
 
+    def fetch_github_users(self, usernames: List[str]) -> Dict[str, Dict]:
+        """複数ユーザーの公開統計をGraphQLでまとめて取得する。
+
+        トークンがない場合、GraphQLが失敗した場合、またはユーザーとして
+        解決できなかった場合は、該当ユーザーだけ従来のREST取得へ戻す。
+        戻り値のキーは小文字のユーザー名。
+        """
+        stats: Dict[str, Dict] = {}
+        pending: List[str] = []
+        for username in dict.fromkeys(usernames):
+            cached = self.cache.get("github", username.lower()) if self.cache else None
+            if cached is not None:
+                stats[username.lower()] = cached
+            else:
+                pending.append(username)
+
+        fallback: List[str] = []
+        if self.github_token:
+            for start in range(0, len(pending), GITHUB_GRAPHQL_BATCH_SIZE):
+                chunk = pending[start : start + GITHUB_GRAPHQL_BATCH_SIZE]
+                resolved = self._request_github_users_graphql(chunk)
+                for username in chunk:
+                    result = resolved.get(username.lower())
+                    if result is None:
+                        fallback.append(username)
+                        continue
+                    stats[username.lower()] = result
+                    if self.cache is not None:
+                        self.cache.put("github", username.lower(), result)
+        else:
+            fallback = pending
+
+        results = self._run_queries(
+            [
+                lambda username=username: self.fetch_github_user(username)
+                for username in fallback
+            ]
+        )
+        for username, result in zip(fallback, results):
+            stats[username.lower()] = result
+        return stats
+
+    def _request_github_users_graphql(self, usernames: List[str]) -> Dict[str, Dict]:
+        """1回のGraphQLクエリで統計を取得する。取得できた分だけを返す。"""
+        fields = (
+            "followers { totalCount } "
+            "repositories(privacy: PUBLIC, ownerAffiliations: OWNER) { totalCount } "
+            "gists(privacy: PUBLIC) { totalCount }"
+        )
+        declarations = ", ".join(f"$login{index}: String!" for index in range(len(usernames)))
+        selections = " ".join(
+            f"u{index}: user(login: $login{index}) {{ {fields} }}"
+            for index in range(len(usernames))
+        )
+        query = f"query({declarations}) {{ {selections} }}"
+        variables = {f"login{index}": name for index, name in enumerate(usernames)}
+
+        self._acquire("github")
+        try:
+            response = self.session.post(
+                f"{self.github_api_url}/graphql",
+                json={"query": query, "variables": variables},
+                headers=self._github_headers(),
+                timeout=15,
+            )
+            self._observe_github_response(response)
+            payload = response.json() if response.status_code == 200 else None
+        except (requests.RequestException, ValueError) as exc:
+            print(
+                "  ⚠ GitHub GraphQLへ接続できないためRESTへ戻します "
+                f"({type(exc).__name__})"
+            )
+            return {}
+
+        data = payload.get("data") if isinstance(payload, dict) else None
+        if not isinstance(data, dict):
+            print(
+                "  ⚠ GitHub GraphQLが統計を返さないためRESTへ戻します "
+                f"(HTTP {response.status_code})"
+            )
+            return {}
+
+        resolved: Dict[str, Dict] = {}
+        for index, username in enumerate(usernames):
+            node = data.get(f"u{index}")
+            try:
+                result = {
+                    "public_repos": int(node["repositories"]["totalCount"]),
+                    "followers": int(node["followers"]["totalCount"]),
+                    "public_gists": int(node["gists"]["totalCount"]),
+                }
+            except (KeyError, TypeError, ValueError):
+                continue
+            if min(result.values()) >= 0:
+                resolved[username.lower()] = result
+        return resolved
+
+    def _observe_github_response(self, response: requests.Response) -> None:
+        """GitHub応答のrate limitヘッダーを送信制御へ反映する。"""
+        if self.limiter is None:
+            return
+        self.limiter.observe_github_headers(getattr(response, "headers", {}) or {})
+        if response.status_code in (403, 429):
+            self.limiter.throttle("github")
+
+    def probe_github_rate_limit(self) -> None:
+        """消費なしで参照できる /rate_limit から、実行前にGitHubの残量を得る。"""
+        if self.limiter is None or not self.github_token:
+            return
+        try:
+            response = self.session.get(
+                f"{self.github_api_url}/rate_limit",
+                headers=self._github_headers(),
+                timeout=15,
+            )
+        except requests.RequestException:
+            return
+        if response.status_code == 200:
+            self.limiter.observe_github_headers(response.headers)
+
+    def plan_queries(
+        self, users: List[Dict], observed_at: str | None = None
+    ) -> Dict[str, int]:
+        """対象一覧から、1回の実行で各プロバイダーへ送るリクエスト数を見積もる。"""
+        github_users = sum(1 for user in users if user.get("github"))
+        if self.github_token and github_users:
+            github_requests = math.ceil(github_users / GITHUB_GRAPHQL_BATCH_SIZE)
+        else:
+            github_requests = github_users
+        observed_at = observed_at or utc_now_iso()
+        google_requests = sum(
+            1 + len(self._plan_domains(user.get("name", "Unknown"), observed_at)[0])
+            for user in users
+        )
+        return {"google": google_requests, "github": github_requests}
+
+    def ensure_run_fits(
+        self, users: List[Dict], observed_at: str | None = None
+    ) -> Dict[str, int]:
+        """見積もりが残りquotaに収まらなければ、クエリを送る前に失敗させる。"""
+        planned = self.plan_queries(users, observed_at)
+        if self.limiter is not None:
+            self.probe_github_rate_limit()
+            try:
+                self.limiter.ensure_capacity(planned)
+            except QuotaExhaustedError as exc:
+                raise ProviderError(str(exc)) from None
+        return planned
+
     @staticmethod
     def calculate_visibility_score(
         github_repos: int,
@@ -190,6 +418,21 @@ class VisibilityTracker:
             score += min(math.log(domain_mentions + 1) / math.log(1000), 1.0) * 20
         return min(score, 100.0)
 
+    def _run_queries(self, calls: List[Callable[[], Dict]]) -> List[Dict]:
+        """クエリ群を実行し、1件でも失敗したら残りを取り消して例外を伝える。"""
+        if self._query_pool is None:
+            return [call() for call in calls]
+
+        return _gather(
+            [self._query_pool.submit(self._run_unless_aborted, call) for call in calls]
+        )
+
+    def _run_unless_aborted(self, call: Callable[[], Dict]) -> Dict:
+        """別のクエリが失敗済みなら、待機中のクエリを発行せずに終える。"""
+        if self._abort.is_set():
+            raise ProviderError("別のクエリが失敗したため収集を中断しました")
+        return call()
+
     def track_person(
         self, name: str, features: Dict, observed_at: str | None = None
     ) -> Dict:
@@ -208,31 +451,158 @@ class VisibilityTracker:
         github_username = features.get("github")
         if github_username:
             print(f"  • GitHub: @{github_username}")
-            github_data = self.fetch_github_user(github_username)
-            metrics["github_followers"] = github_data["followers"]
-            metrics["github_repos"] = github_data["public_repos"]
-
         print(f"  • Web検索: '{name}'")
-        metrics["web_mentions"] = self.search_google(f'"{name}"')["results"]
-
         print("  • ドメイン言及を集計")
-        metrics["domain_mentions"] = self._count_domain_mentions(name)
+
+        # 安定しているドメインは前回値を引き継ぎ、今回は問い合わせない。
+        due_domains, carried = self._plan_domains(name, metrics["timestamp"])
+        if carried:
+            print(f"  • 前回値を引き継ぐドメイン: {', '.join(carried)}")
+
+        # 1人分の全クエリをまとめて投入し、並列収集時は同時に待つ。
+        domain_calls = self._domain_mention_calls(name, due_domains)
+        calls = [lambda: self.search_google(f'"{name}"'), *domain_calls]
+        if github_username:
+            calls.append(lambda: self._github_user_stats(github_username))
+        results = self._run_queries(calls)
+
+        metrics["web_mentions"] = results[0]["results"]
+        domain_results = results[1 : 1 + len(domain_calls)]
+        if self.planner is not None:
+            for domain, result in zip(due_domains, domain_results):
+                self.planner.record(
+                    name, domain, result["results"], metrics["timestamp"]
+                )
+            # CSVのスキーマは変えず、引き継いだドメインは計画の状態ファイルに残す。
+            self.planner.record_carried(name, carried, metrics["timestamp"])
+        metrics["domain_mentions"] = sum(
+            result["results"] for result in domain_results
+        ) + sum(carried.values())
+        metrics["carried_forward_domains"] = sorted(carried)
+        if github_username:
+            metrics["github_followers"] = results[-1]["followers"]
+            metrics["github_repos"] = results[-1]["public_repos"]
         metrics["visibility_score"] = self.calculate_visibility_score(
             metrics["github_repos"],
             metrics["github_followers"],
             metrics["web_mentions"],
             metrics["domain_mentions"],
         )
-        print(f"  ✓ 可視性スコア: {metrics['visibility_score']:.1f}/100")
+        print(f"  ✓ {name} 可視性スコア: {metrics['visibility_score']:.1f}/100")
         return metrics
 
+    def _github_user_stats(self, username: str) -> Dict:
+        """先読み済みの統計があれば使い、なければREST APIで取得する。"""
+        prefetched = self._github_stats.get(username.lower())
+        if prefetched is not None:
+            return prefetched
+        return self.fetch_github_user(username)
+
+    def _plan_domains(
+        self, name: str, observed_at: str
+    ) -> Tuple[List[str], Dict[str, int]]:
+        """今回問い合わせるドメインと、前回値を引き継ぐドメインを返す。"""
+        if self.planner is None:
+            return list(MENTION_DOMAINS), {}
+        return self.planner.plan(name, MENTION_DOMAINS, observed_at)
+
+    def _domain_mention_calls(
+        self, name: str, domains: Sequence[str] = MENTION_DOMAINS
+    ) -> List[Callable[[], Dict]]:
+        """指定ドメインごとの検索クエリを返す。"""
+        return [
+            lambda domain=domain: self.search_google(
+                f'"{name}" site:{domain}', num_results=1
+            )
+            for domain in domains
+        ]
+
     def _count_domain_mentions(self, name: str) -> int:
         """主要ドメインでの検索結果数を合計する。"""
-        total = 0
-        for domain in ("github.com", "medium.com", "dev.to", "stackoverflow.com"):
-            result = self.search_google(f'"{name}" site:{domain}', num_results=1)
-            total += result["results"]
-        return total
+        results = self._run_queries(self._domain_mention_calls(name))
+        return sum(result["results"] for result in results)
+
+    def track_people(
+        self,
+        users: List[Dict],
+        observed_at: str | None = None,
+        max_workers: int = MAX_WORKERS,
+    ) -> List[Dict]:
+        """全対象を共通観測時刻で計測し、設定ファイルの順に返す。
+
+        ``max_workers`` が2以上なら人物とクエリを並列に発行する。
+        HTTPの同時実行数はクエリ用プールの大きさで上限が決まり、
+        1件でもProviderErrorになれば未着手のクエリを取り消して全体を失敗させる。
+        """
+        observed_at = observed_at or utc_now_iso()
+        if max_workers <= 1 or not users:
+            try:
+                self._prefetch_github_stats(users)
+                return [
+                    self.track_person(user.get("name", "Unknown"), user, observed_at)
+                    for user in users
+                ]
+            finally:
+                self._github_stats = {}
+
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        # 人物用スレッドはクエリ完了を待つだけなので、別プールにしてデッドロックを避ける。
+        query_pool = ThreadPoolExecutor(max_workers, thread_name_prefix="aieo-query")
+        person_pool = ThreadPoolExecutor(
+            min(max_workers, len(users)), thread_name_prefix="aieo-person"
+        )
+        self._query_pool = query_pool
+        self._abort.clear()
+        try:
+            self._prefetch_github_stats(users)
+            return _gather(
+                [
+                    person_pool.submit(
+                        self.track_person,
+                        user.get("name", "Unknown"),
+                        user,
+                        observed_at,
+                    )
+                    for user in users
+                ]
+            )
+        except BaseException:
+            # 待機中のクエリを即座に失敗させ、人物用スレッドを早く終わらせる。
+            self._abort.set()
+            raise
+        finally:
+            person_pool.shutdown(wait=True, cancel_futures=True)
+            query_pool.shutdown(wait=True)
+            self._query_pool = None
+            self._github_stats = {}
+
+    def _prefetch_github_stats(self, users: List[Dict]) -> None:
+        """GraphQLを使える場合だけ、全対象のGitHub統計をまとめて先読みする。"""
+        usernames = [user["github"] for user in users if user.get("github")]
+        if self.github_token and usernames:
+            self._github_stats = self.fetch_github_users(usernames)
+
+
+def _gather(futures: List[Future]) -> List:
+    """Futureを投入順に集め、最初に失敗したものの例外を送出する。
+
+    未着手のFutureは取り消す。実行中のHTTP呼び出しはタイムアウトで終わる。
+    """
+    done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+    failed = next(
+        (
+            future
+            for future in futures
+            if future in done and not future.cancelled() and future.exception()
+        ),
+        None,
+    )
+    if failed is not None:
+        for future in futures:
+            future.cancel()
+        raise failed.exception()
+    return [future.result() for future in futures]
 
 
 def load_users_config() -> List[Dict]:
@@ -249,36 +619,17 @@ def load_users_config() -> List[Dict]:
     return data if isinstance(data, list) else []
 
 
-def _validate_existing_header(path: Path) -> None:
-    """既存CSVが専用スキーマと一致することを確認する。"""
-    if not path.exists() or path.stat().st_size == 0:
-        return
-    with path.open("r", encoding="utf-8", newline="") as file:
-        header = next(csv.reader(file), [])
-    if header != METRIC_FIELDS:
-        raise ValueError(
-            f"{path} のヘッダーが不正です: {header}; 期待値: {METRIC_FIELDS}"
-        )
-
-
 def save_visibility_log(metrics_list: List[Dict]) -> None:
     """旧版CSVへ触れず、人物別メトリクスだけを追記する。"""
     if not metrics_list:
         print("⚠ 保存する可視性データがありません")
         return
 
-    _validate_existing_header(VISIBILITY_LOG)
-    file_exists = VISIBILITY_LOG.exists() and VISIBILITY_LOG.stat().st_size > 0
-    VISIBILITY_LOG.parent.mkdir(parents=True, exist_ok=True)
-
-    with VISIBILITY_LOG.open("a", newline="", encoding="utf-8") as file:
-        writer = csv.DictWriter(file, fieldnames=METRIC_FIELDS, extrasaction="ignore")
-        if not file_exists:
-            writer.writeheader()
-        for metrics in metrics_list:
-            writer.writerow({field: metrics.get(field, 0) for field in METRIC_FIELDS})
-
-    print(f"\n✓ メトリクスを保存: {VISIBILITY_LOG}")
+    latest = LatestIndex(VISIBILITY_LOG, "name", "visibility_score")
+    total = MetricsWriter(VISIBILITY_LOG, METRIC_FIELDS).append(
+        metrics_list, on_append=latest.record_append
+    )
+    print(f"\n✓ メトリクスを保存: {VISIBILITY_LOG} (累計{total}行)")
 
 
 def main() -> None:
@@ -293,17 +644,29 @@ def main() -> None:
     if not users:
         raise RuntimeError(f"追跡対象がありません: {CONFIG_FILE}")
 
-    tracker = VisibilityTracker()
+    tracker = VisibilityTracker(
+        cache=ProviderCache.from_env(),
+        limiter=ProviderRateLimiter.from_env(),
+        planner=DomainQueryPlanner.from_env(),
+    )
     try:
-        all_metrics = [
-            tracker.track_person(
-                user.get("name", "Unknown"), user, observed_at=collection_timestamp
-            )
-            for user in users
-        ]
+        planned = tracker.ensure_run_fits(users, collection_timestamp)
+        print(
+            f"🧮 予定クエリ数: Google {planned['google']}件 / GitHub {planned['github']}件"
+        )
+        all_metrics = tracker.track_people(users, observed_at=collection_timestamp)
     except ProviderError as exc:
         print(f"::error title=AIEO visibility provider error::{exc}")
         raise
+    finally:
+        tracker.limiter.save()
+        if tracker.cache is not None:
+            stats = tracker.cache.stats()
+            print(
+                f"🗄 プロバイダーキャッシュ: hit={stats['hits']} "
+                f"miss={stats['misses']} evicted={stats['evictions']}"
+            )
+            tracker.cache.close()
 
     if all(
         metric["web_mentions"] == 0 and metric["domain_mentions"] == 0
@@ -315,6 +678,9 @@ def main() -> None:
         )
 
     save_visibility_log(all_metrics)
+    if tracker.planner is not None:
+        # 行を保存できた実行の観測値だけを、次回の引き継ぎ元にする。
+        tracker.planner.save()
 
     print("\n" + "=" * 60)
     print("✓ 可視性計測完了")
@@ -1,10 +1,32 @@
 import os
 import json
 import re
+import threading
 import time
+import urllib.request
 import feedparser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import List, Set, Dict, Optional, Tuple
+from typing import List, Set, Dict, Optional, Sequence, Tuple
+
+try:
+    from scripts.aieo_concept_store import open_concept_store
+    from scripts.aieo_instance_health import InstanceHealth
+    from scripts.aieo_memory_transaction import (
+        commit_memory,
+        memory_revision,
+        read_memory,
+        retry_on_conflict,
+    )
+except ImportError:  # python scripts/aieo_x_keyword_harvester.py として実行した場合
+    from aieo_concept_store import open_concept_store
+    from aieo_instance_health import InstanceHealth
+    from aieo_memory_transaction import (
+        commit_memory,
+        memory_revision,
+        read_memory,
+        retry_on_conflict,
+    )
 
 # Nitter インスタンス（複数のフォールバック）
 NITTER_INSTANCES = [
@@ -23,19 +45,37 @@ MEMORY_FILE = "aieo_memory.json"
 HARVESTED_KEYWORDS_FILE = "x_harvested_keywords.json"
 CACHE_FILE = "x_posts_cache.json"
 ERROR_LOG_FILE = "x_harvest_errors.log"
+# インスタンスごとの成功率と応答時間（実行をまたいで保持）
+INSTANCE_HEALTH_FILE = "x_instance_health.json"
 
 # 設定
 MAX_RETRIES = 3
 RETRY_DELAY = 2  # 秒
 REQUEST_TIMEOUT = 10  # 秒
 CACHE_EXPIRY_DAYS = 7
+# 全インスタンスへ同時に問い合わせ、最初に有効なフィードを返したものを使う
+HEDGED_FETCH = os.getenv("AIEO_NITTER_HEDGED", "1") != "0"
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class FetchCancelled(Exception):
+    """他のインスタンスが先に有効なフィードを返したため、取得を打ち切った"""
 
 
 class XKeywordHarvester:
     """XポストからAIEO用キーワードを抽出（堅牢版）"""
     
-    def __init__(self, username: str):
+    def __init__(
+        self,
+        username: str,
+        instances: Sequence[str] = NITTER_INSTANCES,
+        health: Optional[InstanceHealth] = None,
+        hedged: bool = HEDGED_FETCH,
+    ):
         self.username = username
+        self.instances = list(instances)
+        self.health = health or InstanceHealth(INSTANCE_HEALTH_FILE)
+        self.hedged = hedged
         self.harvested = self._load_harvested()
         self.error_log = []
     
@@ -126,20 +166,24 @@ class XKeywordHarvester:
         
         print(f"🔍 Fetching posts from X (last {days} days)...")
         
-        # 各Nitterインスタンスを試す
-        for attempt, instance in enumerate(NITTER_INSTANCES, 1):
-            print(f"   Attempt {attempt}/{len(NITTER_INSTANCES)}: {instance}")
-            
-            posts = self._fetch_from_instance(instance, days)
-            
-            if posts:
-                # 成功したらキャッシュして返す
-                self._save_cache(posts)
-                return posts
-            
-            # 失敗したら少し待つ
-            if attempt < len(NITTER_INSTANCES):
-                time.sleep(RETRY_DELAY)
+        # 成功率の高い順に並べ、停止中とみなしたインスタンスは最後に回す
+        alive, dead = self.health.rank(self.instances)
+        if dead:
+            print(f"   Deferring {len(dead)} unhealthy instance(s): {', '.join(dead)}")
+        try:
+            if self.hedged:
+                posts = self._fetch_hedged(alive, days)
+                if posts is None:
+                    posts = self._fetch_hedged(dead, days)
+            else:
+                posts = self._fetch_sequential(alive + dead, days)
+        finally:
+            self._save_health()
+        
+        if posts:
+            # 成功したらキャッシュして返す
+            self._save_cache(posts)
+            return posts
         
         # すべて失敗した場合、古いキャッシュでも使う
         print("⚠️ All instances failed, trying expired cache...")
@@ -151,16 +195,95 @@ class XKeywordHarvester:
         self._log_error("All fetch attempts failed, no cache available")
         return []
     
-    def _fetch_from_instance(self, instance: str, days: int) -> List[Dict]:
-        """特定のNitterインスタンスから取得"""
-        try:
-            rss_url = f"{instance}/{self.username}/rss"
+    def _fetch_sequential(self, instances: List[str], days: int) -> List[Dict]:
+        """インスタンスを1つずつ試し、最初に取得できたポストを返す"""
+        for attempt, instance in enumerate(instances, 1):
+            print(f"   Attempt {attempt}/{len(instances)}: {instance}")
+            
+            posts = self._fetch_from_instance(instance, days)
             
-            # User-Agentを設定してブロックを回避
-            feed = feedparser.parse(rss_url, agent='Mozilla/5.0')
+            if posts:
+                return posts
+            
+            # 失敗したら少し待つ
+            if attempt < len(instances):
+                time.sleep(RETRY_DELAY)
+        return []
+    
+    def _fetch_hedged(self, instances: List[str], days: int) -> Optional[List[Dict]]:
+        """インスタンスへ同時に問い合わせ、最初の有効なフィードのポストを返す
+        
+        どのインスタンスからも有効なフィードを得られなければ None を返す。
+        """
+        if not instances:
+            return None
+        print(f"   Racing {len(instances)} instance(s): {', '.join(instances)}")
+        cancel = threading.Event()
+        pool = ThreadPoolExecutor(len(instances), thread_name_prefix="aieo-nitter")
+        futures = {
+            pool.submit(self._fetch_from_instance, instance, days, cancel): instance
+            for instance in instances
+        }
+        try:
+            for future in as_completed(futures):
+                posts = future.result()
+                if posts is not None:
+                    print(f"   🏁 First valid feed: {futures[future]}")
+                    return posts
+        finally:
+            # 残りの取得は読み込みの区切りで打ち切り、終了を待たずに戻る
+            cancel.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+            # 応答待ちのまま残った取得は REQUEST_TIMEOUT で失敗するか遅れて成功する。
+            # 終わった時点で記録を保存し、応答しないインスタンスも次回の順位に反映する。
+            # 実行の終了時にはインタープリターが残りの取得の完了を待つため、保存は失われない。
+            for future in futures:
+                if not future.done():
+                    future.add_done_callback(lambda _: self._save_health())
+        return None
+    
+    def _save_health(self):
+        """インスタンスの健全性を保存する。失敗はログに残して続行する"""
+        try:
+            self.health.save()
+        except OSError as e:
+            self._log_error(f"Failed to save instance health: {e}")
+    
+    def _download(self, instance: str, cancel: Optional[threading.Event] = None) -> bytes:
+        """RSSを取得する。cancel が立ったら読み込みの途中で打ち切る"""
+        # User-Agentを設定してブロックを回避
+        request = urllib.request.Request(
+            f"{instance}/{self.username}/rss", headers={'User-Agent': 'Mozilla/5.0'}
+        )
+        chunks = []
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise FetchCancelled(instance)
+                chunk = response.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return b''.join(chunks)
+    
+    def _fetch_from_instance(
+        self, instance: str, days: int, cancel: Optional[threading.Event] = None
+    ) -> Optional[List[Dict]]:
+        """特定のNitterインスタンスから取得
+        
+        有効なフィードでなければ None を返す。フィードが有効なら、期間内の
+        ポストがなくても空のリストを返す。結果はインスタンスの健全性に記録する。
+        """
+        started = time.monotonic()
+        try:
+            if cancel is not None and cancel.is_set():
+                return None
+            feed = feedparser.parse(self._download(instance, cancel))
             
             if not feed.entries:
-                return []
+                self.health.record_failure(instance)
+                return None
+            self.health.record_success(instance, time.monotonic() - started)
             
             posts = []
             cutoff_date = datetime.now() - timedelta(days=days)
@@ -191,12 +314,16 @@ class XKeywordHarvester:
             
             if posts:
                 print(f"   ✅ Found {len(posts)} posts")
-                return posts
+            return posts
             
+        except FetchCancelled:
+            # 打ち切りはインスタンスの失敗として数えない
+            return None
         except Exception as e:
+            self.health.record_failure(instance)
             self._log_error(f"Failed to fetch from {instance}: {e}")
         
-        return []
+        return None
     
     def _load_expired_cache(self) -> Optional[List[Dict]]:
         """期限切れでもキャッシュを読み込む（緊急用）"""
@@ -321,8 +448,7 @@ class XKeywordHarvester:
             return
         
         try:
-            with open(MEMORY_FILE, 'r', encoding='utf-8') as f:
-                memory = json.load(f)
+            read_memory(MEMORY_FILE)
         except json.JSONDecodeError as e:
             self._log_error(f"Failed to load memory: {e}")
             return
@@ -352,13 +478,6 @@ class XKeywordHarvester:
         if len(self.harvested["harvest_history"]) > 30:
             self.harvested["harvest_history"] = self.harvested["harvest_history"][-30:]
         
-        # X由来のキーワード概念を検索
-        x_concept_idx = None
-        for i, concept in enumerate(memory["concepts"]):
-            if concept["concept_id"] == "kg_x_keyword_evolution":
-                x_concept_idx = i
-                break
-        
         # メモリ概念を更新
         concept_data = {
             "concept_id": "kg_x_keyword_evolution",
@@ -376,17 +495,25 @@ class XKeywordHarvester:
             "last_updated": datetime.now().isoformat()
         }
         
-        if x_concept_idx is not None:
-            memory["concepts"][x_concept_idx] = concept_data
-            print(f"📝 Updated existing X keyword concept")
-        else:
-            memory["concepts"].append(concept_data)
-            print(f"✨ Created new X keyword concept")
-        
-        # メモリを保存
+        def attempt():
+            # 競合した場合は読み直したメモリへ同じ概念を適用し直す
+            memory = read_memory(MEMORY_FILE)
+            revision = memory_revision(memory)
+            concepts = open_concept_store(memory["concepts"])
+            try:
+                updated = concepts.upsert(concept_data) is not None
+                memory["concepts"] = concepts.to_list()
+            finally:
+                concepts.close()
+            commit_memory(MEMORY_FILE, memory, revision)
+            return updated
+        
+        # X由来のキーワード概念をIDで更新し、メモリを保存
         try:
-            with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
-                json.dump(memory, f, indent=2, ensure_ascii=False)
+            if retry_on_conflict(attempt):
+                print(f"📝 Updated existing X keyword concept")
+            else:
+                print(f"✨ Created new X keyword concept")
             print(f"✅ Memory updated successfully")
         except Exception as e:
             self._log_error(f"Failed to save memory: {e}")
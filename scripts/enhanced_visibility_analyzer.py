@@ -4,7 +4,6 @@ Enhanced AIEO Visibility Analyzer (最適化版)
 戦略的キーワードのみを分析
 """
 
-import csv
 import os
 from datetime import datetime
 from collections import defaultdict
@@ -12,6 +11,11 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
+try:
+    from scripts.aieo_metrics_store import load_metrics
+except ImportError:  # python scripts/enhanced_visibility_analyzer.py として実行した場合
+    from aieo_metrics_store import load_metrics
+
 LOG_FILE = "visibility_log.csv"
 CHART_FILE = "visibility_detailed_analysis.png"
 
@@ -34,16 +38,11 @@ def load_and_clean_data():
         print(f"❌ {LOG_FILE} not found")
         return None
     
-    data = []
-    with open(LOG_FILE, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            keyword = row.get('keyword', '')
-            # 戦略的キーワードのみを保持
-            if keyword in STRATEGIC_KEYWORDS:
-                data.append(row)
-    
-    return data
+    # 戦略的キーワードのみをストア側で絞り込んで読み込む
+    records = load_metrics(
+        LOG_FILE, filters=[('keyword', 'in', STRATEGIC_KEYWORDS)]
+    ).to_dict('records')
+    return records
 
 
 def analyze_keyword_performance(data):
@@ -1,13 +1,50 @@
 #!/usr/bin/env python3
 """分離された人物別可視性メトリクスからAIEO共鳴度を算出する。"""
 
-import csv
 import json
+import math
 import os
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 
 import matplotlib.pyplot as plt
+import pandas as pd
+
+try:
+    from scripts.aieo_metrics_store import (
+        CHUNK_ROWS,
+        iter_appended_chunks,
+        read_csv_header,
+        tail_digest,
+    )
+    from scripts.aieo_metrics_writer import file_lock
+    from scripts.aieo_resonance_history import (
+        COMPONENT_COLUMNS,
+        SCORE_COLUMNS,
+        resonance_components,
+        typed_visibility_rows,
+        update_resonance_history,
+    )
+    from scripts.aieo_timestamps import parse_timestamps
+    from scripts.aieo_visibility_source import load_visibility
+except ImportError:  # python scripts/resonance_indexer.py として実行した場合
+    from aieo_metrics_store import (
+        CHUNK_ROWS,
+        iter_appended_chunks,
+        read_csv_header,
+        tail_digest,
+    )
+    from aieo_metrics_writer import file_lock
+    from aieo_resonance_history import (
+        COMPONENT_COLUMNS,
+        SCORE_COLUMNS,
+        resonance_components,
+        typed_visibility_rows,
+        update_resonance_history,
+    )
+    from aieo_timestamps import parse_timestamps
+    from aieo_visibility_source import load_visibility
 
 VISIBILITY_LOG = Path(
     os.getenv("AIEO_VISIBILITY_METRICS_LOG", "aieo_visibility_metrics.csv")
@@ -23,6 +60,10 @@ REQUIRED_COLUMNS = {
     "domain_mentions",
     "visibility_score",
 }
+# 既定ではCSVをチャンクごとに読み、対象ごとの最新行だけを保持する。
+STREAMING = os.getenv("AIEO_RESONANCE_STREAMING", "1") != "0"
+# 設定すると読み終えた位置と最新行を保存し、次回は追記分だけを読む。
+RESONANCE_STATE = os.getenv("AIEO_RESONANCE_STATE", "")
 
 
 def utc_now_iso() -> str:
@@ -30,17 +71,19 @@ def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-def load_visibility_data() -> list[dict]:
-    """専用CSVを検証して全行を読み込む。"""
-    if not VISIBILITY_LOG.exists():
-        raise FileNotFoundError(f"{VISIBILITY_LOG} が見つかりません")
+def _check_visibility_log(path: Path) -> None:
+    if not path.exists():
+        raise FileNotFoundError(f"{path} が見つかりません")
+    missing = sorted(REQUIRED_COLUMNS - set(read_csv_header(path)))
+    if missing:
+        raise ValueError(f"可視性メトリクスに必須列がありません: {missing}")
+
 
-    with VISIBILITY_LOG.open("r", encoding="utf-8", newline="") as file:
-        reader = csv.DictReader(file)
-        missing = sorted(REQUIRED_COLUMNS - set(reader.fieldnames or []))
-        if missing:
-            raise ValueError(f"可視性メトリクスに必須列がありません: {missing}")
-        data = list(reader)
+def load_visibility_data() -> list[dict]:
+    """専用CSVを検証し、必要列だけをストア経由で読み込む。"""
+    _check_visibility_log(VISIBILITY_LOG)
+    _, frame = load_visibility(VISIBILITY_LOG, extra_columns=SCORE_COLUMNS)
+    data = frame.rename(columns={"keyword": "name"}).to_dict("records")
 
     if not data:
         raise ValueError("可視性メトリクスにデータ行がありません")
@@ -48,45 +91,146 @@ def load_visibility_data() -> list[dict]:
     return data
 
 
+def _latest_in_chunk(frame: pd.DataFrame) -> pd.DataFrame:
+    """文字列のチャンクから、対象ごとに時刻が最も新しい有効行を取り出す。"""
+    chunk = typed_visibility_rows(frame)
+    # 同時刻の行は、全体を読み込む場合と同じく先に現れた行を残す。
+    return (
+        chunk.sort_values("timestamp", ascending=False, kind="stable")
+        .groupby("name", sort=False)
+        .head(1)
+    )
+
+
+def _fold_latest_rows(latest: dict[str, dict], chunk: pd.DataFrame) -> None:
+    for row in chunk.to_dict("records"):
+        previous = latest.get(row["name"])
+        if previous is None or row["timestamp"] > previous["timestamp"]:
+            latest[row["name"]] = row
+
+
+def _load_stream_state(state_file: Path, path: Path) -> Optional[dict]:
+    """CSVが前回から追記されただけなら、読み終えた位置と最新行を返す。"""
+    if not state_file.exists():
+        return None
+    try:
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+        if (
+            state["source"] != str(path)
+            or state["header"] != read_csv_header(path)
+            or state["offset"] > path.stat().st_size
+            or state["source_digest"] != tail_digest(path, state["offset"])
+        ):
+            return None
+        latest = {
+            name: {**row, "timestamp": pd.Timestamp(row["timestamp"])}
+            for name, row in state["latest"].items()
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return {"offset": state["offset"], "latest": latest}
+
+
+def _save_stream_state(
+    state_file: Path, path: Path, offset: int, latest: dict[str, dict]
+) -> None:
+    rows = {
+        name: {
+            key: (
+                value.isoformat()
+                if isinstance(value, datetime)
+                else None if isinstance(value, float) and math.isnan(value) else value
+            )
+            for key, value in row.items()
+        }
+        for name, row in latest.items()
+    }
+    state = {
+        "source": str(path),
+        "header": read_csv_header(path),
+        "offset": offset,
+        "source_digest": tail_digest(path, offset),
+        "latest": rows,
+    }
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = state_file.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(temp_path, state_file)
+
+
+def stream_latest_rows(
+    path: Path = VISIBILITY_LOG,
+    state_file: Optional[Path] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> list[dict]:
+    """CSVをチャンクごとに読み、対象ごとの最新行だけを保持して返す。
+
+    メモリは対象数とチャンクの大きさにだけ比例する。``state_file`` を
+    指定すると、前回読み終えた位置から追記された行だけを読む。
+    """
+    path = Path(path)
+    _check_visibility_log(path)
+    state = _load_stream_state(state_file, path) if state_file else None
+    offset = state["offset"] if state else 0
+    latest = state["latest"] if state else {}
+    if state:
+        print(f"✓ 前回の位置 {offset} バイトから追記分を読み込み")
+
+    with path.open("rb") as source, file_lock(source, shared=True):
+        for frame, offset in iter_appended_chunks(path, offset, chunk_rows):
+            _fold_latest_rows(latest, _latest_in_chunk(frame))
+    if state_file:
+        _save_stream_state(state_file, path, offset, latest)
+
+    if not latest:
+        raise ValueError("可視性メトリクスにデータ行がありません")
+    print(f"✓ {len(latest)}件の対象の最新行を逐次読み込み")
+    return list(latest.values())
+
+
 def calculate_resonance_scores(visibility_data: list[dict]) -> dict:
     """対象ごとに時刻が最も新しい有効行から共鳴度を計算する。"""
     latest_rows: dict[str, tuple[datetime, dict]] = {}
 
-    for row in visibility_data:
+    # 文字列の時刻は行ごとではなく、まとめて一括で解析する。
+    timestamps = [row.get("timestamp") for row in visibility_data]
+    text_positions = [
+        position
+        for position, timestamp in enumerate(timestamps)
+        if not isinstance(timestamp, datetime)
+    ]
+    if text_positions:
+        parsed = parse_timestamps(
+            pd.Series([timestamps[position] for position in text_positions], dtype=object)
+        )
+        for position, timestamp in zip(text_positions, parsed):
+            timestamps[position] = None if pd.isna(timestamp) else timestamp
+
+    for row, timestamp in zip(visibility_data, timestamps):
         name = str(row.get("name", "")).strip()
-        timestamp_text = str(row.get("timestamp", "")).strip()
-        if not name or not timestamp_text:
-            continue
-        try:
-            timestamp = datetime.fromisoformat(timestamp_text.replace("Z", "+00:00"))
-            if timestamp.tzinfo is None:
-                timestamp = timestamp.replace(tzinfo=timezone.utc)
-        except ValueError:
+        if not name or pd.isna(timestamp):
             continue
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
         previous = latest_rows.get(name)
         if previous is None or timestamp > previous[0]:
             latest_rows[name] = (timestamp, row)
 
-    resonance_scores: dict[str, dict] = {}
-    for name, (timestamp, row) in latest_rows.items():
-        try:
-            github_followers = float(row["github_followers"])
-            web_mentions = float(row["web_mentions"])
-            domain_mentions = float(row["domain_mentions"])
-        except (KeyError, TypeError, ValueError):
-            continue
-
-        domain_diversity = min(domain_mentions / 100, 40)
-        mention_frequency = min(web_mentions / 1000, 40)
-        impact = min(github_followers / 10, 20)
-        total_resonance = domain_diversity + mention_frequency + impact
+    latest = pd.DataFrame(
+        [row for _, row in latest_rows.values()],
+        columns=SCORE_COLUMNS,
+        index=pd.Index(list(latest_rows), dtype=object),
+    )
+    latest["name"] = latest.index
+    latest["timestamp"] = [timestamp for timestamp, _ in latest_rows.values()]
+    # 数値に変換できない値や欠損値を持つ対象は、成分の計算から除く。
+    components = resonance_components(latest)
 
+    resonance_scores: dict[str, dict] = {}
+    for name, row in zip(components["name"], components.to_dict("records")):
         resonance_scores[name] = {
-            "resonance": round(total_resonance, 2),
-            "domain_diversity": round(domain_diversity, 2),
-            "mention_frequency": round(mention_frequency, 2),
-            "impact": round(impact, 2),
-            "source_timestamp": timestamp.isoformat().replace("+00:00", "Z"),
+            **{column: row[column] for column in COMPONENT_COLUMNS},
+            "source_timestamp": row["timestamp"].isoformat().replace("+00:00", "Z"),
         }
 
     if not resonance_scores:
@@ -135,9 +279,16 @@ def main() -> None:
     print(f"Started at: {utc_now_iso()}")
     print("=" * 60)
 
-    scores = calculate_resonance_scores(load_visibility_data())
+    if STREAMING:
+        state_file = Path(RESONANCE_STATE) if RESONANCE_STATE else None
+        visibility_data = stream_latest_rows(VISIBILITY_LOG, state_file)
+    else:
+        visibility_data = load_visibility_data()
+    scores = calculate_resonance_scores(visibility_data)
     generate_resonance_visualization(scores)
     save_resonance_report(scores)
+    appended = update_resonance_history(VISIBILITY_LOG)
+    print(f"✓ 共鳴度の時系列へ{appended}行を追記")
 
     for name, score in scores.items():
         print(f"  {name}: {score['resonance']:.1f}")
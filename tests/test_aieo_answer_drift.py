@@ -0,0 +1,89 @@
+import json
+
+import pandas as pd
+
+from scripts.aieo_answer_drift import (
+    minhash_signatures,
+    summarize_drift,
+    update_answer_features,
+)
+
+MEMORY = {
+    "concepts": [
+        {
+            "concept_id": "kg_project_taxonomy",
+            "attributes": {"stack": ["Python", "GitHub Actions"]},
+        },
+        {
+            "concept_id": "kg_digital_presence",
+            "category": "visibility_status",
+            "attributes": {"growth_stage": "Emerging"},
+        },
+        {"concept_id": "kg_interaction_style", "attributes": {"tone": ["rapid_execution"]}},
+    ]
+}
+
+
+def _record(month, provider, response, status="success", query="who"):
+    return {
+        "timestamp": f"{month}-15T00:00:00",
+        "month": month,
+        "query": query,
+        "provider": provider,
+        "key": f"{month}{provider}",
+        "result": {"status": status, "response": response, "model": provider},
+    }
+
+
+def _append(path, records):
+    with path.open("a", encoding="utf-8") as file:
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def test_minhash_similarity_tracks_overlap():
+    base = "kgninja builds aieo pipelines with python and github actions"
+    signatures = minhash_signatures([base, base + " every day", "まったく別の回答です", ""])
+    same = (signatures[0] == signatures[1]).mean()
+    different = (signatures[0] == signatures[2]).mean()
+    assert same > 0.6
+    assert different < 0.2
+
+
+def test_features_are_appended_incrementally_and_match_a_rebuild(tmp_path):
+    log = tmp_path / "log.jsonl"
+    memory = tmp_path / "aieo_memory.json"
+    memory.write_text(json.dumps(MEMORY), encoding="utf-8")
+    features = tmp_path / "features.csv"
+    state = tmp_path / "state.json"
+    first_answer = "KGNINJA uses Python and GitHub Actions."
+    _append(log, [
+        _record("2026-09", "claude", first_answer),
+        _record("2026-09", "gemini", "", status="error"),
+    ])
+
+    assert update_answer_features(log, features, state, memory) == 1
+    _append(log, [
+        _record("2026-10", "claude", first_answer + " AIEO too."),
+        _record("2026-10", "gemini", "Unknown person."),
+    ])
+    assert update_answer_features(log, features, state, memory) == 2
+    assert update_answer_features(log, features, state, memory) == 0
+
+    rebuilt = tmp_path / "rebuilt.csv"
+    update_answer_features(log, rebuilt, tmp_path / "other.json", memory)
+    assert features.read_bytes() == rebuilt.read_bytes()
+
+    saved = pd.read_csv(features)
+    assert saved["mentions_kgninja"].tolist() == [1, 1, 0]
+    assert saved["mentions_aieo"].tolist() == [0, 1, 0]
+    assert saved["keyword_coverage"].tolist() == [0.6667, 0.6667, 0.0]
+    assert saved["matched_concepts"].fillna("").tolist() == ["kg_project_taxonomy"] * 2 + [""]
+    assert pd.isna(saved["similarity_prev_month"].iloc[0])
+    assert saved["similarity_prev_month"].iloc[1] > 0.5
+    assert pd.isna(saved["similarity_prev_month"].iloc[2])
+
+    summary = summarize_drift(saved)
+    october = summary.loc[summary["month"].eq("2026-10")].set_index("provider")
+    assert october.loc["claude", "mentions_aieo_rate"] == 1
+    assert october.loc["gemini", "answers"] == 1
@@ -2,7 +2,7 @@ import numpy as np
 import pandas as pd
 import pytest
 
-from scripts.aieo_composite_tracker import build_resonance_frame
+from scripts.aieo_composite_tracker import build_resonance_frame, update_composite_logs
 
 
 def test_single_effect_series_produces_finite_resonance():
@@ -40,3 +40,54 @@ def test_multiple_effect_series_are_bounded():
 def test_resonance_rejects_missing_timestamp():
     with pytest.raises(ValueError, match="timestamp"):
         build_resonance_frame(pd.DataFrame({"A": [1.0]}))
+
+
+def test_incremental_stability_logs_match_a_full_recompute(tmp_path):
+    effect = tmp_path / "aieo_effect_log.csv"
+    lines = [
+        "2026-08-20 00:00:00,0.0,",
+        "2026-08-20 06:00:00,20.0,0.0",
+        "invalid,1.0,1.0",
+        "2026-08-20 12:00:00,,-10.0",
+        "2026-08-20 18:00:00,-5.0,30.0",
+        "2026-08-21 00:00:00,300.0,",
+        "2026-08-21 06:00:00,0.0,0.0",
+    ]
+    effect.write_text("timestamp,A,B\n", encoding="utf-8")
+    incremental = [tmp_path / "resonance.csv", tmp_path / "stability.csv"]
+    full = [tmp_path / "full_resonance.csv", tmp_path / "full_stability.csv"]
+
+    appended = []
+    for start in range(0, len(lines), 2):
+        with effect.open("a", encoding="utf-8") as file:
+            file.write("".join(f"{line}\n" for line in lines[start : start + 2]))
+        appended.append(
+            update_composite_logs(
+                effect, *incremental, state_file=tmp_path / "state.json"
+            )
+        )
+        update_composite_logs(
+            effect, *full, state_file=tmp_path / "unused.json", incremental=False
+        )
+        assert incremental[0].read_bytes() == full[0].read_bytes()
+        assert incremental[1].read_bytes() == full[1].read_bytes()
+
+    assert appended == [False, True, True, True]
+    resonance = pd.read_csv(incremental[0])
+    assert list(resonance.columns) == [
+        "timestamp",
+        "resonance_index",
+        "rolling_stability",
+        "ewma_stability",
+    ]
+    assert len(resonance) == 6
+    assert resonance["rolling_stability"].between(0.0, 100.0).all()
+
+    stability = pd.read_csv(incremental[1])
+    series = stability.loc[stability["entity"] == "A", "effect"]
+    expected = series.rolling(5, min_periods=1).std(ddof=0).round(6)
+    assert stability.loc[series.index, "rolling_volatility"].tolist() == expected.tolist()
+    expected = series.ewm(span=10).std(bias=True).round(6)
+    assert stability.loc[series.index, "ewma_volatility"].tolist() == pytest.approx(
+        expected.tolist()
+    )
@@ -0,0 +1,56 @@
+import json
+
+from scripts import aieo_memory_engine
+from scripts.aieo_concept_store import ConceptStore, open_concept_store
+
+
+def concept(concept_id, confidence=0.5):
+    return {
+        "concept_id": concept_id,
+        "category": "test",
+        "attributes": {},
+        "confidence": confidence,
+        "last_updated": "2026-08-20T00:00:00",
+    }
+
+
+def test_upsert_replaces_in_place_and_keeps_json_order():
+    concepts = [concept("a"), concept("b")]
+    store = ConceptStore(concepts)
+
+    assert store.upsert(concept("b", 0.9))["confidence"] == 0.5
+    assert store.upsert(concept("c")) is None
+    assert store.get("b")["confidence"] == 0.9
+    assert "missing" not in store
+    assert [item["concept_id"] for item in store.to_list()] == ["a", "b", "c"]
+    assert store.to_list() is concepts
+
+
+def test_sqlite_backend_restores_concepts_missing_from_json(tmp_path):
+    db_path = tmp_path / "concepts.sqlite3"
+    store = open_concept_store([concept("a")], str(db_path))
+    store.upsert(concept("dynamic_1"))
+    store.close()
+
+    restored = open_concept_store([concept("a", 0.8)], str(db_path))
+    assert [item["concept_id"] for item in restored.to_list()] == ["a", "dynamic_1"]
+    assert restored.get("a")["confidence"] == 0.8
+    restored.close()
+
+
+def test_engine_updates_concepts_through_the_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    engine = aieo_memory_engine.AIEOMemoryEngine()
+    engine.update_concept("kg_digital_presence", "visibility_status", {}, 0.5)
+    engine.update_concept("kg_digital_presence", "visibility_status", {}, 1.0)
+    aieo_memory_engine._ensure_static_concepts(engine)
+    aieo_memory_engine._ensure_static_concepts(engine)
+    engine.save_memory()
+
+    saved = json.loads((tmp_path / aieo_memory_engine.MEMORY_FILE).read_text("utf-8"))
+    assert [item["concept_id"] for item in saved["concepts"]] == [
+        "kg_digital_presence",
+        "kg_project_taxonomy",
+        "kg_interaction_style",
+    ]
+    assert saved["concepts"][0]["confidence"] == 0.5 * 0.7 + 1.0 * 0.3
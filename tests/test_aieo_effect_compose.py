@@ -2,7 +2,11 @@ import numpy as np
 import pandas as pd
 import pytest
 
-from scripts.aieo_effect_compose import build_effect_frame
+from scripts.aieo_effect_compose import (
+    build_effect_frame,
+    load_effect_log,
+    update_effect_log,
+)
 
 
 def test_build_effect_frame_accepts_mixed_legacy_timestamps_and_duplicates():
@@ -71,3 +75,55 @@ def test_effect_changes_use_each_entity_previous_observation():
 def test_build_effect_frame_rejects_unknown_schema():
     with pytest.raises(ValueError, match="対応する可視性スキーマ"):
         build_effect_frame(pd.DataFrame({"timestamp": ["2025-10-17"]}))
+
+
+def test_incremental_effect_log_matches_a_full_recompute(tmp_path):
+    source = tmp_path / "aieo_visibility_metrics.csv"
+    output = tmp_path / "aieo_effect_log.csv"
+    state = tmp_path / "effect_state.json"
+    full_output = tmp_path / "full_effect_log.csv"
+    source.write_text("timestamp,name,visibility_score\n", encoding="utf-8")
+
+    batches = [
+        ["2026-08-20T01:00:00Z,A,10", "2026-08-20T01:00:00Z,B,0"],
+        ["2026-08-20T06:00:00Z,A,15", "2026-08-20T06:00:01Z,B,4"],
+        ["2026-08-20T12:00:00Z,A,15", "invalid,A,1", "2026-08-20T12:00:00Z,B,"],
+        # 秒未満の時刻は既存行の書式を変えるため、全体の再計算になる。
+        ["2026-08-20T18:00:00.250000Z,A,12"],
+        ["2026-08-21T00:00:00.5Z,B,8", "2026-08-21T00:00:00.5Z,A,6"],
+        # 新しい対象は列を増やすため、全体の再計算になる。
+        ["2026-08-21T06:00:00Z,C,3"],
+        ["2026-08-21T12:00:00Z,C,6", "2026-08-21T12:00:00Z,A,6"],
+    ]
+    appended = []
+    for batch in batches:
+        with source.open("a", encoding="utf-8") as file:
+            file.write("".join(f"{row}\n" for row in batch))
+        appended.append(update_effect_log(source, output, state))
+        update_effect_log(source, full_output, tmp_path / "unused.json", incremental=False)
+        assert output.read_bytes() == full_output.read_bytes()
+
+    assert appended == [False, True, True, False, True, False, True]
+    effect = load_effect_log(output)
+    assert effect["A"].dropna().iloc[-1] == pytest.approx(0.0)
+    assert effect["C"].dropna().iloc[-1] == pytest.approx(100.0)
+
+
+def test_incremental_effect_log_recomputes_after_a_rewrite(tmp_path):
+    source = tmp_path / "aieo_visibility_metrics.csv"
+    output = tmp_path / "aieo_effect_log.csv"
+    state = tmp_path / "effect_state.json"
+    source.write_text(
+        "timestamp,name,visibility_score\n2026-08-20T00:00:00Z,A,10\n",
+        encoding="utf-8",
+    )
+    update_effect_log(source, output, state)
+
+    # 過去の観測が書き換えられた場合は追記扱いにしない。
+    source.write_text(
+        "timestamp,name,visibility_score\n"
+        "2026-08-20T00:00:00Z,A,20\n2026-08-20T06:00:00Z,A,30\n",
+        encoding="utf-8",
+    )
+    assert update_effect_log(source, output, state) is False
+    assert load_effect_log(output)["A"].tolist() == [0.0, pytest.approx(50.0)]
@@ -0,0 +1,249 @@
+import pandas as pd
+import pytest
+
+from scripts.aieo_effect_composite import (
+    adapt_resonance,
+    asof_join,
+    update_composite_log,
+)
+
+VISIBILITY_HEADER = (
+    "timestamp,name,github_followers,github_repos,web_mentions,"
+    "domain_mentions,visibility_score\n"
+)
+VISIBILITY_ROWS = [
+    "2026-08-20T00:00:00Z,KGNINJA,1,1,1,1,50",
+    "2026-08-20T00:00:00Z,SECOND,1,1,1,1,20",
+    "2026-08-20T06:00:00Z,KGNINJA,1,1,1,1,60",
+    "2026-08-21T00:00:00Z,KGNINJA,1,1,1,1,70",
+    "2026-08-21T00:00:00Z,SECOND,1,1,1,1,40",
+    "2026-08-22T00:00:00Z,KGNINJA,1,1,1,1,80",
+]
+RESONANCE_HEADER = "timestamp,name,resonance,domain_diversity,mention_frequency,impact\n"
+RESONANCE_ROWS = [
+    "2026-08-20T00:00:00Z,KGNINJA,50,0,0,0",
+    "2026-08-20T00:00:00Z,SECOND,10,0,0,0",
+    "2026-08-21T00:00:00Z,KGNINJA,80,0,0,0",
+    "2026-08-21T00:00:00Z,SECOND,30,0,0,0",
+    "2026-08-22T00:00:00Z,KGNINJA,90,0,0,0",
+]
+
+
+def _frame(**columns):
+    frame = pd.DataFrame(columns)
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"], utc=True)
+    return frame
+
+
+def test_asof_join_respects_tolerance_and_keys():
+    left = _frame(
+        timestamp=["2026-08-20T05:00:00Z", "2026-08-20T01:00:00Z", "2026-08-20T01:00:00Z"],
+        entity=["A", "A", "B"],
+    )
+    right = _frame(
+        timestamp=["2026-08-20T00:00:00Z", "2026-08-20T00:30:00Z"],
+        entity=["A", "B"],
+        value=[1.0, 2.0],
+    )
+
+    joined = asof_join(left, right, by="entity", tolerance="2h")
+    assert joined["entity"].tolist() == ["A", "A", "B"]
+    assert joined["value"].isna().tolist() == [True, False, False]
+    assert joined["value"].iloc[2] == 2.0
+    assert joined["timestamp_right"].iloc[1] == pd.Timestamp("2026-08-20T00:00:00Z")
+
+    joined = asof_join(left, right.drop(columns="entity"))
+    assert joined["value"].tolist() == [2.0, 2.0, 2.0]
+
+
+def test_adapt_resonance_accepts_history_and_global_log():
+    history = adapt_resonance(
+        pd.DataFrame(
+            {"timestamp": ["2026-08-20T00:00:00Z"], "name": ["KGNINJA"], "resonance": ["75"]}
+        )
+    )
+    assert history["entity"].tolist() == ["KGNINJA"]
+    assert history["resonance_index"].tolist() == [0.75]
+
+    log = adapt_resonance(
+        pd.DataFrame(
+            {"timestamp": ["2026-08-20 00:00:00", "bad"], "resonance_index": ["60", "1"]}
+        )
+    )
+    assert "entity" not in log.columns
+    assert log["resonance_index"].tolist() == [0.6]
+
+    with pytest.raises(ValueError):
+        adapt_resonance(pd.DataFrame({"timestamp": [], "status": []}))
+
+
+def test_incremental_log_matches_a_full_join(tmp_path):
+    visibility = tmp_path / "aieo_visibility_metrics.csv"
+    resonance = tmp_path / "aieo_resonance_history.csv"
+    output = tmp_path / "aieo_effect_composite_log.csv"
+    state = tmp_path / "state.json"
+    visibility.write_text(
+        VISIBILITY_HEADER + "".join(f"{row}\n" for row in VISIBILITY_ROWS[:4]),
+        encoding="utf-8",
+    )
+    resonance.write_text(
+        RESONANCE_HEADER + "".join(f"{row}\n" for row in RESONANCE_ROWS[:2]),
+        encoding="utf-8",
+    )
+
+    assert not update_composite_log(visibility, resonance, output, state)
+    with visibility.open("a", encoding="utf-8") as file:
+        file.write("".join(f"{row}\n" for row in VISIBILITY_ROWS[4:]))
+    with resonance.open("a", encoding="utf-8") as file:
+        file.write("".join(f"{row}\n" for row in RESONANCE_ROWS[2:]))
+    assert update_composite_log(visibility, resonance, output, state)
+
+    full = tmp_path / "full.csv"
+    update_composite_log(visibility, resonance, full, tmp_path / "full.json", incremental=False)
+    assert output.read_bytes() == full.read_bytes()
+
+    saved = pd.read_csv(output)
+    assert saved["entity"].tolist() == [
+        "KGNINJA",
+        "SECOND",
+        "KGNINJA",
+        "KGNINJA",
+        "SECOND",
+        "KGNINJA",
+    ]
+    assert saved["aieo_effect"].tolist() == pytest.approx(
+        [0.25, 0.02, 0.3, 0.56, 0.12, 0.72]
+    )
+    assert saved["aieo_effect_smooth"].iloc[3] == pytest.approx((0.25 + 0.3 + 0.56) / 3)
+
+
+def test_late_rows_before_the_watermark_trigger_a_full_join(tmp_path):
+    visibility = tmp_path / "aieo_visibility_metrics.csv"
+    resonance = tmp_path / "aieo_resonance_history.csv"
+    output = tmp_path / "aieo_effect_composite_log.csv"
+    state = tmp_path / "state.json"
+    visibility.write_text(
+        VISIBILITY_HEADER + f"{VISIBILITY_ROWS[3]}\n", encoding="utf-8"
+    )
+    resonance.write_text(
+        RESONANCE_HEADER + "".join(f"{row}\n" for row in RESONANCE_ROWS),
+        encoding="utf-8",
+    )
+    update_composite_log(visibility, resonance, output, state)
+
+    with visibility.open("a", encoding="utf-8") as file:
+        file.write(f"{VISIBILITY_ROWS[0]}\n")
+    assert not update_composite_log(visibility, resonance, output, state)
+    assert pd.read_csv(output)["timestamp"].tolist() == [
+        "2026-08-20T00:00:00Z",
+        "2026-08-21T00:00:00Z",
+    ]
+
+
+def test_entities_are_final_only_up_to_their_own_resonance(tmp_path):
+    visibility = tmp_path / "aieo_visibility_metrics.csv"
+    resonance = tmp_path / "aieo_resonance_history.csv"
+    output = tmp_path / "aieo_effect_composite_log.csv"
+    state = tmp_path / "state.json"
+    visibility.write_text(
+        VISIBILITY_HEADER
+        + "2026-08-20T12:00:00Z,A,1,1,1,1,50\n"
+        + "2026-08-20T12:00:00Z,B,1,1,1,1,50\n"
+        + "2026-08-20T15:00:00Z,A,1,1,1,1,50\n"
+        + "2026-08-20T15:00:00Z,B,1,1,1,1,50\n",
+        encoding="utf-8",
+    )
+    # Aの共鳴度は13時まで、Bは17時まで届いている。
+    resonance.write_text(
+        RESONANCE_HEADER
+        + "2026-08-20T10:00:00Z,A,10,0,0,0\n"
+        + "2026-08-20T10:00:00Z,B,10,0,0,0\n"
+        + "2026-08-20T13:00:00Z,A,20,0,0,0\n"
+        + "2026-08-20T17:00:00Z,B,30,0,0,0\n",
+        encoding="utf-8",
+    )
+    update_composite_log(visibility, resonance, output, state)
+
+    # Aの15時の行は、後から届いた15時30分の共鳴度へ結合し直す。
+    with resonance.open("a", encoding="utf-8") as file:
+        file.write("2026-08-20T15:30:00Z,A,90,0,0,0\n")
+    assert update_composite_log(visibility, resonance, output, state)
+
+    full = tmp_path / "full.csv"
+    update_composite_log(
+        visibility, resonance, full, tmp_path / "full.json", incremental=False
+    )
+    assert output.read_bytes() == full.read_bytes()
+    saved = pd.read_csv(output)
+    assert saved["resonance_timestamp"].tolist() == [
+        "2026-08-20T13:00:00Z",
+        "2026-08-20T10:00:00Z",
+        "2026-08-20T15:30:00Z",
+        "2026-08-20T17:00:00Z",
+    ]
+    assert saved["aieo_effect"].tolist() == pytest.approx([0.1, 0.05, 0.45, 0.15])
+
+
+def test_late_resonance_for_a_finalized_entity_triggers_a_full_join(tmp_path):
+    visibility = tmp_path / "aieo_visibility_metrics.csv"
+    resonance = tmp_path / "aieo_resonance_history.csv"
+    output = tmp_path / "aieo_effect_composite_log.csv"
+    state = tmp_path / "state.json"
+    visibility.write_text(
+        VISIBILITY_HEADER
+        + "2026-08-20T12:00:00Z,A,1,1,1,1,50\n"
+        + "2026-08-20T12:00:00Z,B,1,1,1,1,50\n",
+        encoding="utf-8",
+    )
+    resonance.write_text(
+        RESONANCE_HEADER
+        + "2026-08-20T10:00:00Z,A,10,0,0,0\n"
+        + "2026-08-20T18:00:00Z,A,20,0,0,0\n"
+        + "2026-08-20T18:00:00Z,B,30,0,0,0\n",
+        encoding="utf-8",
+    )
+    update_composite_log(visibility, resonance, output, state)
+
+    # Aの最新時刻より前の共鳴度が遅れて届くと、確定した行の結合先が変わる。
+    with resonance.open("a", encoding="utf-8") as file:
+        file.write("2026-08-20T12:30:00Z,A,90,0,0,0\n")
+    assert not update_composite_log(visibility, resonance, output, state)
+    assert pd.read_csv(output)["resonance_timestamp"].tolist() == [
+        "2026-08-20T12:30:00Z",
+        "2026-08-20T18:00:00Z",
+    ]
+
+
+def test_resonance_before_the_watermark_reaches_a_lagging_entity(tmp_path):
+    visibility = tmp_path / "aieo_visibility_metrics.csv"
+    resonance = tmp_path / "aieo_resonance_history.csv"
+    output = tmp_path / "aieo_effect_composite_log.csv"
+    state = tmp_path / "state.json"
+    visibility.write_text(
+        VISIBILITY_HEADER
+        + "2026-08-20T10:00:00Z,A,1,1,1,1,50\n"
+        + "2026-08-20T12:00:00Z,B,1,1,1,1,50\n"
+        + "2026-08-20T14:00:00Z,A,1,1,1,1,50\n",
+        encoding="utf-8",
+    )
+    resonance.write_text(
+        RESONANCE_HEADER
+        + "2026-08-20T10:00:00Z,A,10,0,0,0\n"
+        + "2026-08-20T13:00:00Z,B,30,0,0,0\n",
+        encoding="utf-8",
+    )
+    update_composite_log(visibility, resonance, output, state)
+
+    # 確定位置(12時)より前でも、Aの最新時刻より後の共鳴度は14時の行の結合先になる。
+    with resonance.open("a", encoding="utf-8") as file:
+        file.write("2026-08-20T11:00:00Z,A,90,0,0,0\n")
+    assert update_composite_log(visibility, resonance, output, state)
+
+    full = tmp_path / "full.csv"
+    update_composite_log(
+        visibility, resonance, full, tmp_path / "full.json", incremental=False
+    )
+    assert output.read_bytes() == full.read_bytes()
+    assert pd.read_csv(output)["resonance_timestamp"].tolist()[-1] == (
+        "2026-08-20T11:00:00Z"
+    )
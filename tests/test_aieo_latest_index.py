@@ -0,0 +1,84 @@
+import json
+import os
+
+from scripts import aieo_visibility_tracker as tracker_module
+from scripts.aieo_latest_index import LatestIndex, index_path
+from scripts.aieo_memory_engine import load_visibility_snapshot
+
+
+def metrics(timestamp, name, score):
+    return {"timestamp": timestamp, "name": name, "visibility_score": score}
+
+
+def test_tracker_appends_fold_into_a_fresh_index(tmp_path, monkeypatch):
+    metrics_path = tmp_path / "aieo_visibility_metrics.csv"
+    monkeypatch.setattr(tracker_module, "VISIBILITY_LOG", metrics_path)
+    tracker_module.save_visibility_log(
+        [metrics("2026-08-20T00:00:00Z", "KGNINJA", 30.0)]
+    )
+    index = LatestIndex(metrics_path, "name", "visibility_score")
+    assert index.values() == {"KGNINJA": 30.0}
+
+    tracker_module.save_visibility_log(
+        [
+            metrics("2026-08-20T06:00:00Z", "KGNINJA", 35.0),
+            metrics("2026-08-20T06:00:00Z", "SECOND", 20.0),
+        ]
+    )
+    # 追記で更新された索引はCSVのサイズと末尾のハッシュに一致し、作り直されない。
+    def fail_rebuild():
+        raise AssertionError("索引が作り直されました")
+
+    monkeypatch.setattr(index, "rebuild", fail_rebuild)
+    assert index.values() == {"KGNINJA": 35.0, "SECOND": 20.0}
+    assert load_visibility_snapshot(metrics_path, tmp_path / "missing.csv")[
+        "primary_value"
+    ] == 35.0
+
+
+def test_stale_index_is_rebuilt_from_the_csv(tmp_path):
+    metrics_path = tmp_path / "aieo_visibility_metrics.csv"
+    metrics_path.write_text(
+        "timestamp,name,visibility_score\n"
+        "2026-08-20T06:00:00Z,KGNINJA,35\n"
+        "2026-08-20T00:00:00Z,KGNINJA,30\n",
+        encoding="utf-8",
+    )
+    index = LatestIndex(metrics_path, "name", "visibility_score")
+    assert index.values() == {"KGNINJA": 35.0}
+
+    # 追記を経由せずに書き換えられたCSVは、末尾のハッシュの不一致で検出する。
+    metrics_path.write_text(
+        "timestamp,name,visibility_score\n"
+        "2026-08-20T06:00:00Z,KGNINJA,36\n"
+        "2026-08-20T00:00:00Z,KGNINJA,30\n",
+        encoding="utf-8",
+    )
+    assert index.values() == {"KGNINJA": 36.0}
+    saved = json.loads(index_path(metrics_path).read_text(encoding="utf-8"))
+    assert saved["size"] == metrics_path.stat().st_size
+
+
+def test_index_survives_a_fresh_checkout_and_reads_only_appended_rows(
+    tmp_path, monkeypatch
+):
+    metrics_path = tmp_path / "aieo_visibility_metrics.csv"
+    metrics_path.write_text(
+        "timestamp,name,visibility_score\n2026-08-20T00:00:00Z,KGNINJA,30\n",
+        encoding="utf-8",
+    )
+    index = LatestIndex(metrics_path, "name", "visibility_score")
+    assert index.values() == {"KGNINJA": 30.0}
+
+    # チェックアウトし直してmtimeが変わり、git pullで行が追記された状態。
+    with metrics_path.open("a", encoding="utf-8") as file:
+        file.write("2026-08-21T00:00:00Z,KGNINJA,40\n2026-08-21T00:00:00Z,SECOND,5\n")
+    os.utime(metrics_path, ns=(0, 0))
+
+    def fail_rebuild():
+        raise AssertionError("索引が作り直されました")
+
+    monkeypatch.setattr(index, "rebuild", fail_rebuild)
+    assert index.values() == {"KGNINJA": 40.0, "SECOND": 5.0}
+    saved = json.loads(index_path(metrics_path).read_text(encoding="utf-8"))
+    assert saved["size"] == metrics_path.stat().st_size
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from scripts.aieo_llm_providers import LLMProvider, ProviderRegistry
+from scripts.aieo_verification import AIVerifier
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeProvider(LLMProvider):
+    name = "fake"
+    label = "Fake"
+    model = "fake-1"
+    api_key_env = "AIEO_FAKE_API_KEY"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.created = []
+
+    def _create_client(self):
+        # 作成中に他のスレッドが初回の問い合わせへ入る余地を作る。
+        time.sleep(0.05)
+        client = FakeClient()
+        self.created.append(client)
+        return client
+
+    def _complete(self, client, prompt):
+        if prompt == "fail":
+            raise RuntimeError("boom")
+        return f"{prompt}:{id(client)}"
+
+
+def test_client_is_created_once_and_reused_across_prompts():
+    provider = FakeProvider(api_key="key")
+    threads = [
+        threading.Thread(target=provider.query, args=(str(index),)) for index in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert provider.query("last")["response"] == f"last:{id(provider.created[0])}"
+    assert len(provider.created) == 1
+
+    assert provider.query("fail") == {"status": "error", "error": "boom", "model": "fake"}
+    provider.close()
+    assert provider.created[0].closed
+
+
+def test_incomplete_provider_fails_when_it_is_created():
+    class IncompleteProvider(LLMProvider):
+        name = "incomplete"
+
+        def _create_client(self):
+            return FakeClient()
+
+    with pytest.raises(TypeError, match="_complete"):
+        IncompleteProvider(api_key="key")
+
+
+def test_provider_without_key_is_skipped_without_creating_a_client(monkeypatch):
+    monkeypatch.delenv("AIEO_FAKE_API_KEY", raising=False)
+    provider = FakeProvider()
+    assert provider.query("hello") == {
+        "status": "skipped",
+        "reason": "API key not set",
+        "model": "fake",
+    }
+    assert provider.created == []
+
+
+def test_registered_providers_drive_the_verifier():
+    registry = ProviderRegistry.default()
+    assert registry.names() == ["claude", "chatgpt", "gemini"]
+
+    provider = FakeProvider(api_key="key")
+    verifier = AIVerifier(registry=ProviderRegistry([provider]))
+    verifier.run_all({"only": {"prompt": "p"}}, use_async=False)
+    assert list(verifier.results["queries"]["only"]) == ["fake"]
+    assert verifier.results["queries"]["only"]["fake"]["model"] == "fake-1"
@@ -1,7 +1,9 @@
+import json
 from pathlib import Path
 
 import pandas as pd
 
+from scripts import aieo_memory_engine
 from scripts.aieo_memory_engine import load_visibility_snapshot
 
 
@@ -59,3 +61,138 @@ def test_memory_falls_back_to_latest_legacy_keyword_values(tmp_path: Path):
     assert snapshot["metric_type"] == "result_count"
     assert snapshot["primary_name"] == "KGNINJA AI"
     assert snapshot["primary_value"] == 150.0
+
+
+def test_save_keeps_a_hot_window_and_rolls_up_older_interactions(
+    tmp_path: Path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(aieo_memory_engine, "HOT_INTERACTIONS", 2)
+    engine = aieo_memory_engine.AIEOMemoryEngine()
+    for index, (day, event_type) in enumerate(
+        [("2026-08-20", "pulse"), ("2026-08-20", "pulse"), ("2026-08-21", "init")]
+        + [("2026-08-22", "pulse"), ("2026-08-22", "pulse"), ("2026-08-23", "pulse")]
+    ):
+        engine.add_interaction(event_type, "context", f"insight {index % 2}")
+        engine.memory["interaction_history"][-1]["timestamp"] = f"{day}T0{index}:00:00"
+    engine.save_memory()
+    # 2回目の保存で同じ日付・種類の集約が別行に分かれても、読み込み時にまとめる。
+    engine.add_interaction("pulse", "context", "insight 2")
+    engine.memory["interaction_history"][-1]["timestamp"] = "2026-08-24T00:00:00"
+    engine.save_memory()
+
+    saved = json.loads((tmp_path / aieo_memory_engine.MEMORY_FILE).read_text("utf-8"))
+    assert len(saved["interaction_history"]) == 2
+    assert saved["meta"]["total_interactions"] == 7
+    assert saved["meta"]["archived_interactions"] == 5
+
+    rollups = aieo_memory_engine.load_interaction_rollups()
+    assert [(r["day"], r["event_type"], r["count"]) for r in rollups] == [
+        ("2026-08-20", "pulse", 2),
+        ("2026-08-21", "init", 1),
+        ("2026-08-22", "pulse", 2),
+    ]
+    assert rollups[0]["insights"] == ["insight 0", "insight 1"]
+    assert rollups[0]["first_timestamp"] == "2026-08-20T00:00:00"
+    assert rollups[0]["last_timestamp"] == "2026-08-20T01:00:00"
+
+
+def test_concept_fragments_are_reused_across_runs_by_content_hash(
+    tmp_path: Path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    cache_path = tmp_path / "fragments.json"
+    fragments = aieo_memory_engine.FragmentCache(cache_path)
+    engine = aieo_memory_engine.AIEOMemoryEngine(fragments)
+    aieo_memory_engine._ensure_static_concepts(engine)
+    engine.memory["concepts"] = engine.concepts.to_list()
+    rendered = engine.generate_prompt_context()
+    assert "### Kg Project Taxonomy\n**Category:** creation_pattern  \n" in rendered
+    assert (fragments.hits, fragments.misses) == (0, 2)
+    fragments.save()
+
+    resumed = aieo_memory_engine.FragmentCache(cache_path)
+    engine.fragments = resumed
+    assert engine.generate_prompt_context() == rendered
+    assert (resumed.hits, resumed.misses) == (2, 0)
+
+    # 内容が変わった概念だけを描画し直し、使われなくなった断片は保存時に消す。
+    engine.memory["concepts"][0] = {**engine.memory["concepts"][0], "confidence": 0.5}
+    engine.fragments = resumed = aieo_memory_engine.FragmentCache(cache_path)
+    assert "**Confidence:** 50.0%" in engine.generate_prompt_context()
+    assert (resumed.hits, resumed.misses) == (1, 1)
+    resumed.save()
+    assert len(json.loads(cache_path.read_text(encoding="utf-8"))) == 2
+
+
+def test_main_rewrites_documents_only_when_their_content_changes(
+    tmp_path: Path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "aieo_visibility_metrics.csv").write_text(
+        "timestamp,name,visibility_score\n2026-08-20T00:00:00Z,KGNINJA,35\n",
+        encoding="utf-8",
+    )
+    documents = [tmp_path / "AIEO_MEMORY_STATE.md", tmp_path / "aieo_prompt_context.txt"]
+    memory_path = tmp_path / aieo_memory_engine.MEMORY_FILE
+
+    def set_total_interactions(total):
+        memory = json.loads(memory_path.read_text(encoding="utf-8"))
+        memory["meta"]["total_interactions"] = total
+        memory_path.write_text(json.dumps(memory), encoding="utf-8")
+
+    # 直近の対話の枠が埋まり、信頼度が上限に達した後は、対話数と更新時刻が
+    # 変わっても文書は変えない。
+    for _ in range(aieo_memory_engine.RECENT_INTERACTIONS):
+        aieo_memory_engine.main()
+    set_total_interactions(100)
+    aieo_memory_engine.main()
+    before = [path.read_bytes() for path in documents]
+    aieo_memory_engine.main()
+    assert [path.read_bytes() for path in documents] == before
+    status = json.loads((tmp_path / aieo_memory_engine.STATUS_FILE).read_text("utf-8"))
+    assert status["total_interactions"] == 102
+    assert status["recent_interactions"][-1]["event_type"] == "visibility_pulse"
+
+    set_total_interactions(10)
+    aieo_memory_engine.main()
+    for path, previous in zip(documents, before):
+        assert path.read_bytes() != previous
+        assert "61.0%" in path.read_text(encoding="utf-8")
+
+
+def test_budgeted_context_keeps_the_highest_ranked_concepts(
+    tmp_path: Path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    engine = aieo_memory_engine.AIEOMemoryEngine()
+    aieo_memory_engine._ensure_static_concepts(engine)
+    engine.update_concept(
+        "kg_x_keyword_evolution",
+        "dynamic_vocabulary",
+        {"harvested_keywords": [f"keyword{index}" for index in range(40)]},
+        confidence=0.7,
+    )
+    engine.update_concept("kg_digital_presence", "visibility_status", {"score": 1})
+
+    ranked = aieo_memory_engine.rank_concepts(engine.memory["concepts"])
+    assert [concept["concept_id"] for concept in ranked][0] == "kg_digital_presence"
+    assert ranked[-1]["concept_id"] == "kg_x_keyword_evolution"
+
+    full = engine.generate_prompt_context(token_budget=0)
+    assert "keyword39" in full
+    for budget in (120, 250, 400):
+        context = engine.generate_prompt_context(token_budget=budget)
+        assert aieo_memory_engine.estimate_tokens(context) <= budget
+        assert "### Kg Digital Presence" in context
+
+    roomy = engine.generate_prompt_context(token_budget=10_000)
+    assert "keyword7, ... (+32 more)" in roomy
+    assert "(4 total)" in roomy
+    tight = engine.generate_prompt_context(token_budget=120)
+    assert "lower-ranked concepts omitted" in tight
+
+
+def test_token_estimate_counts_japanese_characters_individually():
+    assert aieo_memory_engine.estimate_tokens("abcdefgh") == 2
+    assert aieo_memory_engine.estimate_tokens("可視性") == 3
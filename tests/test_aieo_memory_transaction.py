@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from scripts import aieo_memory_engine
+from scripts.aieo_memory_transaction import (
+    MemoryConflictError,
+    commit_memory,
+    read_memory,
+    retry_on_conflict,
+)
+
+
+def test_stale_writer_is_rejected_instead_of_clobbering(tmp_path):
+    path = str(tmp_path / "aieo_memory.json")
+    assert commit_memory(path, {"meta": {}, "concepts": []}, 0) == 1
+
+    first = read_memory(path)
+    second = read_memory(path)
+    first["concepts"].append({"concept_id": "first"})
+    commit_memory(path, first, 1)
+
+    second["concepts"].append({"concept_id": "second"})
+    with pytest.raises(MemoryConflictError):
+        commit_memory(path, second, 1)
+    assert read_memory(path)["concepts"] == [{"concept_id": "first"}]
+    assert not (tmp_path / "aieo_memory.json.tmp").exists()
+
+
+def test_update_memory_reapplies_changes_after_a_conflict(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("scripts.aieo_memory_transaction.time.sleep", lambda _: None)
+    aieo_memory_engine.update_memory(
+        lambda engine: engine.add_interaction("init", "context", "insight")
+    )
+
+    attempts = []
+
+    def apply(engine):
+        attempts.append(engine.revision)
+        engine.update_concept("kg_digital_presence", "visibility_status", {})
+        if len(attempts) == 1:
+            # 読み込み後に別のワークフローが保存した状況を作る。
+            other = aieo_memory_engine.AIEOMemoryEngine()
+            other.update_concept("kg_x_keyword_evolution", "dynamic_vocabulary", {})
+            other.save_memory()
+
+    engine = aieo_memory_engine.update_memory(apply)
+
+    assert attempts == [1, 2]
+    assert engine.revision == 3
+    saved = json.loads((tmp_path / "aieo_memory.json").read_text("utf-8"))
+    assert [c["concept_id"] for c in saved["concepts"]] == [
+        "kg_x_keyword_evolution",
+        "kg_digital_presence",
+    ]
+    assert saved["meta"]["total_interactions"] == 1
+
+
+def test_retry_gives_up_after_the_configured_attempts():
+    calls = []
+
+    def always_conflicts():
+        calls.append(1)
+        raise MemoryConflictError("conflict")
+
+    with pytest.raises(MemoryConflictError):
+        retry_on_conflict(always_conflicts, retries=0)
+    assert calls == [1]
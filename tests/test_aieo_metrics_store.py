@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+
+from scripts import aieo_metrics_store
+from scripts.aieo_metrics_store import MetricsStore, load_metrics
+
+HEADER = "timestamp,name,github_followers,web_mentions,domain_mentions,visibility_score\n"
+
+
+def write_rows(path, rows, mode="a"):
+    with path.open(mode, encoding="utf-8", newline="") as file:
+        for row in rows:
+            file.write(row + "\n")
+
+
+@pytest.fixture
+def metrics_csv(tmp_path):
+    path = tmp_path / "aieo_visibility_metrics.csv"
+    path.write_text(HEADER, encoding="utf-8")
+    write_rows(
+        path,
+        [
+            "2026-07-31T23:00:00Z,KGNINJA,10,100,5,1.5",
+            "2026-08-01T01:00:00Z,Other,3,,1,0.4",
+            "2026-08-02T01:00:00Z,KGNINJA,11,120,6,1.7",
+        ],
+    )
+    return path
+
+
+def test_sync_appends_only_the_new_tail_and_rebuilds_on_rewrite(tmp_path, metrics_csv):
+    pytest.importorskip("pyarrow")
+    store = MetricsStore(tmp_path / "store")
+
+    assert store.sync(metrics_csv) == 3
+    assert store.sync(metrics_csv) == 0
+    write_rows(metrics_csv, ["2026-08-03T01:00:00Z,KGNINJA,12,130,7,1.9"])
+    assert store.sync(metrics_csv) == 1
+
+    frame = store.load()
+    assert frame["visibility_score"].tolist() == [1.5, 0.4, 1.7, 1.9]
+    assert str(frame["timestamp"].dt.tz) == "UTC"
+    assert sorted(p.name for p in (store.data_dir).iterdir()) == [
+        "month=2026-07",
+        "month=2026-08",
+    ]
+
+    # 取り込み済みの行が書き換えられたら、追記ではなく全体を取り込み直す。
+    metrics_csv.write_text(HEADER, encoding="utf-8")
+    write_rows(metrics_csv, ["2026-09-01T00:00:00Z,Rewritten,1,1,1,0.1"])
+    assert store.sync(metrics_csv) == 1
+    assert store.load(columns=["name"])["name"].tolist() == ["Rewritten"]
+
+
+def test_load_metrics_store_and_csv_fallback_agree(tmp_path, metrics_csv, monkeypatch):
+    columns = ["timestamp", "name", "web_mentions"]
+    filters = [("name", "in", ["KGNINJA"]), ("timestamp", ">=", "2026-08-01")]
+
+    fallback_store = tmp_path / "unused"
+    monkeypatch.setattr(aieo_metrics_store, "pa", None)
+    fallback = load_metrics(metrics_csv, columns, filters, store_root=fallback_store)
+    monkeypatch.undo()
+    assert not fallback_store.exists()
+    assert fallback["web_mentions"].tolist() == [120.0]
+
+    pytest.importorskip("pyarrow")
+    stored = load_metrics(metrics_csv, columns, filters, store_root=tmp_path / "store")
+    pd.testing.assert_frame_equal(
+        stored.astype({"name": str}), fallback.astype({"name": str})
+    )
+
+
+def test_export_csv_round_trips_the_source_rows(tmp_path, metrics_csv):
+    pytest.importorskip("pyarrow")
+    store = MetricsStore(tmp_path / "store")
+    store.sync(metrics_csv)
+    exported = tmp_path / "exported.csv"
+    store.export_csv(exported)
+
+    original = pd.read_csv(metrics_csv)
+    restored = pd.read_csv(exported)
+    assert restored["name"].tolist() == original["name"].tolist()
+    assert restored["web_mentions"].isna().tolist() == original["web_mentions"].isna().tolist()
+    assert pd.to_datetime(restored["timestamp"]).equals(pd.to_datetime(original["timestamp"]))
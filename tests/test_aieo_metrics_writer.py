@@ -0,0 +1,105 @@
+import json
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+from scripts.aieo_metrics_writer import MetricsWriter, sidecar_path, tail_digest
+
+FIELDS = ["timestamp", "name", "visibility_score"]
+
+
+def row(index, name="KGNINJA"):
+    return {
+        "timestamp": f"2026-08-20T00:00:{index:02d}Z",
+        "name": name,
+        "visibility_score": index,
+    }
+
+
+def append_batches(path, name, batches):
+    writer = MetricsWriter(path, FIELDS)
+    for index in range(batches):
+        writer.append([row(index % 60, name), row((index + 1) % 60, name)])
+
+
+def test_concurrent_writers_append_whole_batches(tmp_path):
+    path = tmp_path / "metrics.csv"
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=append_batches, args=(path, f"writer{number}", 20))
+        for number in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+
+    saved = pd.read_csv(path)
+    assert list(saved.columns) == FIELDS
+    assert len(saved) == 4 * 20 * 2
+    assert saved["name"].value_counts().to_dict() == {f"writer{n}": 40 for n in range(4)}
+    meta = json.loads(sidecar_path(path).read_text(encoding="utf-8"))
+    size = path.stat().st_size
+    assert meta == {
+        "fields": FIELDS,
+        "rows": 160,
+        "size": size,
+        "digest": tail_digest(path, size),
+    }
+
+
+def test_torn_batch_is_discarded_before_the_next_append(tmp_path):
+    path = tmp_path / "metrics.csv"
+    writer = MetricsWriter(path, FIELDS)
+    assert writer.append([row(1)]) == 1
+    # 追記の直前に書き込み中の印を付けたあと、1行目の途中で落ちた状態。
+    writer._save_sidecar(1, path.stat().st_size, pending=True)
+    with path.open("ab") as file:
+        file.write(b"2026-08-20T00:00:02Z,KGNINJA,2\r\n2026-08-20T00:00:03Z,KGN")
+
+    assert writer.append([row(4)]) == 2
+    assert pd.read_csv(path)["visibility_score"].tolist() == [1, 4]
+
+
+def test_header_is_checked_without_a_sidecar(tmp_path):
+    path = tmp_path / "metrics.csv"
+    # 外部で編集され、最終行に改行がないCSV。
+    path.write_text(
+        "timestamp,name,visibility_score\n2026-08-19T00:00:00Z,KGNINJA,5",
+        encoding="utf-8",
+    )
+    assert MetricsWriter(path, FIELDS).append([row(1)]) == 2
+    assert pd.read_csv(path)["visibility_score"].tolist() == [5, 1]
+
+    with pytest.raises(ValueError, match="ヘッダーが不正"):
+        MetricsWriter(path, ["timestamp", "keyword", "totalResults"]).append([row(2)])
+
+
+def test_rows_added_outside_the_writer_are_kept_and_counted(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.csv"
+    writer = MetricsWriter(path, FIELDS)
+    assert writer.append([row(1), row(2)]) == 2
+    # git pull などで、改行で終わらない行が追記された状態。
+    with path.open("ab") as file:
+        file.write(b"2026-08-20T00:00:03Z,SECOND,3\r\n2026-08-20T00:00:04Z,SECOND,4")
+
+    scanned = []
+    original_scan = MetricsWriter._scan
+
+    def scan(self, file, offset=0):
+        scanned.append(offset)
+        return original_scan(self, file, offset)
+
+    monkeypatch.setattr(MetricsWriter, "_scan", scan)
+    assert writer.append([row(5)]) == 5
+    assert pd.read_csv(path)["visibility_score"].tolist() == [1, 2, 3, 4, 5]
+    # 記録済みの部分は読み直さず、外部で追記された部分だけを数える。
+    assert scanned and 0 not in scanned
+
+    # 記録した位置までの内容が書き換えられていれば、全体を数え直す。
+    scanned.clear()
+    path.write_bytes(path.read_bytes().replace(b"KGNINJA,1", b"KGNINJA,9", 1))
+    assert writer.append([row(6)]) == 6
+    assert scanned == [0]
@@ -0,0 +1,40 @@
+import time
+
+from scripts.aieo_provider_cache import ProviderCache
+
+
+def test_cache_returns_fresh_entries_and_counts_hits(tmp_path):
+    cache = ProviderCache(tmp_path / "cache.sqlite3", max_age_seconds=60)
+
+    assert cache.get("google", '"KGNINJA"') is None
+    cache.put("google", '"KGNINJA"', {"results": 42})
+
+    assert cache.get("google", '"KGNINJA"') == {"results": 42}
+    assert cache.get("github", '"KGNINJA"') is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "evictions": 0}
+
+
+def test_cache_is_shared_between_instances_until_it_expires(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    ProviderCache(path, max_age_seconds=60).put("github", "kg-ninja", {"followers": 8})
+
+    assert ProviderCache(path, max_age_seconds=60).get("github", "kg-ninja") == {
+        "followers": 8
+    }
+
+    stale = ProviderCache(path, max_age_seconds=0)
+    time.sleep(0.01)
+    assert stale.get("github", "kg-ninja") is None
+
+
+def test_cache_evicts_least_recently_used_entries_over_capacity(tmp_path):
+    cache = ProviderCache(tmp_path / "cache.sqlite3", max_age_seconds=60, max_entries=2)
+    cache.put("google", "a", {"results": 1})
+    cache.put("google", "b", {"results": 2})
+    cache.get("google", "a")
+    cache.put("google", "c", {"results": 3})
+
+    assert cache.get("google", "b") is None
+    assert cache.get("google", "a") == {"results": 1}
+    assert cache.get("google", "c") == {"results": 3}
+    assert cache.stats()["evictions"] == 1
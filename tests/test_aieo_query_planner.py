@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from scripts import aieo_query_planner as planner_module
+from scripts.aieo_query_planner import DomainQueryPlanner
+
+DOMAINS = ("github.com", "medium.com")
+
+
+def test_unchanged_pairs_back_off_and_changed_pairs_refresh_every_run(tmp_path):
+    state_file = tmp_path / "state.json"
+    planner = DomainQueryPlanner(
+        state_file, base_interval=timedelta(hours=12), max_interval=timedelta(days=7)
+    )
+
+    assert planner.plan("KGNINJA", DOMAINS, "2026-08-20T00:00:00Z") == (list(DOMAINS), {})
+    planner.record("KGNINJA", "github.com", 5, "2026-08-20T00:00:00Z")
+    planner.record("KGNINJA", "medium.com", 2, "2026-08-20T00:00:00Z")
+
+    # 1回目の再取得で値が変わらなかった組だけが安定として扱われる。
+    assert planner.plan("KGNINJA", DOMAINS, "2026-08-20T06:00:00Z")[0] == list(DOMAINS)
+    planner.record("KGNINJA", "github.com", 5, "2026-08-20T06:00:00Z")
+    planner.record("KGNINJA", "medium.com", 3, "2026-08-20T06:00:00Z")
+    planner.save()
+
+    resumed = DomainQueryPlanner(
+        state_file, base_interval=timedelta(hours=12), max_interval=timedelta(days=7)
+    )
+    assert resumed.plan("KGNINJA", DOMAINS, "2026-08-20T12:00:00Z") == (
+        ["medium.com"],
+        {"github.com": 5},
+    )
+    assert resumed.plan("KGNINJA", DOMAINS, "2026-08-20T18:00:00Z")[0] == list(DOMAINS)
+
+
+def test_refresh_interval_doubles_up_to_the_maximum():
+    planner = DomainQueryPlanner(
+        None, base_interval=timedelta(hours=12), max_interval=timedelta(days=2)
+    )
+
+    assert planner.refresh_interval(0) == timedelta(0)
+    assert planner.refresh_interval(1) == timedelta(hours=12)
+    assert planner.refresh_interval(3) == timedelta(hours=48)
+    assert planner.refresh_interval(10) == timedelta(days=2)
+
+
+def test_carried_domains_are_kept_for_the_latest_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(planner_module, "CARRIED_HISTORY_RUNS", 2)
+    state_file = tmp_path / "state.json"
+    planner = DomainQueryPlanner(state_file)
+    for hour in ("00", "06", "12"):
+        planner.record_carried("KGNINJA", ["medium.com"], f"2026-08-20T{hour}:00:00Z")
+    planner.record_carried("SECOND", [], "2026-08-20T12:00:00Z")
+    planner.save()
+
+    resumed = DomainQueryPlanner(state_file)
+    assert resumed.carried_domains("KGNINJA", "2026-08-20T00:00:00Z") == []
+    assert resumed.carried_domains("KGNINJA", "2026-08-20T06:00:00Z") == ["medium.com"]
+    assert resumed.carried_domains("KGNINJA", "2026-08-20T12:00:00Z") == ["medium.com"]
+    assert resumed.carried == {
+        "2026-08-20T06:00:00Z": {"KGNINJA": ["medium.com"]},
+        "2026-08-20T12:00:00Z": {"KGNINJA": ["medium.com"]},
+    }
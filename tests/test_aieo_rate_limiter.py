@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from scripts.aieo_rate_limiter import (
+    ProviderRateLimiter,
+    QuotaExhaustedError,
+    TokenBucket,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_waits_for_refill_after_the_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(2.0, capacity=2, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert clock.now == pytest.approx(0.5)
+
+
+def test_google_budget_is_persisted_and_resets_on_the_pacific_day(tmp_path):
+    budget_file = tmp_path / "quota_budget.json"
+    day_one = lambda: datetime(2026, 8, 20, 18, 0, tzinfo=timezone.utc)  # noqa: E731
+    limiter = ProviderRateLimiter(google_daily_quota=2, budget_file=budget_file, now=day_one)
+    limiter.acquire("google")
+    limiter.save()
+
+    resumed = ProviderRateLimiter(google_daily_quota=2, budget_file=budget_file, now=day_one)
+    resumed.acquire("google")
+    with pytest.raises(QuotaExhaustedError, match="日次quota"):
+        resumed.acquire("google")
+
+    # UTC 08:00は太平洋時間の0時を過ぎているので、新しい日の予算になる。
+    next_day = lambda: datetime(2026, 8, 21, 8, 0, tzinfo=timezone.utc)  # noqa: E731
+    assert ProviderRateLimiter(
+        google_daily_quota=2, budget_file=budget_file, now=next_day
+    ).remaining()["google"] == 2
+
+
+def test_plan_that_exceeds_github_remaining_is_refused_before_starting():
+    now = datetime(2026, 8, 20, tzinfo=timezone.utc)
+    limiter = ProviderRateLimiter(budget_file=None, now=lambda: now)
+    limiter.observe_github_headers(
+        {
+            "X-RateLimit-Limit": "5000",
+            "X-RateLimit-Remaining": "3",
+            "X-RateLimit-Reset": str(now.timestamp() + 300),
+        }
+    )
+
+    limiter.ensure_capacity({"google": 5, "github": 3})
+    with pytest.raises(QuotaExhaustedError, match="github: 必要4件 / 残り3件"):
+        limiter.ensure_capacity({"google": 5, "github": 4})
+    # 残量が少ないため、リセットまでに使い切らない速さへ落ちている。
+    assert limiter.buckets["github"].rate == pytest.approx(3 / 300)
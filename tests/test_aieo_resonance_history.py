@@ -0,0 +1,103 @@
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+from scripts.aieo_resonance_history import load_resonance_history, update_resonance_history
+
+HEADER = (
+    "timestamp,name,github_followers,github_repos,web_mentions,"
+    "domain_mentions,visibility_score\n"
+)
+ROWS = [
+    "2026-08-20T00:00:00Z,KGNINJA,10,1,1000,100,5",
+    "2026-08-20 06:00:00,SECOND,500,1,90000,9000,6",
+    "invalid,KGNINJA,99,1,9999,999,9",
+    "2026-08-21T00:00:00.5Z,KGNINJA,30,1,3000,300,7",
+    "2026-09-01T00:00:00Z,SECOND,,1,1000,100,1",
+    "2026-09-02T00:00:00Z,KGNINJA,40,1,4000,400,8",
+]
+
+
+def test_history_is_appended_incrementally_and_matches_a_rebuild(tmp_path):
+    source = tmp_path / "aieo_visibility_metrics.csv"
+    history = tmp_path / "aieo_resonance_history.csv"
+    state = tmp_path / "state.json"
+    source.write_text(HEADER + "".join(f"{row}\n" for row in ROWS[:2]), encoding="utf-8")
+
+    assert update_resonance_history(source, history, state) == 2
+    with source.open("a", encoding="utf-8") as file:
+        file.write("".join(f"{row}\n" for row in ROWS[2:]))
+    assert update_resonance_history(source, history, state) == 2
+    assert update_resonance_history(source, history, state) == 0
+
+    rebuilt = tmp_path / "rebuilt.csv"
+    update_resonance_history(source, rebuilt, tmp_path / "other.json", chunk_rows=2)
+    assert history.read_bytes() == rebuilt.read_bytes()
+
+    saved = pd.read_csv(history)
+    assert saved["timestamp"].tolist() == [
+        "2026-08-20T00:00:00Z",
+        "2026-08-20T06:00:00Z",
+        "2026-08-21T00:00:00.500000Z",
+        "2026-09-02T00:00:00Z",
+    ]
+    second = saved.iloc[1]
+    assert second["domain_diversity"] == 40
+    assert second["mention_frequency"] == 40
+    assert second["impact"] == 20
+    assert second["resonance"] == 100
+
+
+def test_concurrent_updates_append_each_row_once(tmp_path):
+    source = tmp_path / "aieo_visibility_metrics.csv"
+    history = tmp_path / "aieo_resonance_history.csv"
+    state = tmp_path / "state.json"
+    source.write_text(HEADER + "".join(f"{row}\n" for row in ROWS), encoding="utf-8")
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(
+            target=update_resonance_history,
+            args=(source, history, state),
+            kwargs={"chunk_rows": 1},
+        )
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+
+    rebuilt = tmp_path / "rebuilt.csv"
+    update_resonance_history(source, rebuilt, tmp_path / "other.json")
+    assert history.read_bytes() == rebuilt.read_bytes()
+    assert update_resonance_history(source, history, state) == 0
+
+
+def test_history_is_rebuilt_when_the_source_is_rewritten(tmp_path):
+    source = tmp_path / "aieo_visibility_metrics.csv"
+    history = tmp_path / "aieo_resonance_history.csv"
+    state = tmp_path / "state.json"
+    source.write_text(HEADER + f"{ROWS[0]}\n{ROWS[3]}\n", encoding="utf-8")
+    update_resonance_history(source, history, state)
+
+    source.write_text(HEADER + f"{ROWS[5]}\n", encoding="utf-8")
+    assert update_resonance_history(source, history, state) == 1
+    assert pd.read_csv(history)["timestamp"].tolist() == ["2026-09-02T00:00:00Z"]
+
+
+def test_history_query_slices_by_entity_and_time_range(tmp_path):
+    source = tmp_path / "aieo_visibility_metrics.csv"
+    history = tmp_path / "aieo_resonance_history.csv"
+    source.write_text(HEADER + "".join(f"{row}\n" for row in ROWS), encoding="utf-8")
+    update_resonance_history(source, history, tmp_path / "state.json")
+
+    frame = load_resonance_history(
+        names=["KGNINJA"], start="2026-08-21", end="2026-09-02", path=history
+    )
+
+    assert frame["name"].astype(str).tolist() == ["KGNINJA"]
+    assert frame["timestamp"].tolist() == [pd.Timestamp("2026-08-21T00:00:00.5Z")]
+    assert frame["resonance"].tolist() == [pytest.approx(9.0)]
+    assert len(load_resonance_history(path=history)) == 4
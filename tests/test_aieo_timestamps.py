@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from scripts.aieo_timestamps import parse_timestamps, parse_timestamps_with_anomalies
+
+MIXED_FORMATS = [
+    "2025-10-10 13:37:50",
+    "2025-10-17T18:11:28.106031Z",
+    " 2026-08-20T18:00:00+09:00 ",
+    "10/11/2025 10:00",
+    "10/12/2025 11:00",
+    "Oct 5 2025",
+    "2026-08-20",
+]
+
+
+def _mixed(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values.str.strip(), format="mixed", errors="coerce", utc=True)
+
+
+def test_parse_timestamps_matches_mixed_parsing_for_every_format():
+    values = pd.Series(MIXED_FORMATS)
+
+    parsed = parse_timestamps(values)
+
+    pd.testing.assert_series_equal(parsed, _mixed(values), check_names=False)
+
+
+@pytest.mark.parametrize("value", [*MIXED_FORMATS, "garbage"])
+def test_single_rows_match_mixed_parsing(value):
+    values = pd.Series([value])
+
+    pd.testing.assert_series_equal(
+        parse_timestamps(values), _mixed(values), check_names=False
+    )
+
+
+def test_unparseable_timestamps_are_reported():
+    values = pd.Series(
+        ["2025-10-10 13:37:50", "garbage", "", None, "2026-08-20T00:00:00.123456789Z"]
+    )
+
+    parsed, anomalies = parse_timestamps_with_anomalies(values)
+
+    assert parsed.dtype == "datetime64[ns, UTC]"
+    assert parsed.iloc[4] == pd.Timestamp("2026-08-20T00:00:00.123456789Z")
+    assert anomalies.missing == 2
+    assert anomalies.invalid.to_dict() == {1: "garbage"}
+    assert "garbage" in anomalies.summary()
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from scripts.aieo_verification import AIVerifier
+
+CONFIG = {
+    'first': {'prompt': 'one'},
+    'second': {'prompt': 'two'},
+    'third': {'prompt': 'three'},
+}
+
+
+def _success(name, prompt):
+    return {'status': 'success', 'response': f'{name}:{prompt}', 'model': name}
+
+
+def test_async_mode_keeps_the_result_shape_and_limits_each_provider():
+    in_flight = {'claude': 0, 'gemini': 0}
+    peak = dict(in_flight)
+
+    def provider(name):
+        async def query(prompt):
+            in_flight[name] += 1
+            peak[name] = max(peak[name], in_flight[name])
+            await asyncio.sleep(0.01)
+            in_flight[name] -= 1
+            return _success(name, prompt)
+        return query
+
+    verifier = AIVerifier(
+        {'claude': provider('claude'), 'gemini': provider('gemini')},
+        concurrency={'claude': 1, 'gemini': 3},
+    )
+    verifier.run_all(CONFIG, use_async=True)
+
+    assert list(verifier.results['queries']) == ['first', 'second', 'third']
+    assert list(verifier.results['queries']['second']) == ['claude', 'gemini']
+    assert verifier.results['queries']['third']['gemini']['response'] == 'gemini:three'
+    assert peak == {'claude': 1, 'gemini': 3}
+
+    sequential = AIVerifier({'claude': lambda prompt: _success('claude', prompt)})
+    sequential.run_all(CONFIG, use_async=False)
+    assert sequential.results['queries']['first'] == {'claude': _success('claude', 'one')}
+
+
+def test_blocking_clients_run_concurrently_in_threads():
+    def query(prompt):
+        time.sleep(0.2)
+        return _success('chatgpt', prompt)
+
+    verifier = AIVerifier({'chatgpt': query}, concurrency=3)
+    started = time.perf_counter()
+    verifier.run_all(CONFIG, use_async=True)
+    assert time.perf_counter() - started < 0.5
+
+
+def test_errors_and_timeouts_are_retried_with_jitter():
+    calls = []
+    delays = []
+
+    async def flaky(prompt):
+        calls.append(prompt)
+        if len(calls) == 1:
+            return {'status': 'error', 'error': 'boom', 'model': 'claude'}
+        if len(calls) == 2:
+            await asyncio.sleep(1)
+        return _success('claude', prompt)
+
+    async def record(delay):
+        delays.append(delay)
+
+    verifier = AIVerifier(
+        {'claude': flaky}, timeout=0.05, retries=2, sleep=record, jitter=lambda: 0.5
+    )
+    verifier.run_all({'only': {'prompt': 'p'}}, use_async=True)
+    assert verifier.results['queries']['only']['claude']['status'] == 'success'
+    assert delays == [0.5, 1.0]
+
+    async def hang(prompt):
+        await asyncio.sleep(1)
+
+    verifier = AIVerifier({'gemini': hang}, timeout=0.01, retries=0)
+    verifier.run_all({'only': {'prompt': 'p'}}, use_async=True)
+    result = verifier.results['queries']['only']['gemini']
+    assert result['status'] == 'error'
+    assert result['error'].startswith('timeout')
@@ -0,0 +1,95 @@
+import json
+
+from scripts.aieo_verification import AIVerifier
+from scripts.aieo_verification_log import VerificationLog, response_key
+
+CONFIG = {'first': {'prompt': 'one'}, 'second': {'prompt': 'two'}}
+
+
+def _log(tmp_path, **kwargs):
+    return VerificationLog(
+        tmp_path / 'log.jsonl', tmp_path / 'log.index.json', **kwargs
+    )
+
+
+def test_rerun_in_the_same_month_only_queries_failed_pairs(tmp_path):
+    calls = []
+
+    def flaky(prompt):
+        calls.append(prompt)
+        if prompt == 'two' and calls.count('two') == 1:
+            return {'status': 'error', 'error': 'boom', 'model': 'fake'}
+        return {'status': 'success', 'response': prompt.upper(), 'model': 'fake'}
+
+    first = AIVerifier({'fake': flaky}, log=_log(tmp_path), retries=0)
+    first.run_all(CONFIG, use_async=True)
+    first.log.append(first.new_records)
+    assert calls == ['one', 'two']
+
+    # 索引を読み直した別の実行でも、成功済みの組は問い合わせない。
+    second = AIVerifier({'fake': flaky}, log=_log(tmp_path), retries=0)
+    second.results['month'] = first.results['month']
+    second.run_all(CONFIG, use_async=False)
+    second.log.append(second.new_records)
+    assert calls == ['one', 'two', 'two']
+    assert second.results['queries'] == {
+        'first': {'fake': {'status': 'success', 'response': 'ONE', 'model': 'fake'}},
+        'second': {'fake': {'status': 'success', 'response': 'TWO', 'model': 'fake'}},
+    }
+
+    lines = (tmp_path / 'log.jsonl').read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['result']['status'] for line in lines] == [
+        'success',
+        'error',
+        'success',
+    ]
+
+    next_month = AIVerifier({'fake': flaky}, log=_log(tmp_path))
+    next_month.results['month'] = '2999-01'
+    next_month.run_all(CONFIG, use_async=False)
+    assert len(calls) == 5
+
+
+def test_index_is_rebuilt_from_the_log_when_missing_or_stale(tmp_path):
+    log = _log(tmp_path)
+    key = response_key('fake', {'model': 'm'}, 'hello')
+    log.append([
+        {'month': '2026-10', 'key': key, 'result': {'status': 'success', 'response': 'a'}},
+    ])
+
+    (tmp_path / 'log.index.json').unlink()
+    assert _log(tmp_path).lookup('2026-10', key) == {'status': 'success', 'response': 'a'}
+
+    # 索引の更新前に別の実行が追記した行も取り込む。
+    stale = _log(tmp_path)
+    with (tmp_path / 'log.jsonl').open('a', encoding='utf-8') as file:
+        file.write(json.dumps(
+            {'month': '2026-10', 'key': key, 'result': {'status': 'success', 'response': 'b'}}
+        ) + '\n')
+    stale.append([])
+    assert _log(tmp_path).lookup('2026-10', key)['response'] == 'b'
+    assert response_key('fake', {'model': 'other'}, 'hello') != key
+
+
+def test_legacy_history_is_migrated_once(tmp_path):
+    legacy = tmp_path / 'aieo_verification_log.json'
+    legacy.write_text(json.dumps({'history': [{
+        'timestamp': '2025-10-18T14:39:53',
+        'month': '2025-10',
+        'queries': {'who': {
+            'claude': {'status': 'error', 'error': 'x', 'model': 'claude'},
+            'gemini': {'status': 'success', 'response': 'y', 'model': 'gemini'},
+        }},
+    }]}), encoding='utf-8')
+
+    _log(tmp_path, legacy_path=legacy)
+    _log(tmp_path, legacy_path=legacy)
+    records = [
+        json.loads(line)
+        for line in (tmp_path / 'log.jsonl').read_text(encoding='utf-8').splitlines()
+    ]
+    assert [(record['query'], record['provider']) for record in records] == [
+        ('who', 'claude'),
+        ('who', 'gemini'),
+    ]
+    assert records[1]['month'] == '2025-10'
@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from scripts import aieo_visibility_source
+from scripts.aieo_timestamps import parse_timestamps
+from scripts.aieo_visibility_source import (
+    LEGACY_SCHEMA,
+    MODERN_SCHEMA,
+    detect_schema,
+    load_visibility,
+)
+
+
+def test_parse_timestamps_matches_mixed_parsing_for_odd_rows():
+    values = pd.Series(
+        [
+            "2026-08-20T00:00:00Z",
+            "2026-08-20T06:00:00.250000Z",
+            "2026-08-20 12:00:00",
+            " 2026-08-20T18:00:00+09:00 ",
+            "invalid",
+            "",
+            None,
+        ]
+    )
+
+    parsed = parse_timestamps(values)
+
+    expected = pd.to_datetime(
+        values.str.strip(), format="mixed", errors="coerce", utc=True
+    )
+    pd.testing.assert_series_equal(parsed, expected, check_names=False)
+
+
+def test_detect_schema_reads_only_the_column_names():
+    assert detect_schema(["timestamp", "name", "visibility_score", "extra"]) == (
+        MODERN_SCHEMA
+    )
+    assert detect_schema(["timestamp", "keyword", "totalResults"]) == LEGACY_SCHEMA
+    with pytest.raises(ValueError, match="必須列"):
+        detect_schema(["timestamp", "name"])
+
+
+def test_load_visibility_parses_each_file_version_once(tmp_path, monkeypatch):
+    path = tmp_path / "aieo_visibility_metrics.csv"
+    path.write_text(
+        "timestamp,name,visibility_score,web_mentions\n"
+        "2026-08-20T00:00:00Z, KGNINJA ,10,3\n"
+        "invalid,KGNINJA,11,4\n"
+        "2026-08-20T06:00:00Z,SECOND,,5\n",
+        encoding="utf-8",
+    )
+    aieo_visibility_source.clear_cache()
+    loads = []
+    original = aieo_visibility_source.load_metrics
+
+    def counting_load_metrics(*args, **kwargs):
+        loads.append(args[0])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(aieo_visibility_source, "load_metrics", counting_load_metrics)
+
+    schema, frame = load_visibility(path, extra_columns=["web_mentions"])
+    assert schema == MODERN_SCHEMA
+    assert list(frame.columns) == ["timestamp", "keyword", "value", "web_mentions"]
+    assert frame["keyword"].tolist() == ["KGNINJA"]
+    assert str(frame["timestamp"].dt.tz) == "UTC"
+
+    # 呼び出し側が結果を変更しても、保持している結果には影響しない。
+    frame.loc[:, "value"] = 0
+    assert load_visibility(path, extra_columns=["web_mentions"])[1]["value"].tolist() == [
+        10.0
+    ]
+    assert len(loads) == 1
+
+    with path.open("a", encoding="utf-8") as file:
+        file.write("2026-08-20T12:00:00Z,SECOND,7,6\n")
+    _, frame = load_visibility(path, extra_columns=["web_mentions"])
+    assert frame["keyword"].tolist() == ["KGNINJA", "SECOND"]
+    assert len(loads) == 2
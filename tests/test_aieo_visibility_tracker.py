@@ -1,9 +1,15 @@
 import csv
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pandas as pd
 import pytest
 
 import scripts.aieo_visibility_tracker as tracker_module
+from scripts.aieo_provider_cache import ProviderCache
+from scripts.aieo_query_planner import DomainQueryPlanner
 
 
 class FakeResponse:
@@ -119,6 +125,7 @@ def test_valid_google_zero_response_remains_a_real_zero(monkeypatch):
 
 
 def test_provider_failure_does_not_append_partial_metrics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
     metrics_path = tmp_path / "aieo_visibility_metrics.csv"
     monkeypatch.setattr(tracker_module, "VISIBILITY_LOG", metrics_path)
     monkeypatch.setattr(
@@ -138,3 +145,264 @@ def test_provider_failure_does_not_append_partial_metrics(tmp_path, monkeypatch)
         tracker_module.main()
 
     assert not metrics_path.exists()
+
+
+def test_track_people_fans_out_queries_with_bounded_concurrency(monkeypatch):
+    tracker = tracker_module.VisibilityTracker()
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def slow_query(result):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return result
+
+    monkeypatch.setattr(
+        tracker,
+        "search_google",
+        lambda query, num_results=10: slow_query({"results": len(query)}),
+    )
+    monkeypatch.setattr(
+        tracker,
+        "fetch_github_user",
+        lambda _: slow_query({"followers": 3, "public_repos": 4}),
+    )
+
+    users = [{"name": f"USER{index}", "github": f"user{index}"} for index in range(4)]
+    observed_at = "2026-08-20T00:00:00Z"
+    results = tracker.track_people(users, observed_at=observed_at, max_workers=6)
+
+    assert [item["name"] for item in results] == [user["name"] for user in users]
+    assert {item["timestamp"] for item in results} == {observed_at}
+    assert results[0]["github_followers"] == 3
+    assert results[0]["web_mentions"] == len('"USER0"')
+    assert 1 < state["peak"] <= 6
+
+
+# 2人用のスレッドに4人を割り当てると、失敗時にまだ待機中のクエリが残る。
+@pytest.mark.parametrize("people, max_workers", [(3, 4), (4, 2)])
+def test_track_people_fails_the_whole_run_on_any_provider_error(
+    monkeypatch, people, max_workers
+):
+    tracker = tracker_module.VisibilityTracker()
+
+    def search(query, num_results=10):
+        if "site:dev.to" in query:
+            raise tracker_module.ProviderError("quota exhausted")
+        time.sleep(0.01)
+        return {"results": 1}
+
+    monkeypatch.setattr(tracker, "search_google", search)
+
+    users = [{"name": f"USER{index}"} for index in range(people)]
+    outcome = {}
+
+    def run():
+        try:
+            tracker.track_people(users, max_workers=max_workers)
+        except tracker_module.ProviderError as exc:
+            outcome["error"] = exc
+
+    # 待機中のクエリが取り残されると人物用スレッドが終わらないため、別スレッドで待つ。
+    runner = threading.Thread(target=run, daemon=True)
+    runner.start()
+    runner.join(timeout=10)
+    assert not runner.is_alive()
+    assert "quota exhausted" in str(outcome["error"])
+    assert tracker._query_pool is None
+
+
+def test_cached_google_results_skip_the_api_but_errors_are_not_cached(
+    tmp_path, monkeypatch
+):
+    tracker = tracker_module.VisibilityTracker(
+        cache=ProviderCache(tmp_path / "cache.sqlite3", max_age_seconds=60)
+    )
+    tracker.google_api_key = "test-key"
+    tracker.google_cx = "test-cx"
+    responses = [
+        FakeResponse(429, {"error": {"status": "RESOURCE_EXHAUSTED"}}),
+        FakeResponse(200, {"searchInformation": {"totalResults": "7"}}),
+    ]
+    monkeypatch.setattr(
+        tracker.session, "get", lambda *args, **kwargs: responses.pop(0)
+    )
+
+    with pytest.raises(tracker_module.ProviderError):
+        tracker.search_google('"KGNINJA"')
+    assert tracker.search_google('"KGNINJA"') == {"results": 7}
+    assert tracker.search_google('"KGNINJA"') == {"results": 7}
+    assert tracker.cache.stats()["hits"] == 1
+
+
+@pytest.fixture
+def github_stub():
+    """GraphQLとREST APIを模倣するローカルHTTPサーバー。"""
+    state = {"graphql_calls": [], "rest_calls": [], "graphql_status": 200}
+    users = {
+        "kg-ninja": (8, 179, 2),
+        "second": (3, 10, 0),
+        "third": (1, 4, 1),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            state["graphql_calls"].append(request["variables"])
+            if state["graphql_status"] != 200:
+                self._reply(state["graphql_status"], {"message": "Bad Gateway"})
+                return
+            data = {}
+            for key, login in request["variables"].items():
+                stats = users.get(login.lower())
+                # GraphQLでは解決できない対象として扱い、RESTへ戻させる。
+                if stats is None or login == "third":
+                    data[f"u{key[5:]}"] = None
+                    continue
+                followers, repos, gists = stats
+                data[f"u{key[5:]}"] = {
+                    "followers": {"totalCount": followers},
+                    "repositories": {"totalCount": repos},
+                    "gists": {"totalCount": gists},
+                }
+            self._reply(200, {"data": data})
+
+        def do_GET(self):
+            login = self.path.rsplit("/", 1)[-1]
+            state["rest_calls"].append(login)
+            followers, repos, gists = users[login.lower()]
+            self._reply(
+                200,
+                {"followers": followers, "public_repos": repos, "public_gists": gists},
+            )
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_github_users_batches_graphql_and_falls_back_to_rest(
+    github_stub, monkeypatch
+):
+    monkeypatch.setattr(tracker_module, "GITHUB_GRAPHQL_BATCH_SIZE", 2)
+    tracker = tracker_module.VisibilityTracker()
+    tracker.github_token = "test-token"
+    tracker.github_api_url = github_stub["url"]
+
+    stats = tracker.fetch_github_users(["KG-NINJA", "second", "third", "KG-NINJA"])
+
+    assert len(github_stub["graphql_calls"]) == 2
+    assert github_stub["rest_calls"] == ["third"]
+    assert stats["kg-ninja"] == {"public_repos": 179, "followers": 8, "public_gists": 2}
+    assert stats["third"] == {"public_repos": 4, "followers": 1, "public_gists": 1}
+
+
+def test_graphql_outage_falls_back_to_rest_for_every_user(github_stub):
+    github_stub["graphql_status"] = 502
+    tracker = tracker_module.VisibilityTracker()
+    tracker.github_token = "test-token"
+    tracker.github_api_url = github_stub["url"]
+
+    stats = tracker.fetch_github_users(["KG-NINJA", "second"])
+
+    assert github_stub["rest_calls"] == ["KG-NINJA", "second"]
+    assert stats["second"]["followers"] == 3
+
+
+def test_track_people_uses_prefetched_github_stats(github_stub, monkeypatch):
+    tracker = tracker_module.VisibilityTracker()
+    tracker.github_token = "test-token"
+    tracker.github_api_url = github_stub["url"]
+    monkeypatch.setattr(tracker, "search_google", lambda *args, **kwargs: {"results": 0})
+
+    users = [{"name": "KGNINJA", "github": "KG-NINJA"}, {"name": "B", "github": "second"}]
+    results = tracker.track_people(users, max_workers=4)
+
+    assert len(github_stub["graphql_calls"]) == 1
+    assert github_stub["rest_calls"] == []
+    assert [item["github_repos"] for item in results] == [179, 10]
+
+
+def test_main_refuses_a_run_that_cannot_fit_the_google_quota(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    metrics_path = tmp_path / "aieo_visibility_metrics.csv"
+    monkeypatch.setattr(tracker_module, "VISIBILITY_LOG", metrics_path)
+    monkeypatch.setattr(
+        tracker_module,
+        "load_users_config",
+        lambda: [{"name": f"USER{index}"} for index in range(3)],
+    )
+    monkeypatch.setattr(
+        tracker_module.ProviderRateLimiter,
+        "from_env",
+        classmethod(lambda cls: cls(google_daily_quota=10, budget_file=None)),
+    )
+
+    def unexpected_query(*args, **kwargs):
+        raise AssertionError("quota不足の実行でクエリが送信されました")
+
+    monkeypatch.setattr(tracker_module.VisibilityTracker, "search_google", unexpected_query)
+
+    with pytest.raises(tracker_module.ProviderError, match="google: 必要15件 / 残り10件"):
+        tracker_module.main()
+    assert not metrics_path.exists()
+
+
+def test_stable_domains_are_carried_forward_without_changing_the_schema(
+    tmp_path, monkeypatch
+):
+    planner = DomainQueryPlanner(None)
+    for domain in tracker_module.MENTION_DOMAINS:
+        planner.pairs.setdefault("KGNINJA", {})[domain] = {
+            "value": 2,
+            "checked_at": "2026-08-20T00:00:00Z",
+            "unchanged_runs": 3 if domain != "dev.to" else 0,
+        }
+    tracker = tracker_module.VisibilityTracker(planner=planner)
+    queries = []
+
+    def search(query, num_results=10):
+        queries.append(query)
+        return {"results": 10}
+
+    monkeypatch.setattr(tracker, "search_google", search)
+
+    metrics = tracker.track_person("KGNINJA", {}, observed_at="2026-08-20T06:00:00Z")
+
+    assert queries == ['"KGNINJA"', '"KGNINJA" site:dev.to']
+    assert metrics["domain_mentions"] == 10 + 2 * 3
+    assert metrics["carried_forward_domains"] == [
+        "github.com",
+        "medium.com",
+        "stackoverflow.com",
+    ]
+    assert (
+        planner.carried_domains("KGNINJA", "2026-08-20T06:00:00Z")
+        == metrics["carried_forward_domains"]
+    )
+    planned = tracker.plan_queries([{"name": "KGNINJA"}], "2026-08-20T07:00:00Z")
+    assert planned["google"] == 2
+
+    metrics_path = tmp_path / "aieo_visibility_metrics.csv"
+    monkeypatch.setattr(tracker_module, "VISIBILITY_LOG", metrics_path)
+    tracker_module.save_visibility_log([metrics])
+    assert list(pd.read_csv(metrics_path).columns) == tracker_module.METRIC_FIELDS
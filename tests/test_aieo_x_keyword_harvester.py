@@ -0,0 +1,133 @@
+import json
+import time
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+
+import pytest
+
+from scripts.aieo_instance_health import InstanceHealth
+from scripts import aieo_x_keyword_harvester
+from scripts.aieo_x_keyword_harvester import FetchCancelled, XKeywordHarvester
+
+
+def _feed(title):
+    published = format_datetime(datetime.now().astimezone())
+    return (
+        '<?xml version="1.0"?><rss version="2.0"><channel><title>x</title>'
+        f"<item><title>{title}</title><description>{title} #AIEO</description>"
+        f"<pubDate>{published}</pubDate><link>https://x/{title}</link></item>"
+        "</channel></rss>"
+    ).encode("utf-8")
+
+
+class FakeHarvester(XKeywordHarvester):
+    def __init__(self, behaviours, health, hedged=True):
+        super().__init__("user", instances=list(behaviours), health=health, hedged=hedged)
+        self.behaviours = behaviours
+        self.calls = []
+        self.cancelled = []
+
+    def _download(self, instance, cancel=None):
+        self.calls.append(instance)
+        behaviour = self.behaviours[instance]
+        if behaviour == "fail":
+            raise OSError("connection refused")
+        if behaviour == "hang":
+            # 打ち切りに気付かないまま接続を待ち続け、タイムアウトする応答を模す。
+            time.sleep(0.3)
+            raise TimeoutError("timed out")
+        if behaviour == "slow":
+            # 打ち切られるまで読み込みが続く応答を模す。
+            while not cancel.wait(0.01):
+                pass
+            self.cancelled.append(instance)
+            raise FetchCancelled(instance)
+        time.sleep(behaviour)
+        return _feed(instance.rsplit("/", 1)[-1])
+
+
+@pytest.fixture(autouse=True)
+def _workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def test_hedged_fetch_takes_the_first_valid_feed_and_cancels_the_rest(tmp_path):
+    health = InstanceHealth(tmp_path / "health.json")
+    harvester = FakeHarvester(
+        {"https://slow": "slow", "https://dead": "fail", "https://fast": 0.05},
+        health,
+    )
+
+    posts = harvester.fetch_recent_posts()
+    assert [post["source_instance"] for post in posts] == ["https://fast"]
+    for _ in range(100):
+        if harvester.cancelled:
+            break
+        time.sleep(0.01)
+    assert harvester.cancelled == ["https://slow"]
+
+    saved = json.loads((tmp_path / "health.json").read_text(encoding="utf-8"))["instances"]
+    assert saved["https://fast"]["successes"] == 1
+    assert saved["https://dead"]["failures"] == 1
+    # 打ち切った取得は成功にも失敗にも数えない。
+    assert "https://slow" not in saved
+
+
+def test_losing_fetches_are_saved_after_they_finish(tmp_path):
+    health_path = tmp_path / "health.json"
+    harvester = FakeHarvester(
+        {"https://fast": 0.05, "https://hang": "hang", "https://late": 0.2},
+        InstanceHealth(health_path),
+    )
+
+    posts = harvester.fetch_recent_posts()
+    assert [post["source_instance"] for post in posts] == ["https://fast"]
+    saved = json.loads(health_path.read_text(encoding="utf-8"))["instances"]
+    assert list(saved) == ["https://fast"]
+
+    # 勝者より長く応答しないインスタンスの失敗と、遅れた成功も保存される。
+    for _ in range(200):
+        saved = json.loads(health_path.read_text(encoding="utf-8"))["instances"]
+        if len(saved) == 3:
+            break
+        time.sleep(0.01)
+    assert saved["https://hang"]["failures"] == 1
+    assert saved["https://late"]["successes"] == 1
+    assert InstanceHealth(health_path).success_rate("https://hang") < 0.5
+
+
+def test_unhealthy_instances_are_tried_last(monkeypatch):
+    monkeypatch.setattr(aieo_x_keyword_harvester, "RETRY_DELAY", 0)
+    now = datetime(2026, 10, 18, 12, 0)
+    health = InstanceHealth(None, now=lambda: now)
+    for _ in range(3):
+        health.record_failure("https://dead")
+    health.record_success("https://slow", 2.0)
+    health.record_success("https://quick", 0.5)
+
+    alive, dead = health.rank(["https://dead", "https://slow", "https://quick", "https://new"])
+    assert alive == ["https://quick", "https://slow", "https://new"]
+    assert dead == ["https://dead"]
+
+    later = InstanceHealth(None, now=lambda: now + timedelta(days=2))
+    later.instances = health.instances
+    assert later.rank(["https://dead"]) == (["https://dead"], [])
+
+    harvester = FakeHarvester(
+        {"https://dead": 0.0, "https://quick": "fail"}, health, hedged=False
+    )
+    posts = harvester.fetch_recent_posts()
+    assert harvester.calls == ["https://quick", "https://dead"]
+    assert posts[0]["source_instance"] == "https://dead"
+
+
+def test_hedged_fetch_falls_back_to_unhealthy_instances():
+    health = InstanceHealth(None)
+    for _ in range(3):
+        health.record_failure("https://dead")
+    harvester = FakeHarvester({"https://dead": 0.0, "https://down": "fail"}, health)
+
+    posts = harvester.fetch_recent_posts()
+    assert harvester.calls == ["https://down", "https://dead"]
+    assert posts[0]["title"] == "dead"
+    assert health.instances["https://dead"]["consecutive_failures"] == 0
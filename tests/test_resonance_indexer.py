@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from scripts import resonance_indexer
+from scripts.resonance_indexer import calculate_resonance_scores, stream_latest_rows
+
+HEADER = (
+    "timestamp,name,github_followers,github_repos,web_mentions,"
+    "domain_mentions,visibility_score\n"
+)
+ROWS = [
+    "2026-08-20T00:00:00Z,KGNINJA,10,1,1000,100,5",
+    "2026-08-20 06:00:00,SECOND,20,1,2000,200,6",
+    "invalid,KGNINJA,99,1,9999,999,9",
+    "2026-08-21T00:00:00.5Z,KGNINJA,30,1,3000,300,7",
+    "2026-08-21T00:00:00.5Z,KGNINJA,40,1,4000,400,8",
+    "2026-08-19T00:00:00Z,SECOND,50,1,5000,500,9",
+    "2026-08-22T00:00:00Z,THIRD,,1,1000,100,1",
+]
+
+
+def write_log(path, rows):
+    path.write_text(HEADER + "".join(f"{row}\n" for row in rows), encoding="utf-8")
+
+
+def test_streaming_matches_loading_every_row(tmp_path, monkeypatch):
+    path = tmp_path / "aieo_visibility_metrics.csv"
+    write_log(path, ROWS)
+    monkeypatch.setattr(resonance_indexer, "VISIBILITY_LOG", path)
+
+    streamed = calculate_resonance_scores(stream_latest_rows(path, chunk_rows=2))
+    loaded = calculate_resonance_scores(resonance_indexer.load_visibility_data())
+
+    assert streamed == loaded
+    assert streamed["KGNINJA"]["impact"] == pytest.approx(3.0)
+    assert streamed["SECOND"]["source_timestamp"] == "2026-08-20T06:00:00Z"
+    assert "THIRD" not in streamed
+
+
+def test_streaming_state_reads_only_appended_rows(tmp_path, capsys):
+    path = tmp_path / "aieo_visibility_metrics.csv"
+    state_file = tmp_path / "resonance_state.json"
+    write_log(path, ROWS[:2])
+    stream_latest_rows(path, state_file)
+    offset = json.loads(state_file.read_text(encoding="utf-8"))["offset"]
+    assert offset == path.stat().st_size
+
+    # 書き込み途中の行は読まずに残す。
+    with path.open("a", encoding="utf-8") as file:
+        file.write(f"{ROWS[3]}\n2026-08-23T00:00:00Z,SECOND,1")
+    rows = stream_latest_rows(path, state_file)
+    assert "前回の位置" in capsys.readouterr().out
+    assert {row["name"]: row["github_followers"] for row in rows} == {
+        "KGNINJA": 30.0,
+        "SECOND": 20.0,
+    }
+
+    with path.open("a", encoding="utf-8") as file:
+        file.write(",1,100,10,2\n")
+    rows = stream_latest_rows(path, state_file)
+    assert {row["name"]: row["github_followers"] for row in rows}["SECOND"] == 1.0
+
+    # 取り込み済みの部分が書き換えられた場合は先頭から読み直す。
+    write_log(path, ROWS[5:6])
+    rows = stream_latest_rows(path, state_file)
+    assert [row["github_followers"] for row in rows] == [50.0]